@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+宴席菜品配料统计系统本地 HTTP/JSON 接口
+
+无需图形界面，供收银系统、采购表格等其他工具查询和修改数据（基于 asyncio，只用标准库）。
+
+示例:
+    python api_server.py --port 8765
+    curl http://127.0.0.1:8765/menus/1/ingredients
+    curl "http://127.0.0.1:8765/calculate?menu=1&menu=婚宴"
+    curl -X POST http://127.0.0.1:8765/ingredients -d '{"name": "猪肉", "unit": "斤", "price": 15}'
+
+接口:
+    GET    /                          数据版本、实体数量、响应缓存统计
+    GET    /{类型}                    全部实体（类型为 ingredients / dishes / menus）
+    POST   /{类型}                    新增实体，返回 {"id": 新ID}
+    GET    /{类型}/{ID}               单个实体
+    PUT    /{类型}/{ID}               修改实体（整体替换，菜品的子配方写在 sub_recipes 中）
+    DELETE /{类型}/{ID}               删除实体（仍被菜品或宴席使用时返回409）
+    GET    /menus/{ID}/ingredients    宴席食材用量和成本
+    GET    /calculate?menu=ID或名称   批量计算多个宴席（不指定时计算全部）
+    POST   /calculate                 同上，请求体为 {"menus": [ID或名称, ...]}
+
+没有身份验证，默认只监听本机地址。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import ipaddress
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from cli import build_results, resolve_menus
+from data_manager import PERSISTENCE_MODES, DataManager
+
+ENTITY_KINDS = ("ingredients", "dishes", "menus")
+KIND_LABELS = {"ingredients": "食材", "dishes": "菜品", "menus": "宴席"}
+
+# 请求体大小上限（字节）
+MAX_BODY_SIZE = 1024 * 1024
+
+# 共享数据文件时检查其他工作站变更的间隔（秒）
+SHARED_POLL_INTERVAL = 2.0
+
+STATUS_TEXT = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    """返回给客户端的错误（HTTP状态码和错误信息）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    """只读请求的响应缓存（已编码的JSON），按数据版本号失效
+
+    每条记录保存生成时的 data_version；数据有任何变更后版本号改变，旧记录在读取时视为未命中。
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple, Tuple[int, int, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple, version: int) -> Optional[Tuple[int, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: Tuple, version: int, status: int, body: bytes):
+        self._entries[key] = (version, status, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+def encode_json(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _record_dict(record) -> Dict:
+    return record.to_dict() if hasattr(record, "to_dict") else dict(record)
+
+
+class ApiServer:
+    """在 DataManager 之上提供 HTTP/JSON 接口
+
+    各连接在事件循环中并发读取和等待网络数据，对 DataManager 的调用则由一把 asyncio 锁
+    保证逐个执行、不会交错，读取看到的总是完整的状态。缓存命中的只读请求不需要等待。
+    修改数据的请求可能同步写入SQLite或日志文件、等待共享数据文件的锁，这些调用（以及
+    检查其他工作站的变更）在单线程执行器中运行，不阻塞事件循环；单个工作线程同时保证写操作串行。
+    """
+
+    def __init__(self, data_manager: DataManager, cache_size: int = 512):
+        self.data_manager = data_manager
+        self.cache = ResponseCache(cache_size)
+        self.requests = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-data")
+        self._data_lock = asyncio.Lock()
+
+    def close(self):
+        """等待正在执行的数据修改完成"""
+        self._executor.shutdown()
+
+    # 请求处理
+    def handle(self, method: str, target: str, body: bytes = b"") -> Tuple[int, bytes]:
+        """在没有运行事件循环的线程中处理一个请求，返回 (HTTP状态码, JSON响应体)
+
+        与 handle_async 相同（供脚本和测试直接调用），不能在事件循环中调用。
+        """
+        return asyncio.run(self.handle_async(method, target, body))
+
+    async def handle_async(self, method: str, target: str, body: bytes = b"") -> Tuple[int, bytes]:
+        """在事件循环中处理一个请求，返回 (HTTP状态码, JSON响应体)
+
+        只读请求在事件循环中执行，修改数据的请求交给执行器。
+        """
+        self.requests += 1
+        cached = self._cached(method, target, body)
+        if cached is not None:
+            return cached
+        async with self._data_lock:
+            if self._read_only(method, target):
+                return self._process(method, target, body)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._process, method, target, body)
+
+    @staticmethod
+    def _parts(target: str) -> List[str]:
+        return [unquote(part) for part in urlsplit(target).path.strip("/").split("/") if part]
+
+    def _read_only(self, method: str, target: str) -> bool:
+        return method == "GET" or (method == "POST" and self._parts(target) == ["calculate"])
+
+    def _cached(self, method: str, target: str, body: bytes) -> Optional[Tuple[int, bytes]]:
+        """只读请求的缓存响应，未命中（或不是只读请求）时返回None"""
+        if not self._read_only(method, target):
+            return None
+        return self.cache.get((method, target, body), self.data_manager.data_version)
+
+    def _process(self, method: str, target: str, body: bytes) -> Tuple[int, bytes]:
+        """执行请求（不检查缓存），只读请求的成功响应写入缓存"""
+        url = urlsplit(target)
+        parts = self._parts(target)
+        read_only = self._read_only(method, target)
+        version = self.data_manager.data_version
+        try:
+            payload = self._dispatch(method, parts, parse_qs(url.query), body)
+            status = 201 if method == "POST" and not read_only else 200
+        except ApiError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"处理请求失败: {e}"}
+
+        encoded = encode_json(payload)
+        if read_only and status == 200:
+            self.cache.put((method, target, body), version, status, encoded)
+        return status, encoded
+
+    def _dispatch(self, method: str, parts: List[str], query: Dict[str, List[str]], body: bytes):
+        if not parts:
+            self._allow(method, "GET")
+            return self.status()
+        if parts == ["calculate"]:
+            self._allow(method, "GET", "POST")
+            selectors = query.get("menu", []) if method == "GET" else self._menu_selectors(body)
+            return {"menus": self.calculate(selectors)}
+
+        kind = parts[0]
+        if kind not in ENTITY_KINDS:
+            raise ApiError(404, f"未知的路径: /{'/'.join(parts)}")
+        if len(parts) == 1:
+            self._allow(method, "GET", "POST")
+            if method == "GET":
+                return {entity_id: _record_dict(record) for entity_id, record in self._table(kind).items()}
+            return {"id": self.create(kind, self._json_body(body))}
+
+        entity_id = parts[1]
+        if len(parts) == 3 and kind == "menus" and parts[2] == "ingredients":
+            self._allow(method, "GET")
+            self._require(kind, entity_id)
+            return self.calculate([entity_id])[0]
+        if len(parts) != 2:
+            raise ApiError(404, f"未知的路径: /{'/'.join(parts)}")
+
+        self._allow(method, "GET", "PUT", "DELETE")
+        self._require(kind, entity_id)
+        if method == "GET":
+            return _record_dict(self._table(kind)[entity_id])
+        if method == "PUT":
+            self.update(kind, entity_id, self._json_body(body))
+        else:
+            self.delete(kind, entity_id)
+        return {"id": entity_id}
+
+    @staticmethod
+    def _allow(method: str, *methods: str):
+        if method not in methods:
+            raise ApiError(405, f"不支持的请求方法 {method}，可用: {', '.join(methods)}")
+
+    @staticmethod
+    def _json_body(body: bytes) -> Dict:
+        try:
+            payload = json.loads(body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ApiError(400, f"请求体不是有效的JSON: {e}")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "请求体必须是JSON对象")
+        return payload
+
+    def _menu_selectors(self, body: bytes) -> List[str]:
+        menus = self._json_body(body).get("menus", [])
+        if not isinstance(menus, list):
+            raise ApiError(400, "menus 必须是宴席ID或名称的列表")
+        return [str(menu) for menu in menus]
+
+    def _table(self, kind: str) -> Dict:
+        if kind == "ingredients":
+            return self.data_manager.get_ingredients()
+        if kind == "dishes":
+            return self.data_manager.get_dishes()
+        return self.data_manager.get_menus()
+
+    def _require(self, kind: str, entity_id: str):
+        if entity_id not in self._table(kind):
+            raise ApiError(404, f"{KIND_LABELS[kind]} {entity_id} 不存在")
+
+    # 数据操作
+    def status(self) -> Dict:
+        return {
+            "data_version": self.data_manager.data_version,
+            "counts": {kind: len(self._table(kind)) for kind in ENTITY_KINDS},
+            "requests": self.requests,
+            "response_cache": self.cache.stats(),
+        }
+
+    def calculate(self, selectors: List[str]) -> List[Dict]:
+        """计算宴席食材用量和成本（结构与命令行工具的JSON输出相同），不指定宴席时计算全部"""
+        try:
+            menu_ids = resolve_menus(self.data_manager, selectors) if selectors else list(self._table("menus"))
+        except KeyError as e:
+            raise ApiError(404, f"找不到宴席 {e.args[0]}")
+        return build_results(self.data_manager, menu_ids)
+
+    def create(self, kind: str, fields: Dict) -> str:
+        args = self._entity_args(kind, fields)
+        try:
+            if kind == "ingredients":
+                return self.data_manager.add_ingredient(*args)
+            if kind == "dishes":
+                return self.data_manager.add_dish(*args)
+            return self.data_manager.add_menu(*args)
+        except ValueError as e:
+            raise ApiError(409, str(e))
+
+    def update(self, kind: str, entity_id: str, fields: Dict):
+        args = self._entity_args(kind, fields)
+        try:
+            if kind == "ingredients":
+                self.data_manager.update_ingredient(entity_id, *args)
+            elif kind == "dishes":
+                self.data_manager.update_dish(entity_id, *args)
+            else:
+                self.data_manager.update_menu(entity_id, *args)
+        except ValueError as e:
+            raise ApiError(409, str(e))
+
+    def delete(self, kind: str, entity_id: str):
+        if kind == "ingredients":
+            if not self.data_manager.delete_ingredient(entity_id):
+                raise ApiError(409, f"食材 {entity_id} 正被菜品使用，不能删除")
+        elif kind == "dishes":
+            menus = self.data_manager.menus_using(entity_id)
+            if menus:
+                raise ApiError(409, f"菜品 {entity_id} 正被宴席使用，不能删除: {', '.join(menus)}")
+            if not self.data_manager.delete_dish(entity_id):
+                dishes = self.data_manager.dishes_using_sub_recipe(entity_id)
+                raise ApiError(409, f"菜品 {entity_id} 是其他菜品的子配方，不能删除: {', '.join(dishes)}")
+        else:
+            self.data_manager.delete_menu(entity_id)
+
+    def _entity_args(self, kind: str, fields: Dict) -> Tuple:
+        """校验请求体中的实体字段，返回 DataManager 新增/修改方法的参数"""
+        name = fields.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise ApiError(400, "name 不能为空")
+        name = name.strip()
+        if kind == "ingredients":
+            unit = fields.get("unit")
+            if not isinstance(unit, str) or not unit.strip():
+                raise ApiError(400, "unit 不能为空")
+            return name, unit.strip(), self._number(fields.get("price", 0.0), "price")
+        if kind == "dishes":
+            sub_recipes = fields.get("sub_recipes", {})
+            return (name, self._amounts(fields.get("ingredients"), "ingredients", "ingredients", float),
+                    self._amounts(sub_recipes, "sub_recipes", "dishes", float))
+        table_count = self._number(fields.get("table_count", 1), "table_count", int)
+        if table_count < 1:
+            raise ApiError(400, "table_count 必须大于0")
+        return name, self._amounts(fields.get("dishes"), "dishes", "dishes", int), table_count
+
+    def _amounts(self, value, field: str, kind: str, number_type) -> Dict:
+        """校验 {实体ID: 数量}（kind 为引用的实体类型），引用的实体必须存在"""
+        if not isinstance(value, dict):
+            raise ApiError(400, f"{field} 必须是 {{ID: 数量}} 对象")
+        table = self._table(kind)
+        amounts = {}
+        for entity_id, amount in value.items():
+            if entity_id not in table:
+                raise ApiError(400, f"{KIND_LABELS[kind]} {entity_id} 不存在")
+            amounts[entity_id] = self._number(amount, f"{field}.{entity_id}", number_type)
+        return amounts
+
+    @staticmethod
+    def _number(value, field: str, number_type=float):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ApiError(400, f"{field} 必须是数字")
+        if number_type is int and value != int(value):
+            raise ApiError(400, f"{field} 必须是整数")
+        return number_type(value)
+
+    # HTTP
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的请求（HTTP/1.1 默认保持连接）"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ApiError as e:
+                    # 无法继续解析这个连接上的后续请求，回复错误后关闭连接
+                    status, response, keep_alive = e.status, encode_json({"error": str(e)}), False
+                else:
+                    if request is None:
+                        break
+                    method, target, body, keep_alive = request
+                    status, response = await self.handle_async(method, target, body)
+                writer.write(b"".join((
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n".encode("ascii"),
+                    b"Content-Type: application/json; charset=utf-8\r\n",
+                    f"Content-Length: {len(response)}\r\n".encode("ascii"),
+                    b"Connection: keep-alive\r\n\r\n" if keep_alive else b"Connection: close\r\n\r\n",
+                    response,
+                )))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes, bool]]:
+        """读取一个请求，返回 (方法, 路径, 请求体, 是否保持连接)，连接已关闭时返回None"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise ApiError(400, "无效的请求行")
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise ApiError(400, "无效的 Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise ApiError(413, f"请求体超过 {MAX_BODY_SIZE} 字节")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, body, keep_alive
+
+    async def poll_external_changes(self, interval: float = SHARED_POLL_INTERVAL):
+        """共享数据文件时定时合并其他工作站保存的变更（数据版本号随之改变，缓存自动失效）
+
+        检查和合并需要等待文件锁、读取数据文件，同样在执行器中进行。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            async with self._data_lock:
+                await loop.run_in_executor(self._executor, self.data_manager.check_external_changes)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        poller = None
+        if self.data_manager.sync is not None:
+            poller = asyncio.ensure_future(self.poll_external_changes())
+        addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+        print(f"接口服务已启动: {addresses}（Ctrl+C 停止）", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if poller is not None:
+                poller.cancel()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="宴席菜品配料统计本地 HTTP/JSON 接口（无需图形界面）")
+    parser.add_argument("--data", help="数据文件路径，默认为程序目录下的 dish_data.json")
+    parser.add_argument("--persistence", choices=PERSISTENCE_MODES, default="snapshot",
+                        help="数据存储方式，与图形界面使用的方式保持一致")
+    parser.add_argument("--lazy", action="store_true", help="延迟加载菜品和宴席（需要 --persistence binary）")
+    parser.add_argument("--shared", action="store_true",
+                        help="与其他工作站共用数据文件，定时合并其他工作站保存的变更")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只接受本机连接")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--cache-size", type=int, default=512, help="响应缓存条数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.lazy and args.persistence != "binary":
+        print("错误: --lazy 需要同时指定 --persistence binary", file=sys.stderr)
+        return 1
+    try:
+        if not ipaddress.ip_address(args.host).is_loopback:
+            print(f"警告: 接口没有身份验证，监听 {args.host} 时其他电脑也可以修改数据", file=sys.stderr)
+    except ValueError:
+        pass
+
+    data_file = os.path.abspath(args.data) if args.data else "dish_data.json"
+    # DataManager 在加载、保存（包括后台线程中的保存）和合并变更时打印的提示全部写到标准错误，
+    # 标准输出不混入日志
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            data_manager = DataManager(data_file, persistence=args.persistence, write_behind=True,
+                                       lazy=args.lazy, shared=args.shared)
+        except ValueError as e:
+            print(f"错误: {e}")
+            return 1
+        server = ApiServer(data_manager, cache_size=args.cache_size)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"错误: 无法启动接口服务: {e}")
+            return 1
+        finally:
+            server.close()
+            data_manager.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+宴席菜品配料统计系统性能基准测试
+
+用固定随机种子生成规模可调的模拟数据（食材、菜品配方、宴席菜单），测量
+DataManager 的加载、保存、增删改、宴席计算和Excel导出的耗时与内存峰值。
+结果可保存为JSON基准文件，并与之前的基准比较，找出变慢或内存增长的操作。
+
+示例:
+    python benchmark.py --scale 10k
+    python benchmark.py --scale 200k --skip export_to_excel --output baseline.json
+    python benchmark.py --scale 10k --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import binary_snapshot
+from data_manager import PERSISTENCE_MODES, DataManager
+
+# 退出码
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_REGRESSION = 2
+
+# 预设规模: (食材数, 菜品数, 宴席数)
+SCALES = {
+    "1k": (1_000, 500, 50),
+    "10k": (10_000, 5_000, 500),
+    "50k": (50_000, 25_000, 2_500),
+    "200k": (200_000, 100_000, 10_000),
+}
+
+# 模拟数据用的名称和单位
+INGREDIENT_PREFIXES = ("", "鲜", "土", "本地", "东北", "进口", "有机", "冷冻", "野生", "精选")
+INGREDIENT_BASES = ("猪肉", "五花肉", "排骨", "牛腩", "牛肉", "羊肉", "鸡胸", "鸡腿", "鸭", "鲈鱼", "草鱼",
+                    "虾仁", "鱿鱼", "豆腐", "青菜", "白菜", "土豆", "萝卜", "香菇", "木耳", "大米", "面粉",
+                    "鸡蛋", "洋葱", "番茄", "辣椒", "生姜", "大蒜", "葱", "香菜", "花生", "粉丝")
+UNITS = ("斤", "公斤", "克", "个", "只", "条", "把", "袋", "瓶")
+COOKING_METHODS = ("红烧", "清蒸", "爆炒", "干煸", "糖醋", "凉拌", "黄焖", "白灼", "椒盐", "酱爆", "油焖", "香煎")
+BANQUET_TYPES = ("婚宴", "寿宴", "满月酒", "升学宴", "商务宴", "年夜饭", "家宴", "答谢宴")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="DataManager 与导出功能的性能基准测试")
+    parser.add_argument("--scale", choices=sorted(SCALES, key=lambda name: SCALES[name]), default="10k",
+                        help="预设数据规模（食材/菜品/宴席: 1k=1000/500/50 ... 200k=200000/100000/10000）")
+    parser.add_argument("--ingredients", type=int, help="覆盖预设的食材数量")
+    parser.add_argument("--dishes", type=int, help="覆盖预设的菜品数量")
+    parser.add_argument("--menus", type=int, help="覆盖预设的宴席数量")
+    parser.add_argument("--seed", type=int, default=20240101, help="随机种子，相同种子生成相同的数据")
+    parser.add_argument("--persistence", choices=PERSISTENCE_MODES, default="snapshot",
+                        help="数据存储方式")
+    parser.add_argument("--repeat", type=int, default=3, help="加载、保存、计算等操作的重复次数")
+    parser.add_argument("--mutations", type=int, default=10, help="每种增删改操作的执行次数")
+    parser.add_argument("--skip", action="append", default=[], metavar="操作",
+                        help="跳过的操作（名称前缀，如 export_to_excel），可重复指定")
+    parser.add_argument("--no-memory", action="store_true", help="不测量内存峰值（tracemalloc 会拖慢被测操作）")
+    parser.add_argument("--lazy", action="store_true", help="延迟加载菜品和宴席（需要 --persistence binary）")
+    parser.add_argument("--instrument", action="store_true",
+                        help="开启 DataManager 运行统计（用于衡量统计本身的开销），结果中附带统计数据")
+    parser.add_argument("--output", help="将结果保存为JSON基准文件")
+    parser.add_argument("--compare", metavar="基准文件", help="与之前保存的基准比较")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="判定为退化的相对增幅，默认0.25（即慢25%%或内存多25%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="耗时增加小于该毫秒数时不判定为退化（避免测量噪声）")
+    parser.add_argument("--min-delta-kib", type=float, default=64.0,
+                        help="内存峰值增加小于该KiB数时不判定为退化")
+    return parser.parse_args(argv)
+
+
+# 数据生成
+def _unique_name(base: str, used: Dict[str, int]) -> str:
+    """重名时追加序号"""
+    count = used.get(base, 0)
+    used[base] = count + 1
+    return base if count == 0 else f"{base}{count + 1}"
+
+
+def generate_catalog(ingredient_count: int, dish_count: int, menu_count: int, seed: int) -> Dict:
+    """生成模拟数据（与数据文件格式相同）
+
+    食材的使用频率近似Zipf分布（少数常用食材出现在大量菜品中），每道菜3-12种食材，
+    每个宴席8-24道菜，结果只由参数和随机种子决定。
+    """
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1).isoformat()
+
+    used: Dict[str, int] = {}
+    ingredients = {}
+    for number in range(1, ingredient_count + 1):
+        name = _unique_name(rng.choice(INGREDIENT_PREFIXES) + rng.choice(INGREDIENT_BASES), used)
+        ingredients[str(number)] = {
+            "name": name,
+            "unit": rng.choice(UNITS),
+            "price": round(rng.lognormvariate(2.5, 0.8), 2),
+        }
+
+    ingredient_ids = list(ingredients)
+    popularity = list(itertools.accumulate(1.0 / (rank + 1) ** 0.8 for rank in range(ingredient_count)))
+    used = {}
+    dishes = {}
+    for number in range(1, dish_count + 1):
+        chosen = rng.choices(ingredient_ids, cum_weights=popularity, k=rng.randint(3, 12)) if ingredient_ids else []
+        main = ingredients[chosen[0]]["name"] if chosen else rng.choice(INGREDIENT_BASES)
+        dishes[str(number)] = {
+            "name": _unique_name(rng.choice(COOKING_METHODS) + main, used),
+            "ingredients": {ing_id: round(rng.uniform(0.05, 3.0), 2) for ing_id in chosen},
+        }
+
+    dish_ids = list(dishes)
+    menus = {}
+    for number in range(1, menu_count + 1):
+        chosen = rng.sample(dish_ids, min(len(dish_ids), rng.randint(8, 24)))
+        menus[str(number)] = {
+            "name": f"{rng.choice(BANQUET_TYPES)}{number}号",
+            "dishes": {dish_id: rng.randint(1, 3) for dish_id in chosen},
+            "table_count": rng.randint(1, 60),
+        }
+
+    return {
+        "version": "1.0",
+        "created_time": now,
+        "last_modified": now,
+        "ingredients": ingredients,
+        "dishes": dishes,
+        "menus": menus,
+        "next_ids": {
+            "ingredients": ingredient_count + 1,
+            "dishes": dish_count + 1,
+            "menus": menu_count + 1,
+        },
+    }
+
+
+# 测量
+class BenchmarkRunner:
+    """执行被测操作并记录耗时和内存峰值
+
+    每个操作先不开启 tracemalloc 计时，再额外执行一次测量内存峰值，
+    内存追踪不会影响计时结果。被测操作的 print 输出被丢弃。
+    """
+
+    def __init__(self, skip: List[str], measure_memory: bool = True):
+        self.skip = skip
+        self.measure_memory = measure_memory
+        self.results: Dict[str, Dict] = {}
+        self._devnull = open(os.devnull, "w", encoding="utf-8")
+
+    def close(self):
+        self._devnull.close()
+
+    def skipped(self, name: str) -> bool:
+        return any(name.startswith(prefix) for prefix in self.skip)
+
+    def measure(self, name: str, func: Callable[[int], object], runs: int,
+                setup: Optional[Callable[[int], object]] = None):
+        """执行 func(第几次) runs 次并记录耗时；setup(第几次) 在每次执行前调用，不计入耗时"""
+        if self.skipped(name) or runs <= 0:
+            return
+        timings = []
+        gc.collect()
+        for index in range(runs):
+            if setup is not None:
+                with self._quiet():
+                    setup(index)
+            with self._quiet():
+                start = time.perf_counter()
+                func(index)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        result = {
+            "runs": runs,
+            "min_ms": min(timings),
+            "median_ms": statistics.median(timings),
+            "mean_ms": statistics.fmean(timings),
+        }
+        if self.measure_memory:
+            if setup is not None:
+                with self._quiet():
+                    setup(runs)
+            result["peak_kib"] = self._peak_kib(lambda: func(runs))
+        self.results[name] = result
+        self._print_result(name, result)
+
+    def record_memory(self, name: str, func: Callable[[], object]) -> object:
+        """执行一次 func，记录内存峰值和执行后仍占用的内存（如加载后的数据），返回 func 的结果"""
+        if not self.measure_memory:
+            with self._quiet():
+                start = time.perf_counter()
+                value = func()
+                elapsed = (time.perf_counter() - start) * 1000
+            result = {"runs": 1, "min_ms": elapsed, "median_ms": elapsed, "mean_ms": elapsed}
+        else:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                with self._quiet():
+                    start = time.perf_counter()
+                    value = func()
+                    elapsed = (time.perf_counter() - start) * 1000
+                gc.collect()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            result = {"runs": 1, "min_ms": elapsed, "median_ms": elapsed, "mean_ms": elapsed,
+                      "peak_kib": peak / 1024, "retained_kib": current / 1024}
+        self.results[name] = result
+        self._print_result(name, result)
+        return value
+
+    def _peak_kib(self, func: Callable[[], object]) -> float:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            with self._quiet():
+                func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak / 1024
+
+    def _quiet(self):
+        return contextlib.redirect_stdout(self._devnull)
+
+    @staticmethod
+    def _print_result(name: str, result: Dict):
+        memory = f"{result['peak_kib']:>12.0f}" if "peak_kib" in result else f"{'-':>12}"
+        retained = f"  常驻 {result['retained_kib']:.0f} KiB" if "retained_kib" in result else ""
+        print(f"{name:<40}{result['runs']:>5}{result['median_ms']:>12.2f}{result['min_ms']:>12.2f}"
+              f"{memory}{retained}")
+        sys.stdout.flush()
+
+
+def run_benchmarks(args, counts: Tuple[int, int, int], runner: BenchmarkRunner, work_dir: str):
+    """生成数据并依次测量各项操作"""
+    ingredient_count, dish_count, menu_count = counts
+    start = time.perf_counter()
+    catalog = generate_catalog(ingredient_count, dish_count, menu_count, args.seed)
+    data_file = os.path.join(work_dir, "dish_data.json")
+    with open(data_file, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, indent=2)
+    print(f"生成数据: {ingredient_count} 种食材, {dish_count} 道菜品, {menu_count} 个宴席, "
+          f"{os.path.getsize(data_file) / 1024 / 1024:.1f} MiB, 用时 {time.perf_counter() - start:.1f} s")
+    menu_ids = list(catalog["menus"])
+    del catalog
+    if args.persistence == "binary":
+        # 预先转换为二进制快照，使 DataManager() 测量的是二进制文件的加载
+        binary_snapshot.convert(data_file, os.path.splitext(data_file)[0] + ".bin")
+
+    print(f"\n{'操作':<38}{'次数':>3}{'中位数(ms)':>8}{'最小(ms)':>9}{'峰值(KiB)':>9}")
+    data_manager = runner.record_memory(
+        "DataManager()", lambda: DataManager(data_file, persistence=args.persistence, instrument=args.instrument,
+                                            lazy=args.lazy))
+    try:
+        runner.measure("load_data", lambda i: data_manager.load_data(), args.repeat)
+        runner.measure("save_data", lambda i: data_manager.save_data(), args.repeat)
+        _measure_mutations(runner, data_manager, args.mutations)
+        _measure_calculations(runner, data_manager, menu_ids, args.repeat)
+        _measure_exports(runner, data_manager, menu_ids, work_dir)
+        return data_manager.stats() if args.instrument else None
+    finally:
+        data_manager.close()
+
+
+def _measure_mutations(runner: BenchmarkRunner, data_manager: DataManager, count: int):
+    """各实体的新增、修改、删除（每次都会按存储方式持久化）"""
+    ingredients = data_manager.get_ingredients()
+    dishes = data_manager.get_dishes()
+    sample_ingredients = list(itertools.islice(ingredients, 5))
+    sample_dishes = list(itertools.islice(dishes, 10))
+    added = {"ingredients": [], "dishes": [], "menus": []}
+
+    def add_ingredient(i):
+        added["ingredients"].append(data_manager.add_ingredient(f"基准测试食材{i}", "斤", 9.9))
+
+    def update_ingredient(i):
+        ing_id = added["ingredients"][i % len(added["ingredients"])]
+        data_manager.update_ingredient(ing_id, f"基准测试食材{i}改", "公斤", 10.0 + i)
+
+    def add_dish(i):
+        recipe = {ing_id: 1.0 for ing_id in sample_ingredients + added["ingredients"][:2]}
+        added["dishes"].append(data_manager.add_dish(f"基准测试菜品{i}", recipe))
+
+    def update_dish(i):
+        dish_id = added["dishes"][i % len(added["dishes"])]
+        data_manager.update_dish(dish_id, f"基准测试菜品{i}改", {sample_ingredients[0]: 0.5 + i})
+
+    def add_menu(i):
+        menu = {dish_id: 2 for dish_id in sample_dishes + added["dishes"][:2]}
+        added["menus"].append(data_manager.add_menu(f"基准测试宴席{i}", menu, 10))
+
+    def update_menu(i):
+        menu_id = added["menus"][i % len(added["menus"])]
+        data_manager.update_menu(menu_id, f"基准测试宴席{i}改", {sample_dishes[0]: 3}, 12)
+
+    def delete(kind: str, remove: Callable[[str], object]):
+        return lambda i: remove(added[kind].pop())
+
+    def runs_for(kind: str) -> int:
+        # 修改和删除只作用于本次新增的实体；内存测量会额外执行一次，删除时留出一个
+        return min(count, len(added[kind]) - 1)
+
+    runner.measure("add_ingredient", add_ingredient, count)
+    runner.measure("update_ingredient", update_ingredient, runs_for("ingredients"))
+    runner.measure("add_dish", add_dish, count)
+    runner.measure("update_dish", update_dish, runs_for("dishes"))
+    runner.measure("add_menu", add_menu, count)
+    runner.measure("update_menu", update_menu, runs_for("menus"))
+    # 先删宴席和菜品，被引用的食材不能删除
+    runner.measure("delete_menu", delete("menus", data_manager.delete_menu), runs_for("menus"))
+    for menu_id in added["menus"]:
+        data_manager.delete_menu(menu_id)
+    runner.measure("delete_dish", delete("dishes", data_manager.delete_dish), runs_for("dishes"))
+    for dish_id in added["dishes"]:
+        data_manager.delete_dish(dish_id)
+    runner.measure("delete_ingredient", delete("ingredients", data_manager.delete_ingredient),
+                   runs_for("ingredients"))
+
+
+def _measure_calculations(runner: BenchmarkRunner, data_manager: DataManager, menu_ids: List[str], repeat: int):
+    """宴席食材计算：加载后首次计算（含构建矩阵）、无缓存、命中缓存、批量计算全部宴席"""
+    if not menu_ids:
+        return
+    samples = [menu_ids[(i * 7919) % len(menu_ids)] for i in range(repeat + 1)]
+    runner.measure("calculate_ingredients_for_menu.first",
+                   lambda i: data_manager.calculate_ingredients_for_menu(samples[i]), repeat,
+                   setup=lambda i: data_manager.load_data())
+    runner.measure("calculate_ingredients_for_menu.uncached",
+                   lambda i: data_manager.calculate_ingredients_for_menu(samples[i]), repeat,
+                   setup=lambda i: data_manager.menu_cache.clear())
+    runner.measure("calculate_ingredients_for_menu.cached",
+                   lambda i: data_manager.calculate_ingredients_for_menu(samples[0]), repeat,
+                   setup=lambda i: data_manager.calculate_ingredients_for_menu(samples[0]))
+    runner.measure("calculate_ingredients_for_menus.all",
+                   lambda i: data_manager.calculate_ingredients_for_menus(menu_ids), repeat,
+                   setup=lambda i: data_manager.menu_cache.clear())
+
+
+def _measure_exports(runner: BenchmarkRunner, data_manager: DataManager, menu_ids: List[str], work_dir: str):
+    """Excel导出（每项只执行一次，大数据量时耗时很长，可用 --skip 跳过）"""
+    catalog_file = os.path.join(work_dir, "catalog.xlsx")
+    runner.measure("export_to_excel", lambda i: data_manager.export_to_excel(catalog_file), 1)
+    runner.measure("export_to_excel.streaming",
+                   lambda i: data_manager.export_to_excel(catalog_file, streaming=True), 1)
+    if menu_ids:
+        menu_id = menu_ids[0]
+        menu_name = data_manager.get_menus()[menu_id]["name"]
+        runner.measure("export_menu_statistics",
+                       lambda i: data_manager.export_menu_statistics(
+                           menu_id, menu_name, os.path.join(work_dir, "menu.xlsx")), 1)
+
+
+# 基准文件
+def build_report(args, counts: Tuple[int, int, int], results: Dict[str, Dict],
+                 stats: Optional[Dict] = None) -> Dict:
+    ingredient_count, dish_count, menu_count = counts
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "seed": args.seed,
+            "persistence": args.persistence,
+            "ingredients": ingredient_count,
+            "dishes": dish_count,
+            "menus": menu_count,
+            "instrument": args.instrument,
+            "lazy": args.lazy,
+        },
+        "results": results,
+    }
+    if stats is not None:
+        report["stats"] = stats
+    return report
+
+
+def compare_reports(baseline: Dict, current: Dict, threshold: float, min_delta_ms: float,
+                    min_delta_kib: float) -> List[str]:
+    """与基准比较，打印对比表，返回退化的操作名称"""
+    base_meta, meta = baseline.get("meta", {}), current["meta"]
+    for key in ("ingredients", "dishes", "menus", "seed", "persistence", "instrument", "lazy"):
+        if base_meta.get(key) != meta.get(key):
+            print(f"警告: 基准的 {key} 为 {base_meta.get(key)}，本次为 {meta.get(key)}，结果可能不可比")
+
+    print(f"\n{'操作':<38}{'基准(ms)':>10}{'本次(ms)':>10}{'变化':>9}{'内存变化':>10}")
+    regressions = []
+    base_results = baseline.get("results", {})
+    for name, result in current["results"].items():
+        base = base_results.get(name)
+        if base is None:
+            print(f"{name:<40}{'-':>12}{result['median_ms']:>12.2f}{'新增':>9}")
+            continue
+
+        time_ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        slower = (time_ratio > 1 + threshold
+                  and result["median_ms"] - base["median_ms"] >= min_delta_ms)
+        memory_text = "-"
+        larger = False
+        if "peak_kib" in result and base.get("peak_kib"):
+            memory_ratio = result["peak_kib"] / base["peak_kib"]
+            memory_text = f"{(memory_ratio - 1) * 100:+.0f}%"
+            larger = memory_ratio > 1 + threshold and result["peak_kib"] - base["peak_kib"] >= min_delta_kib
+        flag = ""
+        if slower or larger:
+            regressions.append(name)
+            flag = "  <-- 退化" + ("（耗时）" if slower else "") + ("（内存）" if larger else "")
+        print(f"{name:<40}{base['median_ms']:>12.2f}{result['median_ms']:>12.2f}"
+              f"{(time_ratio - 1) * 100:>+10.0f}%{memory_text:>11}{flag}")
+
+    missing = [name for name in base_results if name not in current["results"]]
+    if missing:
+        print(f"本次未测量: {', '.join(missing)}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.lazy and args.persistence != "binary":
+        print("错误: --lazy 需要同时指定 --persistence binary", file=sys.stderr)
+        return EXIT_ERROR
+    preset = SCALES[args.scale]
+    counts = (
+        args.ingredients if args.ingredients is not None else preset[0],
+        args.dishes if args.dishes is not None else preset[1],
+        args.menus if args.menus is not None else preset[2],
+    )
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"错误: 无法读取基准文件 {args.compare}: {e}", file=sys.stderr)
+            return EXIT_ERROR
+
+    runner = BenchmarkRunner(args.skip, measure_memory=not args.no_memory)
+    try:
+        with tempfile.TemporaryDirectory(prefix="dish_benchmark_") as work_dir:
+            stats = run_benchmarks(args, counts, runner, work_dir)
+    finally:
+        runner.close()
+
+    report = build_report(args, counts, runner.results, stats)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\n结果已保存到 {args.output}")
+
+    if baseline is not None:
+        regressions = compare_reports(baseline, report, args.threshold, args.min_delta_ms, args.min_delta_kib)
+        if regressions:
+            print(f"\n{len(regressions)} 项操作退化: {', '.join(regressions)}")
+            return EXIT_REGRESSION
+        print("\n没有发现性能退化")
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
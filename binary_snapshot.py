@@ -0,0 +1,488 @@
+"""二进制数据快照
+
+与 dish_data.json 内容等价的紧凑二进制格式，可通过 mmap 打开，各数值列直接以
+memoryview 访问，不需要逐个解析文本。文件结构（所有数值均为小端序）：
+
+    文件头   魔数、格式版本、各区段的偏移和长度
+    META     非实体字段（version、next_ids 等）的JSON文本，实体表只占位
+    字符串表 全部ID、名称、单位去重后以 \\0 分隔的UTF-8文本，另有每个字符串的起始偏移
+    数值列   食材 ID/名称/单位（字符串编号）和单价；
+             菜品 ID/名称和配方起始位置，配方中的食材ID和用量；
+             宴席 ID/名称/餐桌数和菜品起始位置，宴席中的菜品ID和份数；
+             菜品子配方起始位置，子配方的菜品ID和份数（格式版本2新增）；
+             食材单价是否为整数的标记（格式版本3新增）；
+             配方用量是否为整数的标记（格式版本4新增）
+
+各区段按8字节对齐。用量、单价、份数和餐桌数以 double 保存，读回时整数值还原为 int
+（单价和配方用量按标记还原，没有标记的旧版本文件同样按数值还原）。
+
+命令行转换（按输入文件内容自动识别方向）：
+
+    python binary_snapshot.py dish_data.json dish_data.bin
+    python binary_snapshot.py dish_data.bin dish_data.json
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from entity_store import INGREDIENT_IDS, Dish, IngredientTable, Menu
+
+MAGIC = b"DWSNAP\r\n"
+FORMAT_VERSION = 4
+
+# 区段名称和数值类型（array 类型码），顺序即文件中的存放顺序
+SECTIONS: Tuple[Tuple[str, str], ...] = (
+    ("meta", "B"),
+    ("string_offsets", "Q"),
+    ("string_data", "B"),
+    ("ingredient_ids", "I"),
+    ("ingredient_names", "I"),
+    ("ingredient_units", "I"),
+    ("ingredient_prices", "d"),
+    ("dish_ids", "I"),
+    ("dish_names", "I"),
+    ("dish_starts", "Q"),
+    ("recipe_ingredients", "I"),
+    ("recipe_amounts", "d"),
+    ("menu_ids", "I"),
+    ("menu_names", "I"),
+    ("menu_table_counts", "d"),
+    ("menu_starts", "Q"),
+    ("menu_dishes", "I"),
+    ("menu_quantities", "d"),
+    ("dish_sub_starts", "Q"),
+    ("sub_recipe_dishes", "I"),
+    ("sub_recipe_amounts", "d"),
+    ("ingredient_int_prices", "B"),
+    ("recipe_int_amounts", "B"),
+)
+
+# 各格式版本的区段数（旧版本的区段是新版本的前缀，缺少的区段视为空）
+_SECTION_COUNTS = {1: 18, 2: 21, 3: 22, FORMAT_VERSION: len(SECTIONS)}
+
+# 文件头：魔数、格式版本、区段数，之后每个区段一对 (偏移, 字节数)
+_HEADER = struct.Struct("<8sHH4x")
+_SECTION_ENTRY = struct.Struct("<QQ")
+HEADER_SIZE = _HEADER.size + _SECTION_ENTRY.size * len(SECTIONS)
+
+_ALIGNMENT = 8
+_BIG_ENDIAN = sys.byteorder == "big"
+
+ENTITY_KINDS = ("ingredients", "dishes", "menus")
+
+
+class BinarySnapshotError(ValueError):
+    """二进制快照文件损坏或版本不受支持"""
+
+
+def is_binary_snapshot(filename: str) -> bool:
+    """文件是否以二进制快照的魔数开头"""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _number(value: float):
+    """double 读回的整数值还原为 int（份数、餐桌数在JSON中为整数）"""
+    return int(value) if value.is_integer() else value
+
+
+class _StringTable:
+    """写出时收集并去重字符串，返回字符串编号"""
+
+    def __init__(self):
+        self.refs: Dict[str, int] = {}
+
+    def ref(self, text: str) -> int:
+        ref = self.refs.get(text)
+        if ref is None:
+            if "\0" in text:
+                raise ValueError(f"字符串中不能包含空字符: {text!r}")
+            ref = self.refs[text] = len(self.refs)
+        return ref
+
+    def encode(self) -> Tuple[array, bytes]:
+        """返回 (各字符串起始偏移, \\0 分隔的UTF-8文本)，偏移数组末尾多一项为总长度"""
+        data = "\0".join(self.refs).encode("utf-8")
+        offsets = array('Q', [0])
+        position = 0
+        for text in self.refs:
+            position += len(text.encode("utf-8")) + 1
+            offsets.append(position)
+        return offsets, data
+
+
+def _columns(data: Dict) -> Dict[str, object]:
+    """将数据转换为各区段的数组"""
+    strings = _StringTable()
+    ref = strings.ref
+    columns: Dict[str, object] = {name: array(typecode) for name, typecode in SECTIONS if typecode != "B"}
+
+    int_prices = columns["ingredient_int_prices"] = bytearray()
+    int_amounts = columns["recipe_int_amounts"] = bytearray()
+    for ingredient_id, record in data.get("ingredients", {}).items():
+        columns["ingredient_ids"].append(ref(ingredient_id))
+        columns["ingredient_names"].append(ref(record["name"]))
+        columns["ingredient_units"].append(ref(record["unit"]))
+        columns["ingredient_prices"].append(record["price"])
+        int_prices.append(isinstance(record["price"], int))
+
+    dish_starts = columns["dish_starts"]
+    dish_starts.append(0)
+    recipe_ingredients = columns["recipe_ingredients"]
+    recipe_amounts = columns["recipe_amounts"]
+    sub_starts = columns["dish_sub_starts"]
+    sub_starts.append(0)
+    sub_recipe_dishes = columns["sub_recipe_dishes"]
+    for dish_id, record in data.get("dishes", {}).items():
+        columns["dish_ids"].append(ref(dish_id))
+        columns["dish_names"].append(ref(record["name"]))
+        if isinstance(record, Dish):
+            recipe_ingredients.extend(map(ref, record.ingredient_ids()))
+            recipe_amounts.extend(record.amounts)
+            if record.int_amounts is not None:
+                int_amounts.extend(record.int_amounts)
+            else:
+                int_amounts.extend(bytes(len(record.amounts)))
+            sub_recipes = record.sub_recipes if record.has_sub_recipes() else None
+        else:
+            recipe_ingredients.extend(map(ref, record["ingredients"]))
+            recipe_amounts.extend(record["ingredients"].values())
+            int_amounts.extend(isinstance(amount, int) for amount in record["ingredients"].values())
+            sub_recipes = record.get("sub_recipes")
+        dish_starts.append(len(recipe_ingredients))
+        if sub_recipes:
+            sub_recipe_dishes.extend(map(ref, sub_recipes))
+            columns["sub_recipe_amounts"].extend(sub_recipes.values())
+        sub_starts.append(len(sub_recipe_dishes))
+
+    menu_starts = columns["menu_starts"]
+    menu_starts.append(0)
+    for menu_id, record in data.get("menus", {}).items():
+        columns["menu_ids"].append(ref(menu_id))
+        columns["menu_names"].append(ref(record["name"]))
+        columns["menu_table_counts"].append(record.get("table_count", 1))
+        columns["menu_dishes"].extend(map(ref, record["dishes"]))
+        columns["menu_quantities"].extend(record["dishes"].values())
+        menu_starts.append(len(columns["menu_dishes"]))
+
+    # 实体表在META中以 null 占位，读回时保持原有的键顺序
+    meta = {key: None if key in ENTITY_KINDS else value for key, value in data.items()}
+    columns["meta"] = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    columns["string_offsets"], columns["string_data"] = strings.encode()
+    return columns
+
+
+def write_binary_snapshot(data: Dict, f) -> int:
+    """将数据以二进制快照格式写入已打开的二进制文件，返回写入的字节数
+
+    data 中的实体表可以是普通字典，也可以是记录对象和按列存储的食材库。
+    """
+    columns = _columns(data)
+    entries = []
+    blobs = []
+    position = HEADER_SIZE
+    for name, _ in SECTIONS:
+        column = columns[name]
+        if isinstance(column, array):
+            if _BIG_ENDIAN:
+                column.byteswap()
+            blob = column.tobytes()
+        else:
+            blob = column
+        position += -position % _ALIGNMENT
+        entries.append((position, len(blob)))
+        blobs.append(blob)
+        position += len(blob)
+
+    written = 0
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(SECTIONS))
+    header += b"".join(_SECTION_ENTRY.pack(offset, length) for offset, length in entries)
+    written += f.write(header)
+    for (offset, _), blob in zip(entries, blobs):
+        if offset > written:
+            written += f.write(b"\0" * (offset - written))
+        written += f.write(blob)
+    return written
+
+
+class BinarySnapshot:
+    """通过 mmap 打开的二进制快照
+
+    数值列以 memoryview 直接映射文件内容，只有实际读取的页才会从磁盘载入；
+    单个字符串可按编号单独解码（string），也可一次性解码全部（strings）。
+    菜品和宴席可以按行号范围读取（dish_records / menu_records），不必读出全部数据。
+    使用完毕后需调用 close()（或使用 with 语句）。
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._file.close()
+            raise BinarySnapshotError(f"不是有效的二进制快照: {filename}")
+        self._views: List[memoryview] = []
+        self._columns: Dict = {}
+        self._strings: Optional[List[str]] = None
+        # 字符串编号 -> 食材编号（INGREDIENT_IDS），按需填充
+        self._ingredient_numbers: Dict[int, int] = {}
+        try:
+            self._sections = self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self) -> Dict[str, Tuple[int, int]]:
+        if len(self._mmap) < HEADER_SIZE:
+            raise BinarySnapshotError(f"不是有效的二进制快照: {self.filename}")
+        magic, version, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise BinarySnapshotError(f"不是有效的二进制快照: {self.filename}")
+        if _SECTION_COUNTS.get(version) != count:
+            raise BinarySnapshotError(f"不支持的二进制快照版本: {version}")
+        if len(self._mmap) < _HEADER.size + _SECTION_ENTRY.size * count:
+            raise BinarySnapshotError(f"二进制快照已损坏: {self.filename}")
+        sections = {name: (0, 0) for name, _ in SECTIONS[count:]}
+        for number, (name, typecode) in enumerate(SECTIONS[:count]):
+            offset, length = _SECTION_ENTRY.unpack_from(self._mmap, _HEADER.size + number * _SECTION_ENTRY.size)
+            if offset + length > len(self._mmap) or length % array(typecode).itemsize:
+                raise BinarySnapshotError(f"二进制快照已损坏: {self.filename}")
+            sections[name] = (offset, length)
+        return sections
+
+    def __enter__(self) -> "BinarySnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """释放映射（之前返回的 memoryview 随之失效）"""
+        self._columns.clear()
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def _raw(self, name: str) -> memoryview:
+        """区段的原始字节"""
+        key = (name, "B")
+        view = self._columns.get(key)
+        if view is None:
+            offset, length = self._sections[name]
+            view = self._columns[key] = memoryview(self._mmap)[offset:offset + length]
+            self._views.append(view)
+        return view
+
+    def column(self, name: str):
+        """区段内容：小端序平台上为映射文件的 memoryview，否则为转换字节序后的 array"""
+        typecode = dict(SECTIONS)[name]
+        if typecode == "B":
+            return self._raw(name)
+        values = self._columns.get(name)
+        if values is None:
+            if _BIG_ENDIAN:
+                values = array(typecode, self._raw(name))
+                values.byteswap()
+            else:
+                values = self._raw(name).cast(typecode)
+                self._views.append(values)
+            self._columns[name] = values
+        return values
+
+    def _doubles(self, name: str, start: int, end: int) -> array:
+        """double 列中 [start, end) 的副本"""
+        if _BIG_ENDIAN:
+            return self.column(name)[start:end]
+        values = array('d')
+        values.frombytes(self._raw(name)[start * 8:end * 8])
+        return values
+
+    def count(self, kind: str) -> int:
+        """实体数量（kind 为 "ingredients" / "dishes" / "menus"）"""
+        name = {"ingredients": "ingredient_ids", "dishes": "dish_ids", "menus": "menu_ids"}[kind]
+        return self._sections[name][1] // 4
+
+    def meta(self) -> Dict:
+        """非实体字段"""
+        meta = json.loads(bytes(self.column("meta")).decode("utf-8"))
+        return {key: value for key, value in meta.items() if key not in ENTITY_KINDS}
+
+    def string(self, ref: int) -> str:
+        """按编号解码单个字符串"""
+        if self._strings is not None:
+            return self._strings[ref]
+        offsets = self.column("string_offsets")
+        data = self.column("string_data")
+        return bytes(data[offsets[ref]:offsets[ref + 1] - 1]).decode("utf-8")
+
+    def strings(self) -> List[str]:
+        """全部字符串（一次性解码，结果会被缓存）"""
+        if self._strings is None:
+            count = len(self.column("string_offsets")) - 1
+            self._strings = bytes(self.column("string_data")).decode("utf-8").split("\0") if count else []
+        return self._strings
+
+    def _lookup(self, name: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+        return list(map(self.strings().__getitem__, self.column(name)[start:end].tolist()))
+
+    def index(self, kind: str) -> Tuple[List[str], List[str]]:
+        """实体的ID和名称（按行号排列），不读取配方和宴席菜品"""
+        prefix = {"ingredients": "ingredient", "dishes": "dish", "menus": "menu"}[kind]
+        return self._lookup(f"{prefix}_ids"), self._lookup(f"{prefix}_names")
+
+    def ingredients(self) -> IngredientTable:
+        """全部食材（按列存储的食材库）"""
+        ids, names = self.index("ingredients")
+        prices = self._doubles("ingredient_prices", 0, self.count("ingredients"))
+        int_prices = bytearray(self.column("ingredient_int_prices"))
+        if len(int_prices) != len(prices):
+            # 版本3之前的文件没有整数标记，整数值的单价还原为 int
+            int_prices = bytearray(price.is_integer() for price in prices)
+        return IngredientTable.from_columns(ids, names, self._lookup("ingredient_units"), prices, int_prices)
+
+    def dish_records(self, start: int, end: int) -> List[Dish]:
+        """行号在 [start, end) 内的菜品记录"""
+        strings = self.strings()
+        starts = self.column("dish_starts")[start:end + 1].tolist()
+        if not starts:
+            return []
+        first, last = starts[0], starts[-1]
+        refs = self.column("recipe_ingredients")[first:last].tolist()
+        # 每个不同的食材ID只查一次编号
+        numbers_by_ref = self._ingredient_numbers
+        for ref in set(refs).difference(numbers_by_ref):
+            numbers_by_ref[ref] = INGREDIENT_IDS.number(strings[ref])
+        numbers = array('i', map(numbers_by_ref.__getitem__, refs))
+        amounts = self._doubles("recipe_amounts", first, last)
+        int_amounts = self.column("recipe_int_amounts")
+        if len(int_amounts) == len(self.column("recipe_amounts")):
+            int_amounts = bytes(int_amounts[first:last])
+        else:
+            # 版本4之前的文件没有整数标记，整数值的用量还原为 int
+            int_amounts = bytes(amount.is_integer() for amount in amounts)
+        return [Dish.from_arrays(name, numbers[begin - first:stop - first], amounts[begin - first:stop - first],
+                                 sub_recipes, int_amounts[begin - first:stop - first])
+                for name, begin, stop, sub_recipes in zip(self._lookup("dish_names", start, end), starts, starts[1:],
+                                                          self._sub_recipes(start, end))]
+
+    def _sub_recipes(self, start: int, end: int) -> List[Optional[Dict]]:
+        """行号在 [start, end) 内的菜品的子配方（没有子配方为None）"""
+        starts = self.column("dish_sub_starts")[start:end + 1].tolist()
+        if not starts or starts[0] == starts[-1]:
+            return [None] * (end - start)
+        first, last = starts[0], starts[-1]
+        dish_ids = self._lookup("sub_recipe_dishes", first, last)
+        amounts = self.column("sub_recipe_amounts")[first:last].tolist()
+        return [dict(zip(dish_ids[begin - first:stop - first], amounts[begin - first:stop - first])) or None
+                for begin, stop in zip(starts, starts[1:])]
+
+    def sub_recipe_ids(self) -> List[List[str]]:
+        """各菜品（按行号）子配方的菜品ID，不读取配方和份数"""
+        starts = self.column("dish_sub_starts").tolist()
+        if not starts or starts[0] == starts[-1]:
+            return [[] for _ in range(self.count("dishes"))]
+        dish_ids = self._lookup("sub_recipe_dishes")
+        return [dish_ids[begin:stop] for begin, stop in zip(starts, starts[1:])]
+
+    def menu_records(self, start: int, end: int) -> List[Menu]:
+        """行号在 [start, end) 内的宴席记录"""
+        starts = self.column("menu_starts")[start:end + 1].tolist()
+        if not starts:
+            return []
+        first, last = starts[0], starts[-1]
+        dish_ids = self._lookup("menu_dishes", first, last)
+        quantities = list(map(_number, self.column("menu_quantities")[first:last].tolist()))
+        table_counts = self.column("menu_table_counts")[start:end].tolist()
+        return [Menu(name, dict(zip(dish_ids[begin - first:stop - first], quantities[begin - first:stop - first])),
+                     _number(table_count))
+                for name, table_count, begin, stop in zip(
+                    self._lookup("menu_names", start, end), table_counts, starts, starts[1:])]
+
+    def dishes(self) -> Dict[str, Dish]:
+        """全部菜品 {菜品ID: Dish}"""
+        return dict(zip(self.index("dishes")[0], self.dish_records(0, self.count("dishes"))))
+
+    def menus(self) -> Dict[str, Menu]:
+        """全部宴席 {宴席ID: Menu}"""
+        return dict(zip(self.index("menus")[0], self.menu_records(0, self.count("menus"))))
+
+    def to_data(self) -> Dict:
+        """读取全部数据，实体表为 IngredientTable 和记录对象"""
+        data = json.loads(bytes(self.column("meta")).decode("utf-8"))
+        data["ingredients"] = self.ingredients()
+        data["dishes"] = self.dishes()
+        data["menus"] = self.menus()
+        return data
+
+
+def read_binary_snapshot(filename: str) -> Dict:
+    """读取整个二进制快照"""
+    with BinarySnapshot(filename) as snapshot:
+        return snapshot.to_data()
+
+
+def load_data_file(filename: str) -> Dict:
+    """读取数据文件，按文件开头自动识别二进制快照或JSON"""
+    if is_binary_snapshot(filename):
+        return read_binary_snapshot(filename)
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def convert(source: str, target: str) -> str:
+    """在JSON数据文件和二进制快照之间转换，方向由源文件格式决定，返回目标格式名称"""
+    # 延迟导入，避免与 storage 循环导入
+    from storage import _write_json
+
+    to_binary = not is_binary_snapshot(source)
+    data = load_data_file(source)
+    temp_file = target + ".tmp"
+    try:
+        if to_binary:
+            with open(temp_file, 'wb') as f:
+                write_binary_snapshot(data, f)
+        else:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                _write_json(data, f)
+        os.replace(temp_file, target)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    return "binary" if to_binary else "json"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="在 dish_data.json 和二进制快照之间转换（自动识别输入格式）")
+    parser.add_argument("source", help="输入文件（JSON或二进制快照）")
+    parser.add_argument("target", help="输出文件")
+    args = parser.parse_args(argv)
+
+    try:
+        target_format = convert(args.source, args.target)
+    except (OSError, ValueError) as e:
+        print(f"转换失败: {e}", file=sys.stderr)
+        return 1
+    label = "二进制快照" if target_format == "binary" else "JSON"
+    print(f"已转换为{label}: {args.target}（{os.path.getsize(args.target)} 字节）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
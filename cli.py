@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+宴席菜品配料统计系统命令行工具
+
+无需图形界面，批量计算宴席食材用量并导出为 JSON / CSV / Excel。
+
+示例:
+    python cli.py --all --format xlsx --output 采购清单.xlsx
+    python cli.py --menu 1 --menu 婚宴 --format csv --output -
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+from data_manager import PERSISTENCE_MODES, DataManager
+
+# 退出码
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+RESULT_COLUMNS = ("宴席ID", "宴席名称", "餐桌数量", "食材ID", "食材名称", "总用量", "单位", "单价", "总价")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量计算宴席食材用量并导出（无需图形界面）")
+    parser.add_argument("--data", help="数据文件路径，默认为程序目录下的 dish_data.json")
+    parser.add_argument("--persistence", choices=PERSISTENCE_MODES, default="snapshot",
+                        help="数据存储方式，与图形界面使用的方式保持一致")
+    parser.add_argument("--lazy", action="store_true",
+                        help="延迟加载菜品和宴席（需要 --persistence binary），只计算少数宴席时启动更快")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--menu", action="append", default=[], metavar="ID或名称",
+                           help="要计算的宴席，可重复指定")
+    selection.add_argument("--all", action="store_true", help="计算全部宴席（默认）")
+    selection.add_argument("--list", action="store_true", help="只列出全部宴席")
+    parser.add_argument("--format", choices=("json", "csv", "xlsx"), default="json", help="输出格式")
+    parser.add_argument("--output", default="-", help="输出文件路径，'-' 表示标准输出（xlsx 必须指定文件）")
+    return parser.parse_args(argv)
+
+
+class StageTimer:
+    """记录并在标准错误输出各阶段耗时"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        print(f"[耗时] {stage}: {(now - self.last) * 1000:.1f} ms", file=sys.stderr)
+        self.last = now
+
+    def total(self):
+        print(f"[耗时] 合计: {(time.perf_counter() - self.start) * 1000:.1f} ms", file=sys.stderr)
+
+
+def resolve_menus(data_manager: DataManager, selectors: List[str]) -> List[str]:
+    """将宴席ID或名称解析为宴席ID，找不到时抛出 KeyError"""
+    menus = data_manager.get_menus()
+    menu_ids = []
+    for selector in selectors:
+        menu_id = selector if selector in menus else data_manager.find_menu_by_name(selector)
+        if menu_id is None:
+            raise KeyError(selector)
+        menu_ids.append(menu_id)
+    return menu_ids
+
+
+def build_results(data_manager: DataManager, menu_ids: List[str]) -> List[Dict]:
+    """批量计算宴席食材用量，整理为输出结构"""
+    ingredients = data_manager.get_ingredients()
+    menus = data_manager.get_menus()
+    totals_by_menu = data_manager.calculate_ingredients_for_menus(menu_ids)
+
+    results = []
+    for menu_id in menu_ids:
+        menu = menus[menu_id]
+        rows = []
+        total_cost = 0.0
+        for ing_id, amount in totals_by_menu[menu_id].items():
+            if ing_id not in ingredients:
+                continue
+            ing_info = ingredients[ing_id]
+            cost = amount * ing_info["price"]
+            total_cost += cost
+            rows.append({
+                "id": ing_id,
+                "name": ing_info["name"],
+                "unit": ing_info["unit"],
+                "amount": amount,
+                "price": ing_info["price"],
+                "cost": cost,
+            })
+        results.append({
+            "id": menu_id,
+            "name": menu["name"],
+            "table_count": menu.get("table_count", 1),
+            "ingredients": rows,
+            "total_cost": total_cost,
+        })
+    return results
+
+
+def iter_result_rows(results: List[Dict]):
+    for menu in results:
+        for row in menu["ingredients"]:
+            yield (menu["id"], menu["name"], menu["table_count"], row["id"], row["name"],
+                   row["amount"], row["unit"], row["price"], row["cost"])
+
+
+@contextlib.contextmanager
+def open_output(path: str):
+    if path == "-":
+        yield sys.stdout
+    else:
+        with open(path, "w", encoding="utf-8-sig" if path.lower().endswith(".csv") else "utf-8",
+                  newline="") as f:
+            yield f
+
+
+def write_results(results: List[Dict], output_format: str, output: str):
+    if output_format == "json":
+        with open_output(output) as f:
+            json.dump({"menus": results}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    elif output_format == "csv":
+        with open_output(output) as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_COLUMNS)
+            writer.writerows(iter_result_rows(results))
+    else:
+        from excel_export import AMOUNT_FORMAT, MONEY_FORMAT, write_streaming_workbook
+        formats = (None, None, None, None, None, AMOUNT_FORMAT, None, MONEY_FORMAT, MONEY_FORMAT)
+        write_streaming_workbook(output, [("食材统计", RESULT_COLUMNS, formats, iter_result_rows(results))])
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    timer = StageTimer()
+
+    if args.format == "xlsx" and args.output == "-":
+        print("错误: xlsx 格式必须通过 --output 指定输出文件", file=sys.stderr)
+        return EXIT_ERROR
+
+    if args.lazy and args.persistence != "binary":
+        print("错误: --lazy 需要同时指定 --persistence binary", file=sys.stderr)
+        return EXIT_ERROR
+
+    data_file = os.path.abspath(args.data) if args.data else "dish_data.json"
+    if args.data and args.persistence not in ("sqlite", "binary", "sharded") and not os.path.exists(data_file):
+        print(f"错误: 数据文件不存在: {data_file}", file=sys.stderr)
+        return EXIT_ERROR
+
+    # 数据管理器的提示信息输出到标准错误，避免混入标准输出中的结果
+    with contextlib.redirect_stdout(sys.stderr):
+        data_manager = DataManager(data_file, persistence=args.persistence, lazy=args.lazy)
+    timer.mark("加载数据")
+
+    try:
+        if args.list:
+            with open_output(args.output) as f:
+                for menu_id, menu in data_manager.get_menus().items():
+                    f.write(f"{menu_id}\t{menu['name']}\t{menu.get('table_count', 1)}桌\n")
+            return EXIT_OK
+
+        try:
+            menu_ids = resolve_menus(data_manager, args.menu) if args.menu else list(data_manager.get_menus())
+        except KeyError as e:
+            print(f"错误: 找不到宴席 {e.args[0]}", file=sys.stderr)
+            return EXIT_ERROR
+
+        results = build_results(data_manager, menu_ids)
+        timer.mark(f"计算 {len(menu_ids)} 个宴席")
+
+        write_results(results, args.format, args.output)
+        timer.mark(f"写出 {args.format}")
+        timer.total()
+        return EXIT_OK
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        data_manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,56 @@
 import json
 import os
 import sys
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
-import pandas as pd
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from entity_store import Dish, Ingredient, IngredientTable, Menu, next_id_after, to_records
+from events import ADDED, DELETED, RELOADED, UPDATED, ChangeEvent, ChangeNotifier
+from indexes import DuplicateNameError, IncrementalSearch, NameIndex, ReverseIndex, SubstringIndex, normalize_name
+from instrumentation import Instrumentation, dump_stats, hit_rate
+from io_worker import IOTask, IOWorker
+from lazy_store import LazyRecordTable
+from menu_cache import MenuResultCache
+from recipe_cache import FlatRecipeCache, cycle_edges, find_cycle
+from shared_sync import SharedDataSync
+from storage import (ENTITY_KINDS, BinaryFileStorage, Change, JournalStorage, JsonFileStorage, ShardedStorage,
+                     SnapshotCopy, SqliteStorage, snapshot_data)
+
+if TYPE_CHECKING:
+    from menu_matrix import DishMatrix
+
+# 支持的持久化方式（见 DataManager.__init__）
+PERSISTENCE_MODES = ("snapshot", "journal", "sqlite", "binary", "sharded")
+
+# pandas、numpy、openpyxl 导入耗时较长，只在首次计算或导出时才导入，缩短程序启动时间
+DEFERRED_MODULES = ("menu_matrix", "excel_export", "pandas")
+
+
+def preload_deferred_modules():
+    """预先导入计算和导出所需的模块（可在界面显示后放到后台线程执行）"""
+    import importlib
+    for module_name in DEFERRED_MODULES:
+        importlib.import_module(module_name)
+
 
 class DataManager:
     """数据管理类，负责食材、菜品数据的存储和管理"""
     
-    def __init__(self, data_file: str = "dish_data.json"):
+    # 开启运行统计时记录调用次数和耗时的方法
+    INSTRUMENTED_METHODS = (
+        "load_data", "save_data", "_persist",
+        "add_ingredient", "update_ingredient", "delete_ingredient",
+        "add_dish", "update_dish", "delete_dish",
+        "add_menu", "update_menu", "delete_menu",
+        "search_names",
+        "calculate_ingredients_for_menu", "calculate_ingredients_for_menus", "calculate_menu_cost",
+        "export_to_excel", "export_menu_statistics", "export_menu_statistics_bulk",
+    )
+    
+    def __init__(self, data_file: str = "dish_data.json", persistence: str = "snapshot",
+                 cache_size: int = 256, write_behind: bool = False, instrument: bool = False,
+                 lazy: bool = False, lazy_cache_size: int = 1024, shard_bucket_size: int = 1000,
+                 shared: bool = False):
         # 获取程序运行目录，确保在打包成exe后能正确定位数据文件
         if getattr(sys, 'frozen', False):
             # 如果是打包后的exe文件
@@ -25,14 +67,85 @@ class DataManager:
             "version": "1.0",  # 数据版本号
             "created_time": datetime.now().isoformat(),
             "last_modified": datetime.now().isoformat(),
-            "ingredients": {},  # 食材库 {id: {"name": str, "unit": str, "price": float}}
-            "dishes": {},       # 菜品库 {id: {"name": str, "ingredients": {ingredient_id: amount}}}
-            "menus": {}         # 宴席菜单 {id: {"name": str, "dishes": {dish_id: quantity}}}
+            "ingredients": {},  # 食材库 {id: Ingredient(name, unit, price)}，加载后为按列存储的 IngredientTable
+            "dishes": {},       # 菜品库 {id: Dish(name, ingredients={ingredient_id: amount}, sub_recipes={dish_id: amount})}
+            "menus": {},        # 宴席菜单 {id: Menu(name, dishes={dish_id: quantity}, table_count)}
+            "next_ids": {}      # 各类实体下一个可分配的ID {"ingredients": int, ...}
         }
         
         # 确保数据目录存在
         self._ensure_data_directory()
         
+        # 持久化方式：snapshot 每次变更重写整个文件，journal 只追加变更日志，
+        # sqlite 将数据存入同名的 .db 数据库（首次使用时自动迁移JSON数据），
+        # binary 每次变更重写同名的 .bin 二进制快照（不存在时从JSON文件加载），
+        # sharded 按实体类型和ID区间（每 shard_bucket_size 个ID）分片存入同名的 .shards 目录，
+        # 只重写变更涉及的分片（首次使用时自动迁移单文件数据）
+        self.persistence = persistence
+        self.shard_bucket_size = shard_bucket_size
+        
+        # 延迟加载（仅二进制快照）：启动时只读入食材库和菜品/宴席的ID与名称，
+        # 菜品配方和宴席内容在首次访问时读取，最多缓存 lazy_cache_size 条
+        if lazy and persistence != "binary":
+            raise ValueError("延迟加载需要使用二进制快照存储（persistence=\"binary\"）")
+        self.lazy = lazy
+        self.lazy_cache_size = lazy_cache_size
+        self.storage = self._create_storage()
+        
+        # 多个工作站共享同一数据文件（仅单文件JSON或二进制快照，不能与延迟加载同时使用）：
+        # 保存在文件锁内进行，先合并其他工作站已保存的变更；check_external_changes()
+        # 检查其他工作站的保存，只把变更的实体应用到内存中
+        if shared and (persistence not in ("snapshot", "binary") or lazy):
+            raise ValueError("共享数据文件只支持单文件JSON或二进制快照存储，且不能使用延迟加载")
+        self.sync: Optional[SharedDataSync] = SharedDataSync(self.storage.data_file) if shared else None
+        # 本工作站尚未写入共享文件的变更 {(实体类型, 实体ID): "set"/"delete"}
+        self._unsynced: Dict[Tuple[str, str], str] = {}
+        
+        # 存储中的数据是否与内存一致：持久化失败后为False，重新加载或完整保存成功后恢复
+        self._storage_in_sync = True
+        
+        # 进行中的事务：[(变更, 变更前的实体)]，None表示不在事务中
+        self._transaction: Optional[List] = None
+        
+        # 菜品×食材矩阵，首次计算时构建，之后随菜品和食材变更增量更新
+        self._matrix: Optional["DishMatrix"] = None
+        
+        # 数据版本号，每次实体变更或重新加载时递增
+        self.data_version = 0
+        
+        # 宴席食材总量和成本缓存
+        self.menu_cache = MenuResultCache(max_size=cache_size)
+        
+        # 反向索引：食材ID -> 使用它的菜品ID，菜品ID -> 包含它的宴席ID，
+        # 菜品ID -> 以它为子配方的菜品ID（延迟加载时需要读出全部菜品和宴席，首次使用时才构建）
+        self._dishes_by_ingredient = ReverseIndex("ingredients")
+        self._menus_by_dish = ReverseIndex("dishes")
+        self._dishes_by_sub_recipe = ReverseIndex("sub_recipes")
+        self._reverse_indexes_stale = False
+        
+        # 带子配方的菜品展开为纯食材配方后的缓存，子配方变更时沿依赖关系失效
+        self._flat_recipes = FlatRecipeCache()
+        
+        # 名称索引（忽略大小写），用于按名称查找和名称唯一性检查
+        self._name_indexes = {kind: NameIndex() for kind in ("ingredients", "dishes", "menus")}
+        
+        # 名称子串搜索索引（n-gram倒排索引），供下拉框输入时搜索
+        self._search_indexes = {kind: SubstringIndex() for kind in ("ingredients", "dishes", "menus")}
+        
+        # 变更事件（新增/修改/删除），事务中的事件在提交时一次性发出
+        self.events = ChangeNotifier()
+        
+        # 后台I/O线程：导出文件，以及 write_behind=True 时完整重写数据文件的保存
+        # （调用线程只记录变更，后台线程应用到自己的数据副本后写出；较新的保存会取代尚未执行的旧保存）
+        self.io_worker = IOWorker()
+        self.write_behind = write_behind
+        self._write_copy = SnapshotCopy()
+        
+        # 运行统计（调用次数、耗时分布、写入字节数），默认关闭，关闭时不包装任何方法
+        self.instrumentation: Optional[Instrumentation] = None
+        if instrument:
+            self.enable_instrumentation()
+        
         # 加载数据
         self.load_data()
     
@@ -56,13 +169,31 @@ class DataManager:
             self.data_file = os.path.join(self.app_dir, "dish_data.json")
             print(f"已切换到临时目录: {self.app_dir}")
     
+    def _create_storage(self):
+        """根据持久化方式创建存储对象"""
+        if self.persistence == "journal":
+            return JournalStorage(self.data_file)
+        if self.persistence == "sqlite":
+            db_file = os.path.splitext(self.data_file)[0] + ".db"
+            return SqliteStorage(db_file, json_file=self.data_file)
+        if self.persistence == "binary":
+            binary_file = os.path.splitext(self.data_file)[0] + ".bin"
+            return BinaryFileStorage(binary_file, json_file=self.data_file,
+                                     lazy=self.lazy, cache_size=self.lazy_cache_size)
+        if self.persistence == "sharded":
+            shard_dir = os.path.splitext(self.data_file)[0] + ".shards"
+            return ShardedStorage(shard_dir, json_file=self.data_file, bucket_size=self.shard_bucket_size)
+        if self.persistence == "snapshot":
+            return JsonFileStorage(self.data_file)
+        raise ValueError(f"不支持的持久化方式: {self.persistence}")
+    
     def load_data(self):
         """从文件加载数据"""
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    loaded_data = json.load(f)
-                    
+            self._write_copy.invalidate()
+            loaded_data = self.storage.load()
+            self._storage_in_sync = True
+            if loaded_data is not None:
                 # 数据版本兼容性处理
                 if isinstance(loaded_data, dict):
                     if "version" not in loaded_data:
@@ -72,7 +203,7 @@ class DataManager:
                         self.data.update(loaded_data)
                         self.data["last_modified"] = datetime.now().isoformat()
                 
-                print(f"数据加载成功，文件路径: {self.data_file}")
+                print(f"数据加载成功，文件路径: {self.get_data_file_path()}")
                 
             else:
                 print("数据文件不存在，将创建新的数据文件")
@@ -86,6 +217,135 @@ class DataManager:
             print(f"加载数据失败: {e}")
             print("将使用默认数据结构")
             self.save_data()
+        
+        if self.sync is not None:
+            self.sync.revision = self.data.get("revision", 0)
+        self._on_data_loaded()
+    
+    def _on_data_loaded(self):
+        """数据整体替换后重置派生数据"""
+        # 食材库按列存储，菜品和宴席转换为 __slots__ 记录（文件中仍是普通字典）
+        # （延迟加载的表在读取时直接生成记录对象）
+        if not isinstance(self.data["ingredients"], IngredientTable):
+            self.data["ingredients"] = IngredientTable(self.data["ingredients"])
+        if isinstance(self.data["dishes"], dict):
+            self.data["dishes"] = to_records(Dish, self.data["dishes"])
+        if isinstance(self.data["menus"], dict):
+            self.data["menus"] = to_records(Menu, self.data["menus"])
+        self._drop_sub_recipe_cycles()
+        
+        # ID计数器只增不减，并且必须大于已有的数字ID
+        next_ids = self.data.setdefault("next_ids", {})
+        for kind in ("ingredients", "dishes", "menus"):
+            next_ids[kind] = next_id_after(self.data[kind], next_ids.get(kind, 1))
+        
+        self.data_version += 1
+        self._matrix = None
+        self.menu_cache.clear()
+        self._flat_recipes.clear()
+        if isinstance(self.data["dishes"], LazyRecordTable):
+            self._reverse_indexes_stale = True
+        else:
+            self._rebuild_reverse_indexes()
+        for kind, name_index in self._name_indexes.items():
+            name_index.rebuild(self.data[kind])
+        for kind, search_index in self._search_indexes.items():
+            search_index.rebuild(self.data[kind])
+        self.events.notify(RELOADED)
+    
+    def _drop_sub_recipe_cycles(self):
+        """去掉数据文件中（如手工编辑后）构成循环引用的子配方，否则计算时无法展开"""
+        dishes = self.data["dishes"]
+        if isinstance(dishes, LazyRecordTable):
+            graph = dishes.sub_recipe_graph()
+        else:
+            graph = {dish_id: list(dish.sub_recipes) for dish_id, dish in dishes.items() if dish.has_sub_recipes()}
+        for dish_id, sub_id in cycle_edges(graph):
+            dishes[dish_id] = self._without_sub_recipe(dish_id, dishes[dish_id], sub_id)
+            # 数据库或文件中仍是原来的数据，下次保存时完整重写，在此之前不直接在数据库中计算
+            self._storage_in_sync = False
+    
+    @staticmethod
+    def _without_sub_recipe(dish_id: str, dish: Dish, sub_id: str) -> Dish:
+        """去掉一个形成循环引用的子配方"""
+        print(f"菜品 {dish_id} 的子配方 {sub_id} 形成循环引用，已忽略该子配方")
+        sub_recipes = dish.sub_recipes
+        del sub_recipes[sub_id]
+        return Dish.from_arrays(dish.name, dish.ingredient_numbers, dish.amounts, sub_recipes, dish.int_amounts)
+    
+    def _rebuild_reverse_indexes(self):
+        self._dishes_by_ingredient.rebuild(self.data["dishes"])
+        self._dishes_by_sub_recipe.rebuild(self.data["dishes"])
+        self._menus_by_dish.rebuild(self.data["menus"])
+        self._reverse_indexes_stale = False
+    
+    def _reverse_index(self, kind: str) -> ReverseIndex:
+        """反向索引（"ingredients": 食材 -> 菜品，"dishes": 菜品 -> 宴席，
+        "sub_recipes": 子配方 -> 菜品），需要时先构建"""
+        if self._reverse_indexes_stale:
+            self._rebuild_reverse_indexes()
+        if kind == "ingredients":
+            return self._dishes_by_ingredient
+        if kind == "sub_recipes":
+            return self._dishes_by_sub_recipe
+        return self._menus_by_dish
+    
+    def _on_entity_changed(self, kind: str, entity_id: str, previous: Optional[Dict]):
+        """单个实体变更后增量更新派生数据"""
+        self.data_version += 1
+        current = self.data[kind].get(entity_id)
+        
+        self._name_indexes[kind].update(entity_id, previous, current)
+        self._search_indexes[kind].update(entity_id, previous, current)
+        # 反向索引尚未构建时不需要更新，构建时读取的已是变更后的数据
+        if kind == "dishes" and not self._reverse_indexes_stale:
+            self._dishes_by_ingredient.update(entity_id, previous, current)
+            self._dishes_by_sub_recipe.update(entity_id, previous, current)
+        elif kind == "menus" and not self._reverse_indexes_stale:
+            self._menus_by_dish.update(entity_id, previous, current)
+        
+        # 菜品变更时，直接或间接以它为子配方的菜品展开结果随之改变（展开缓存只记录已展开过的菜品，
+        # SQLite存储在数据库中展开时不经过该缓存，因此再沿子配方反向索引查找）
+        changed_dishes = ()
+        if kind == "dishes":
+            affected = self._flat_recipes.invalidate(entity_id)
+            if not self._reverse_indexes_stale:
+                affected |= self._sub_recipe_ancestors(entity_id)
+            changed_dishes = (entity_id, *affected)
+        
+        # 精确失效缓存：宴席变更只影响自身，菜品变更影响包含它（或以它为子配方的菜品）的宴席，
+        # 单价变更只影响成本
+        if kind == "menus":
+            self.menu_cache.evict_menu(entity_id)
+        elif kind == "dishes":
+            if self._reverse_indexes_stale:
+                self.menu_cache.clear()
+            else:
+                for dish_id in changed_dishes:
+                    self.menu_cache.evict_menus(self._menus_by_dish.owners(dish_id))
+        elif kind == "ingredients":
+            if current is None or previous is None or current["price"] != previous["price"]:
+                self.menu_cache.evict_costs_with_ingredient(entity_id)
+        
+        if self._matrix is not None:
+            if kind == "dishes":
+                for dish_id in changed_dishes:
+                    if dish_id == entity_id or self._matrix.has_dish(dish_id):
+                        self._set_matrix_row(dish_id)
+            elif kind == "ingredients" and entity_id in self.data["ingredients"]:
+                self._matrix.set_price(entity_id, self.data["ingredients"][entity_id]["price"])
+    
+    def _sub_recipe_ancestors(self, dish_id: str) -> Set[str]:
+        """直接或间接以 dish_id 为子配方的全部菜品"""
+        ancestors: Set[str] = set()
+        stack = [dish_id]
+        while stack:
+            for owner in self._dishes_by_sub_recipe.owners(stack.pop()):
+                if owner not in ancestors:
+                    ancestors.add(owner)
+                    stack.append(owner)
+        ancestors.discard(dish_id)
+        return ancestors
     
     def _upgrade_data_format(self, old_data):
         """升级旧版本数据格式"""
@@ -101,59 +361,418 @@ class DataManager:
         try:
             # 更新最后修改时间
             self.data["last_modified"] = datetime.now().isoformat()
-            
-            # 保存数据到临时文件，然后重命名（原子操作）
-            temp_file = self.data_file + ".tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-            
-            # 原子性替换文件
-            if os.path.exists(temp_file):
-                if os.path.exists(self.data_file):
-                    os.remove(self.data_file)
-                os.rename(temp_file, self.data_file)
-            
-            print(f"数据保存成功，文件路径: {self.data_file}")
-            
+            if self.sync is not None:
+                self._persist_shared([])
+            elif self._writes_in_background():
+                self._submit_background_write(None, announce=True)
+                return
+            else:
+                self.storage.save(self.data)
+            self._storage_in_sync = True
+            print(f"数据保存成功，文件路径: {self.get_data_file_path()}")
         except Exception as e:
             print(f"保存数据失败: {e}")
-            # 如果保存失败，尝试清理临时文件
-            temp_file = self.data_file + ".tmp"
-            if os.path.exists(temp_file):
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待后台保存和导出全部完成"""
+        return self.io_worker.flush(timeout)
+    
+    def close(self):
+        """关闭存储，等待后台写入完成"""
+        self.io_worker.shutdown()
+        self.storage.close()
+    
+    def _writes_in_background(self) -> bool:
+        # 只有每次都完整重写文件的存储才能在后台写出并合并；日志和SQLite的增量写入
+        # 本身很快，且依赖写入顺序和序号，仍在调用线程中同步完成；
+        # 延迟加载时写完新文件要立即改为映射新文件，同样同步完成；
+        # 共享数据文件时写入前要在文件锁内合并其他工作站的变更，也同步完成
+        return self.write_behind and self.storage.full_snapshot and not self.lazy and self.sync is None
+    
+    def _submit_background_write(self, changes: Optional[List[Change]], announce: bool = False):
+        """把变更交给后台线程写出，changes 为 None 时完整保存
+        
+        完整保存时在调用线程中复制全部实体表（开销与数据总量成正比）；
+        单次编辑只把变更的实体排入队列，由后台线程应用到自己的数据副本上再写出。
+        """
+        if changes is None:
+            self._write_copy.reset(self.data)
+        else:
+            self._write_copy.add(changes, self.data)
+        write = self.storage.save
+        if self.instrumentation is not None:
+            write = self.instrumentation.wrap("background_write", write)
+        
+        def run(task):
+            write(self._write_copy.take())
+            if announce:
+                print(f"数据保存成功，文件路径: {self.get_data_file_path()}")
+        
+        self.io_worker.submit(run, key="save", urgent=True,
+                              on_error=lambda e: print(f"保存数据失败: {e}"))
+    
+    def _persist(self, changes: List[Change]):
+        """持久化一组实体变更"""
+        try:
+            self.data["last_modified"] = datetime.now().isoformat()
+            if self.sync is not None:
+                self._persist_shared(changes)
+            elif self._writes_in_background():
+                self._submit_background_write(changes)
+            elif self._storage_in_sync:
+                self.storage.record(changes, self.data)
+            else:
+                # 之前的写入失败（或加载时修正了数据），存储中缺少部分变更，完整重写一次恢复一致
+                self.storage.save(self.data)
+                self._storage_in_sync = True
+        except DuplicateNameError:
+            raise
+        except Exception as e:
+            self._storage_in_sync = False
+            print(f"保存数据失败: {e}，下次保存时将完整重写数据")
+    
+    # 多工作站共享数据文件
+    def _persist_shared(self, changes: List[Change]):
+        """在文件锁内合并其他工作站的变更后写出数据，并记录新的修订
+        
+        保存失败时变更仍记为未同步，下次保存时一并写入变更记录。
+        合并进来的实体与本次变更的名称（忽略大小写）相同时不写出，抛出 DuplicateNameError，
+        由调用方撤销内存中的变更。
+        """
+        unsynced = dict(self._unsynced)
+        for op, kind, entity_id, _ in changes:
+            self._unsynced[(kind, entity_id)] = op
+        with self.sync.lock:
+            state = self.sync.read_state()
+            if state["revision"] > self.sync.revision:
+                pulled = self._pull_external_changes(state["revision"])
+                # 加锁前的名称检查看不到其他工作站刚保存的实体，合并后在锁内重新检查
                 try:
-                    os.remove(temp_file)
-                except:
-                    pass
+                    self._check_pulled_names(changes, pulled)
+                except DuplicateNameError:
+                    self._unsynced = unsynced
+                    raise
+            revision = max(state["revision"], self.sync.revision) + 1
+            self.data["revision"] = revision
+            self.storage.save(self.data)
+            feed = [(op, kind, entity_id) for (kind, entity_id), op in self._unsynced.items()]
+            self.sync.commit(revision, feed, self.data["next_ids"])
+            self._unsynced.clear()
+    
+    def check_external_changes(self) -> int:
+        """检查其他工作站是否保存了新数据，有则只把变更的实体应用到内存中并发出变更事件
+        
+        返回更新的实体数；未共享数据文件、事务进行中或没有外部变更时返回0。
+        图形界面中定时调用。
+        """
+        if self.sync is None or self._transaction is not None or not self.sync.has_external_changes():
+            return 0
+        try:
+            with self.sync.lock:
+                state = self.sync.read_state()
+                if state["revision"] <= self.sync.revision:
+                    return 0
+                return len(self._pull_external_changes(state["revision"]))
+        except Exception as e:
+            print(f"读取其他工作站的变更失败: {e}")
+            return 0
+    
+    def _pull_external_changes(self, revision: int) -> List[Tuple[str, str]]:
+        """读取共享文件，应用其他工作站在 revision 之前保存的变更（需持有文件锁）
+        
+        只更新变更记录中列出的实体；同一实体在本工作站也有未保存的修改时保留本地修改
+        （以实体为单位合并）。变更记录已被截断时逐个比较全部实体。
+        返回更新的实体 [(实体类型, 实体ID)]。
+        """
+        loaded = self.storage.load()
+        if loaded is None:
+            return []
+        changes = self.sync.changes_since(self.sync.revision, revision)
+        if changes is None:
+            changes = [("set", kind, entity_id) for kind in ENTITY_KINDS
+                       for entity_id in set(self.data[kind]).union(loaded[kind])]
+        
+        applied = []
+        holding = self.events.holding
+        if not holding:
+            self.events.hold()
+        try:
+            for _, kind, entity_id in changes:
+                if (kind, entity_id) in self._unsynced:
+                    print(f"{self._KIND_LABELS[kind]} {entity_id} 同时被其他工作站修改，保留本工作站的修改")
+                    continue
+                if self._apply_external_entity(kind, entity_id, loaded[kind].get(entity_id)):
+                    applied.append((kind, entity_id))
+            next_ids = self.data["next_ids"]
+            for kind, value in loaded.get("next_ids", {}).items():
+                next_ids[kind] = max(next_ids.get(kind, 1), value)
+            self.sync.revision = revision
+        finally:
+            if not holding:
+                self.events.release()
+        if applied:
+            print(f"已合并其他工作站的 {len(applied)} 项变更")
+        return applied
+    
+    def _check_pulled_names(self, changes: List[Change], pulled: List[Tuple[str, str]]):
+        """本次变更的名称与刚合并进来的实体相同（忽略大小写）时抛出 DuplicateNameError"""
+        pulled = set(pulled)
+        for op, kind, entity_id, record in changes:
+            if op == "set" and any((kind, other_id) in pulled
+                                   for other_id in self._name_indexes[kind].ids(record["name"])
+                                   if other_id != entity_id):
+                raise DuplicateNameError(f"{self._KIND_LABELS[kind]}名称 '{record['name']}' 已存在")
+    
+    _RECORD_CLASSES = {"ingredients": Ingredient, "dishes": Dish, "menus": Menu}
+    
+    def _apply_external_entity(self, kind: str, entity_id: str, value: Optional[Dict]) -> bool:
+        """把共享文件中的一个实体写入内存（value 为None表示已删除），内容相同时不变"""
+        table = self.data[kind]
+        previous = table.get(entity_id)
+        if value is None:
+            if previous is None:
+                return False
+            del table[entity_id]
+            self._on_entity_changed(kind, entity_id, previous)
+            self.events.notify(DELETED, kind, entity_id)
+            return True
+        
+        record_class = self._RECORD_CLASSES[kind]
+        record = value if isinstance(value, record_class) else record_class.from_dict(value)
+        if kind == "dishes" and record.has_sub_recipes():
+            # 两个工作站分别保存的修改合在一起也可能形成循环引用
+            cycle = find_cycle(table, entity_id, record.sub_recipes)
+            while cycle is not None:
+                record = self._without_sub_recipe(entity_id, record, cycle[1])
+                cycle = find_cycle(table, entity_id, record.sub_recipes)
+        if previous is not None and previous == record:
+            return False
+        table[entity_id] = record
+        self._on_entity_changed(kind, entity_id, previous)
+        self.events.notify(ADDED if previous is None else UPDATED, kind, entity_id)
+        return True
+    
+    def _set_entity(self, kind: str, entity_id: str, record: Dict):
+        """写入单个实体（新增或整体替换）"""
+        previous = self.data[kind].get(entity_id)
+        self.data[kind][entity_id] = record
+        self._on_entity_changed(kind, entity_id, previous)
+        self._record_change(("set", kind, entity_id, record), previous)
+        self.events.notify(ADDED if previous is None else UPDATED, kind, entity_id)
+    
+    def _delete_entity(self, kind: str, entity_id: str):
+        """删除单个实体"""
+        previous = self.data[kind].pop(entity_id)
+        self._on_entity_changed(kind, entity_id, previous)
+        self._record_change(("delete", kind, entity_id, None), previous)
+        self.events.notify(DELETED, kind, entity_id)
+    
+    def _record_change(self, change: Change, previous: Optional[Dict]):
+        """事务中暂存变更，否则立即持久化"""
+        if self._transaction is not None:
+            self._transaction.append((change, previous))
+        else:
+            try:
+                self._persist([change])
+            except DuplicateNameError:
+                # 共享数据文件时其他工作站已保存了同名实体
+                self._undo_change(change, previous)
+                raise
+    
+    @contextmanager
+    def transaction(self):
+        """批量修改数据：事务内的变更在提交时只持久化一次，发生异常时回滚内存数据
+        
+        用法:
+            with data_manager.transaction():
+                for name, unit, price in rows:
+                    data_manager.add_ingredient(name, unit, price)
+        """
+        if self._transaction is not None:
+            # 嵌套事务并入外层事务
+            yield self
+            return
+        
+        self._transaction = []
+        self.events.hold()
+        try:
+            yield self
+        except BaseException:
+            pending, self._transaction = self._transaction, None
+            self._rollback(pending)
+            self.events.discard()
+            raise
+        
+        pending, self._transaction = self._transaction, None
+        if pending:
+            try:
+                self._persist(self._coalesce_changes([change for change, _ in pending]))
+            except DuplicateNameError:
+                # 共享数据文件时其他工作站已保存了同名实体：撤销整个事务，
+                # 排队的事件中混有合并进来的变更，改为通知整体刷新
+                self._rollback(pending)
+                self.events.notify(RELOADED)
+                self.events.release()
+                raise
+        self.events.release()
+    
+    def _rollback(self, pending: List):
+        """按相反顺序撤销事务中的变更"""
+        for change, previous in reversed(pending):
+            self._undo_change(change, previous)
+        print(f"事务已回滚，撤销 {len(pending)} 项变更")
+    
+    def _undo_change(self, change: Change, previous: Optional[Dict]):
+        """把内存中的一个实体恢复为变更前的状态"""
+        _, kind, entity_id, _ = change
+        current = self.data[kind].get(entity_id)
+        if previous is None:
+            self.data[kind].pop(entity_id, None)
+        else:
+            self.data[kind][entity_id] = previous
+        self._on_entity_changed(kind, entity_id, current)
+    
+    @staticmethod
+    def _coalesce_changes(changes: List[Change]) -> List[Change]:
+        """同一实体的多次变更只保留最后一次"""
+        latest = {}
+        for change in changes:
+            key = (change[1], change[2])
+            latest.pop(key, None)
+            latest[key] = change
+        return list(latest.values())
+    
+    def subscribe(self, callback: Callable[[List[ChangeEvent]], None]) -> Callable[[], None]:
+        """订阅数据变更事件，callback 收到 [ChangeEvent(变更类型, 实体类型, 实体ID)]
+        
+        返回取消订阅的函数。事务中的变更在提交时合并为一批发出，回滚时不发出。
+        """
+        return self.events.subscribe(callback)
+    
+    # 运行统计
+    def enable_instrumentation(self) -> Instrumentation:
+        """开启运行统计：记录各操作的调用次数、耗时分布和每次写文件的字节数"""
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation()
+            self.instrumentation.attach(self, self.INSTRUMENTED_METHODS)
+            self.storage.on_write = self.instrumentation.record_write
+        return self.instrumentation
+    
+    def disable_instrumentation(self):
+        """关闭运行统计并丢弃已记录的数据"""
+        if self.instrumentation is not None:
+            Instrumentation.detach(self, self.INSTRUMENTED_METHODS)
+            self.storage.on_write = None
+            self.instrumentation = None
+    
+    def stats(self) -> Dict:
+        """运行统计
+        
+        始终包含实体数量和缓存命中率；开启运行统计后还包含 operations
+        （各操作的调用次数、失败次数、耗时和耗时分布）和 writes（写文件次数和字节数）。
+        """
+        cache = self.menu_cache.stats()
+        cache["hit_rate"] = hit_rate(cache["hits"], cache["misses"])
+        cache["cost_hit_rate"] = hit_rate(cache["cost_hits"], cache["cost_misses"])
+        flat_recipes = self._flat_recipes.stats()
+        flat_recipes["hit_rate"] = hit_rate(flat_recipes["hits"], flat_recipes["misses"])
+        stats = {
+            "enabled": self.instrumentation is not None,
+            "persistence": self.persistence,
+            "data_version": self.data_version,
+            "entities": {kind: len(self.data[kind]) for kind in ("ingredients", "dishes", "menus")},
+            "caches": {"menu_results": cache, "flat_recipes": flat_recipes, **self._lazy_cache_stats()},
+            "pending_io_tasks": self.io_worker.pending_count(),
+        }
+        if self.instrumentation is not None:
+            stats.update(self.instrumentation.snapshot())
+        return stats
+    
+    def _lazy_cache_stats(self) -> Dict[str, Dict]:
+        """延迟加载的菜品和宴席记录缓存"""
+        caches = {}
+        for kind in ("dishes", "menus"):
+            table = self.data[kind]
+            if isinstance(table, LazyRecordTable):
+                cache = table.cache_stats()
+                cache["hit_rate"] = hit_rate(cache["hits"], cache["misses"])
+                caches[f"lazy_{kind}"] = cache
+        return caches
+    
+    def dump_stats(self, filename: str) -> bool:
+        """将运行统计保存为JSON文件"""
+        try:
+            dump_stats(self.stats(), filename)
+            print(f"运行统计已保存到: {filename}")
+            return True
+        except Exception as e:
+            print(f"保存运行统计失败: {e}")
+            return False
     
     def get_data_file_path(self):
-        """获取数据文件路径"""
-        return self.data_file
+        """获取当前存储实际使用的数据文件路径（SQLite为数据库文件，分片存储为分片目录）"""
+        return self.storage.path
+    
+    def _allocate_id(self, kind: str) -> str:
+        """分配新的实体ID（单调递增，删除后也不会复用）"""
+        next_ids = self.data["next_ids"]
+        entity_id = next_ids.get(kind, 1)
+        if self.sync is not None:
+            # 共享数据文件时在文件锁内分配，各工作站分配的ID不会重复
+            entity_id = self.sync.allocate_id(kind, entity_id)
+        next_ids[kind] = entity_id + 1
+        return str(entity_id)
+    
+    # 名称唯一性检查
+    _KIND_LABELS = {"ingredients": "食材", "dishes": "菜品", "menus": "宴席"}
+    
+    def _check_unique_name(self, kind: str, name: str, entity_id: Optional[str] = None):
+        """名称（忽略大小写）已被其他实体使用时抛出 DuplicateNameError（ValueError 的子类）
+        
+        修改已有实体时名称（规范化后）没有变化的不检查，旧数据中已经同名的实体仍可编辑其他字段。
+        """
+        if entity_id is not None:
+            current = self.data[kind].get(entity_id)
+            if current is not None and normalize_name(current["name"]) == normalize_name(name):
+                return
+        if self._name_indexes[kind].conflicts(name, entity_id):
+            raise DuplicateNameError(f"{self._KIND_LABELS[kind]}名称 '{name}' 已存在")
+    
+    # 名称搜索
+    def search_names(self, kind: str, query: str, limit: Optional[int] = 20) -> List[str]:
+        """按名称（或ID）子串搜索指定类型（ingredients/dishes/menus）的实体"""
+        index = self._search_indexes[kind]
+        return index.rank(query, index.matches(query), limit)
+    
+    def incremental_search(self, kind: str) -> IncrementalSearch:
+        """创建输入过程中使用的连续搜索：继续输入时只在上一次的结果中过滤"""
+        return IncrementalSearch(self._search_indexes[kind])
     
     # 食材管理
     def add_ingredient(self, name: str, unit: str, price: float = 0.0) -> str:
         """添加食材"""
-        ingredient_id = str(len(self.data["ingredients"]) + 1)
-        self.data["ingredients"][ingredient_id] = {
-            "name": name,
-            "unit": unit,
-            "price": price
-        }
-        self.save_data()
+        self._check_unique_name("ingredients", name)
+        ingredient_id = self._allocate_id("ingredients")
+        self._set_entity("ingredients", ingredient_id, Ingredient(name, unit, price))
         return ingredient_id
     
     def get_ingredients(self) -> Dict:
         """获取所有食材"""
         return self.data["ingredients"]
     
+    def find_ingredient_by_name(self, name: str) -> Optional[str]:
+        """按名称（忽略大小写）查找食材ID"""
+        return self._name_indexes["ingredients"].find(name)
+    
+    def search_ingredients(self, query: str, limit: Optional[int] = 20) -> List[str]:
+        """按名称子串（忽略大小写）搜索食材，返回排序后的食材ID，以查询串开头的在前"""
+        return self.search_names("ingredients", query, limit)
+    
     def update_ingredient(self, ingredient_id: str, name: str, unit: str, price: float):
         """更新食材信息"""
         if ingredient_id in self.data["ingredients"]:
-            self.data["ingredients"][ingredient_id] = {
-                "name": name,
-                "unit": unit,
-                "price": price
-            }
-            self.save_data()
+            self._check_unique_name("ingredients", name, ingredient_id)
+            self._set_entity("ingredients", ingredient_id, Ingredient(name, unit, price))
     
     def delete_ingredient(self, ingredient_id: str):
         """删除食材"""
@@ -161,104 +780,212 @@ class DataManager:
             return False
         
         # 检查是否有菜品使用了这个食材
-        for dish_id, dish_info in self.data["dishes"].items():
-            if ingredient_id in dish_info["ingredients"]:
-                return False
+        if self._reverse_index("ingredients").is_referenced(ingredient_id):
+            return False
         
         # 删除食材
-        del self.data["ingredients"][ingredient_id]
-        self.save_data()
+        self._delete_entity("ingredients", ingredient_id)
         return True
     
     # 菜品管理
-    def add_dish(self, name: str, ingredients: Dict[str, float]) -> str:
-        """添加菜品"""
-        dish_id = str(len(self.data["dishes"]) + 1)
-        self.data["dishes"][dish_id] = {
-            "name": name,
-            "ingredients": ingredients
-        }
-        self.save_data()
+    def add_dish(self, name: str, ingredients: Dict[str, float],
+                 sub_recipes: Optional[Dict[str, float]] = None) -> str:
+        """添加菜品，sub_recipes 为用到的子配方 {菜品ID: 份数}"""
+        self._check_unique_name("dishes", name)
+        self._check_sub_recipes(None, name, sub_recipes or {})
+        dish_id = self._allocate_id("dishes")
+        self._set_entity("dishes", dish_id, Dish(name, ingredients, sub_recipes))
         return dish_id
     
     def get_dishes(self) -> Dict:
         """获取所有菜品"""
         return self.data["dishes"]
     
-    def update_dish(self, dish_id: str, name: str, ingredients: Dict[str, float]):
-        """更新菜品信息"""
+    def find_dish_by_name(self, name: str) -> Optional[str]:
+        """按名称（忽略大小写）查找菜品ID"""
+        return self._name_indexes["dishes"].find(name)
+    
+    def search_dishes(self, query: str, limit: Optional[int] = 20) -> List[str]:
+        """按名称子串（忽略大小写）搜索菜品，返回排序后的菜品ID，以查询串开头的在前"""
+        return self.search_names("dishes", query, limit)
+    
+    def update_dish(self, dish_id: str, name: str, ingredients: Dict[str, float],
+                    sub_recipes: Optional[Dict[str, float]] = None):
+        """更新菜品信息，sub_recipes 为None时保留原有的子配方"""
         if dish_id in self.data["dishes"]:
-            self.data["dishes"][dish_id] = {
-                "name": name,
-                "ingredients": ingredients
-            }
-            self.save_data()
+            self._check_unique_name("dishes", name, dish_id)
+            if sub_recipes is None:
+                sub_recipes = self.data["dishes"][dish_id]["sub_recipes"]
+            else:
+                self._check_sub_recipes(dish_id, name, sub_recipes)
+            self._set_entity("dishes", dish_id, Dish(name, ingredients, sub_recipes))
+    
+    def _check_sub_recipes(self, dish_id: Optional[str], name: str, sub_recipes: Dict[str, float]):
+        """子配方必须是已有的其他菜品，且不能形成循环引用，否则抛出 ValueError"""
+        dishes = self.data["dishes"]
+        for sub_id in sub_recipes:
+            if sub_id not in dishes:
+                raise ValueError(f"子配方菜品 {sub_id} 不存在")
+        # 新菜品还没有被其他菜品引用，不会形成循环
+        if dish_id is None:
+            return
+        cycle = find_cycle(dishes, dish_id, sub_recipes)
+        if cycle is not None:
+            names = [name if entity_id == dish_id else dishes[entity_id]["name"] for entity_id in cycle]
+            raise ValueError(f"菜品 '{name}' 的子配方形成循环引用: {' -> '.join(names)}")
+    
+    def dishes_using(self, ingredient_id: str) -> List[str]:
+        """获取使用指定食材的菜品ID列表"""
+        return sorted(self._reverse_index("ingredients").owners(ingredient_id))
+    
+    def dishes_using_sub_recipe(self, dish_id: str) -> List[str]:
+        """获取以指定菜品为子配方的菜品ID列表"""
+        return sorted(self._reverse_index("sub_recipes").owners(dish_id))
+    
+    def flattened_recipe(self, dish_id: str) -> Dict[str, float]:
+        """菜品展开全部子配方后的配方 {食材ID: 用量}"""
+        return dict(self._flat_recipe(dish_id))
+    
+    def _flat_recipe(self, dish_id: str) -> Dict[str, float]:
+        return self._flat_recipes.flatten(self.data["dishes"], dish_id)
     
     def delete_dish(self, dish_id: str):
-        """删除菜品"""
-        if dish_id in self.data["dishes"]:
-            del self.data["dishes"][dish_id]
-            self.save_data()
+        """删除菜品（被其他菜品用作子配方时不删除，返回False）"""
+        if dish_id not in self.data["dishes"]:
+            return False
+        if self._reverse_index("sub_recipes").is_referenced(dish_id):
+            return False
+        self._delete_entity("dishes", dish_id)
+        return True
     
     # 宴席菜单管理
     def add_menu(self, name: str, dishes: Dict[str, int], table_count: int = 1) -> str:
         """添加宴席菜单"""
-        menu_id = str(len(self.data["menus"]) + 1)
-        self.data["menus"][menu_id] = {
-            "name": name,
-            "dishes": dishes,
-            "table_count": table_count
-        }
-        self.save_data()
+        self._check_unique_name("menus", name)
+        menu_id = self._allocate_id("menus")
+        self._set_entity("menus", menu_id, Menu(name, dishes, table_count))
         return menu_id
     
     def get_menus(self) -> Dict:
         """获取所有宴席菜单"""
         return self.data["menus"]
     
+    def find_menu_by_name(self, name: str) -> Optional[str]:
+        """按名称（忽略大小写）查找宴席ID"""
+        return self._name_indexes["menus"].find(name)
+    
     def update_menu(self, menu_id: str, name: str, dishes: Dict[str, int], table_count: int = 1):
         """更新宴席菜单"""
         if menu_id in self.data["menus"]:
-            self.data["menus"][menu_id] = {
-                "name": name,
-                "dishes": dishes,
-                "table_count": table_count
-            }
-            self.save_data()
+            self._check_unique_name("menus", name, menu_id)
+            self._set_entity("menus", menu_id, Menu(name, dishes, table_count))
+    
+    def menus_using(self, dish_id: str) -> List[str]:
+        """获取包含指定菜品的宴席ID列表"""
+        return sorted(self._reverse_index("dishes").owners(dish_id))
     
     def delete_menu(self, menu_id: str):
         """删除宴席菜单"""
         if menu_id in self.data["menus"]:
-            del self.data["menus"][menu_id]
-            self.save_data()
+            self._delete_entity("menus", menu_id)
+    
+    def _get_matrix(self, menus: Iterable[Dict] = ()) -> "DishMatrix":
+        """获取菜品×食材矩阵，首次使用时构建
+        
+        延迟加载时矩阵起初只有食材单价，menus 中用到的菜品在计算前才逐个读取并加入。
+        """
+        dishes = self.data["dishes"]
+        lazy = isinstance(dishes, LazyRecordTable)
+        if self._matrix is None:
+            from menu_matrix import DishMatrix
+            self._matrix = DishMatrix.build(self.data["ingredients"], {} if lazy else dishes)
+            if not lazy:
+                # 带子配方的菜品改为展开后的配方
+                for dish_id, dish in dishes.items():
+                    if dish.has_sub_recipes():
+                        self._set_matrix_row(dish_id)
+        if lazy:
+            for menu in menus:
+                for dish_id in menu["dishes"]:
+                    if not self._matrix.has_dish(dish_id) and dish_id in dishes:
+                        self._set_matrix_row(dish_id)
+        return self._matrix
+    
+    def _set_matrix_row(self, dish_id: str):
+        """以菜品展开子配方后的配方更新矩阵中的一行（菜品已删除时移除该行）"""
+        dish = self.data["dishes"].get(dish_id)
+        if dish is None:
+            self._matrix.set_dish(dish_id, None)
+        elif dish.has_sub_recipes():
+            self._matrix.set_dish(dish_id, self._flat_recipe(dish_id))
+        else:
+            self._matrix.set_dish_record(dish_id, dish)
     
     def calculate_ingredients_for_menu(self, menu_id: str) -> Dict[str, float]:
         """计算宴席所需食材总量"""
         if menu_id not in self.data["menus"]:
             return {}
         
+        cached = self.menu_cache.get_totals(menu_id)
+        if cached is not None:
+            return dict(cached)
+        
         menu = self.data["menus"][menu_id]
-        total_ingredients = {}
-        
-        # 获取餐桌数量，向后兼容旧数据
-        table_count = menu.get("table_count", 1)
-        
-        for dish_id, quantity in menu["dishes"].items():
-            if dish_id in self.data["dishes"]:
-                dish = self.data["dishes"][dish_id]
-                for ingredient_id, amount in dish["ingredients"].items():
-                    # 计算总用量时考虑餐桌数量
-                    total_amount = amount * quantity * table_count
-                    if ingredient_id in total_ingredients:
-                        total_ingredients[ingredient_id] += total_amount
-                    else:
-                        total_ingredients[ingredient_id] = total_amount
+        # SQLite存储直接从数据库中取出配料项累加；事务中的变更尚未写入数据库、或之前的写入失败时，
+        # 数据库与内存不一致，使用内存中的矩阵计算；含子配方的宴席同样使用矩阵计算
+        totals = None
+        if self.persistence == "sqlite" and self._transaction is None and self._storage_in_sync:
+            totals = self.storage.calculate_ingredients_for_menu(menu_id)
+        if totals is None:
+            totals = self._get_matrix([menu]).menu_totals(menu)
+        
+        self.menu_cache.put_totals(menu_id, totals)
+        return dict(totals)
+    
+    def calculate_ingredients_for_menus(self, menu_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        """批量计算多个宴席所需食材总量，不存在的宴席结果为空"""
+        results = {}
+        missing = []
+        for menu_id in menu_ids:
+            if menu_id not in self.data["menus"]:
+                results[menu_id] = {}
+                continue
+            cached = self.menu_cache.get_totals(menu_id)
+            if cached is not None:
+                results[menu_id] = dict(cached)
+            else:
+                missing.append(menu_id)
+        
+        if missing:
+            menus = [self.data["menus"][menu_id] for menu_id in missing]
+            for menu_id, menu, totals in zip(missing, menus, self._get_matrix(menus).batch_totals(menus)):
+                self.menu_cache.put_totals(menu_id, totals)
+                results[menu_id] = dict(totals)
         
-        return total_ingredients
+        return {menu_id: results[menu_id] for menu_id in menu_ids}
+    
+    def calculate_menu_cost(self, menu_id: str) -> float:
+        """计算宴席食材总成本"""
+        cost = self.menu_cache.get_cost(menu_id)
+        if cost is None:
+            cost = self._get_matrix().totals_cost(self.calculate_ingredients_for_menu(menu_id))
+            self.menu_cache.put_cost(menu_id, cost)
+        return cost
     
-    def export_to_excel(self, filename: str):
-        """导出所有数据到Excel"""
+    def cache_stats(self) -> Dict[str, int]:
+        """获取宴席计算缓存的命中统计"""
+        return self.menu_cache.stats()
+    
+    def export_to_excel(self, filename: str, streaming: bool = False):
+        """导出所有数据到Excel
+        
+        streaming=True 时使用openpyxl只写模式逐行写出，数值单元格保留数值类型，
+        内存占用与数据量无关。
+        """
+        if streaming:
+            return self._export_to_excel_streaming(filename)
         try:
+            import pandas as pd
             with pd.ExcelWriter(filename, engine='openpyxl') as writer:
                 # 导出食材表
                 ingredients_data = []
@@ -274,15 +1001,17 @@ class DataManager:
                     df_ingredients = pd.DataFrame(ingredients_data)
                     df_ingredients.to_excel(writer, sheet_name="食材库", index=False)
                 
-                # 导出菜品表
+                # 导出菜品表（按行号直接读取食材库各列）
+                ingredients = self.data["ingredients"]
                 dishes_data = []
                 for dish_id, dish_info in self.data["dishes"].items():
                     dish_name = dish_info["name"]
                     for ing_id, amount in dish_info["ingredients"].items():
-                        if ing_id in self.data["ingredients"]:
-                            ing_name = self.data["ingredients"][ing_id]["name"]
-                            unit = self.data["ingredients"][ing_id]["unit"]
-                            price = self.data["ingredients"][ing_id]["price"]
+                        row = ingredients.position(ing_id)
+                        if row is not None:
+                            ing_name = ingredients.names[row]
+                            unit = ingredients.units[row]
+                            price = ingredients.prices[row]
                             dishes_data.append({
                                 "菜品ID": dish_id,
                                 "菜品名称": dish_name,
@@ -297,6 +1026,25 @@ class DataManager:
                     df_dishes = pd.DataFrame(dishes_data)
                     df_dishes.to_excel(writer, sheet_name="菜品配方", index=False)
                 
+                # 导出子配方表（菜品用到的其他菜品及份数）
+                sub_recipes_data = []
+                for dish_id, dish_info in self.data["dishes"].items():
+                    if not dish_info.has_sub_recipes():
+                        continue
+                    for sub_id, portions in dish_info["sub_recipes"].items():
+                        if sub_id in self.data["dishes"]:
+                            sub_recipes_data.append({
+                                "菜品ID": dish_id,
+                                "菜品名称": dish_info["name"],
+                                "子配方ID": sub_id,
+                                "子配方名称": self.data["dishes"][sub_id]["name"],
+                                "份数": f"{portions:.2f}"
+                            })
+                
+                if sub_recipes_data:
+                    df_sub_recipes = pd.DataFrame(sub_recipes_data)
+                    df_sub_recipes.to_excel(writer, sheet_name="子配方", index=False)
+                
                 # 导出宴席菜单表
                 menus_data = []
                 for menu_id, menu_info in self.data["menus"].items():
@@ -320,6 +1068,69 @@ class DataManager:
             print(f"导出Excel失败: {e}")
             return False
     
+    def _export_to_excel_streaming(self, filename: str):
+        """流式导出所有数据到Excel"""
+        try:
+            from excel_export import catalog_sheets, write_streaming_workbook
+            sheets = catalog_sheets(self.data["ingredients"], self.data["dishes"], self.data["menus"])
+            write_streaming_workbook(filename, sheets)
+            return True
+        except Exception as e:
+            print(f"导出Excel失败: {e}")
+            return False
+    
+    def export_to_excel_in_background(self, filename: str, on_done: Optional[Callable] = None,
+                                      on_error: Optional[Callable] = None,
+                                      on_progress: Optional[Callable[[int, int], None]] = None,
+                                      on_cancelled: Optional[Callable] = None) -> IOTask:
+        """在后台线程中流式导出所有数据，返回可取消的任务
+        
+        导出使用提交时的数据快照，之后的修改不影响导出内容。
+        on_progress(已写行数, 总行数)，完成时 on_done(文件名)。
+        """
+        snapshot = snapshot_data(self.data)
+        total_rows = (len(snapshot["ingredients"])
+                      + sum(len(dish["ingredients"]) for dish in snapshot["dishes"].values())
+                      + sum(len(menu["dishes"]) for menu in snapshot["menus"].values()))
+        
+        def run(task: IOTask):
+            from excel_export import catalog_sheets, write_streaming_workbook
+            sheets = catalog_sheets(snapshot["ingredients"], snapshot["dishes"], snapshot["menus"])
+            write_streaming_workbook(filename, sheets,
+                                     progress=lambda rows: task.report_progress(rows, total_rows))
+            return filename
+        
+        return self.io_worker.submit(run, on_done=on_done, on_error=on_error, on_progress=on_progress,
+                                     on_cancelled=on_cancelled)
+    
+    def _menu_statistics_payload(self, menu_id: str, menu_name: str, filename: str,
+                                 total_ingredients: Dict[str, float]) -> Dict:
+        """整理导出单个宴席统计所需的最小数据（可发送到子进程）"""
+        ingredients = self.data["ingredients"]
+        ingredient_rows = []
+        for ing_id, amount in total_ingredients.items():
+            row = ingredients.position(ing_id)
+            if row is not None:
+                ingredient_rows.append((ingredients.names[row], amount, ingredients.units[row]))
+        # 按食材名称排序
+        ingredient_rows.sort(key=lambda item: item[0])
+        
+        menu_info = self.data["menus"].get(menu_id, {})
+        dishes = self.data["dishes"]
+        dish_rows = [(dishes[dish_id]["name"], quantity)
+                     for dish_id, quantity in menu_info.get("dishes", {}).items() if dish_id in dishes]
+        
+        return {
+            "filename": filename,
+            "menu_name": menu_name,
+            "table_count": menu_info.get("table_count", 1),
+            "dish_kinds": len(menu_info.get("dishes", {})),
+            "ingredient_kinds": len(total_ingredients),
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "ingredients": ingredient_rows,
+            "dishes": dish_rows,
+        }
+    
     def export_menu_statistics(self, menu_id: str, menu_name: str, filename: str):
         """导出指定宴席的食材统计到Excel"""
         try:
@@ -330,76 +1141,126 @@ class DataManager:
                 print("没有找到宴席数据或食材数据")
                 return False
             
-            # 准备统计数据
-            statistics_data = []
-            total_cost = 0
-            
-            for ing_id, amount in total_ingredients.items():
-                if ing_id in self.data["ingredients"]:
-                    ing_info = self.data["ingredients"][ing_id]
-                    cost = amount * ing_info["price"]
-                    total_cost += cost
-                    
-                    statistics_data.append({
-                        "食材名称": ing_info["name"],
-                        "需要数量": f"{amount:.2f}",
-                        "单位": ing_info["unit"]
-                    })
-            
-            # 按食材名称排序
-            statistics_data.sort(key=lambda x: x["食材名称"])
-            
-            # 添加序号
-            for i, item in enumerate(statistics_data, 1):
-                item["序号"] = i
-            
-            # 重新排列列顺序
-            statistics_data = [{"序号": item["序号"], "食材名称": item["食材名称"], "需要数量": item["需要数量"], "单位": item["单位"]} for item in statistics_data]
-            
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                # 宴席食材统计表
-                df_statistics = pd.DataFrame(statistics_data)
-                df_statistics.to_excel(writer, sheet_name="食材统计", index=False)
-                
-                # 宴席详细信息表
-                menu_info = self.data["menus"].get(menu_id, {})
-                menu_details = []
-                
-                if menu_info:
-                    for dish_id, quantity in menu_info["dishes"].items():
-                        if dish_id in self.data["dishes"]:
-                            dish_info = self.data["dishes"][dish_id]
-                            
-                            menu_details.append({
-                                "菜品名称": dish_info["name"],
-                                "份数": quantity
-                            })
-                    
-                    # 添加序号
-                    for i, item in enumerate(menu_details, 1):
-                        item["序号"] = i
-                    
-                    # 重新排列列顺序
-                    menu_details = [{"序号": item["序号"], "菜品名称": item["菜品名称"], "份数": item["份数"]} for item in menu_details]
-                
-                if menu_details:
-                    df_menu_details = pd.DataFrame(menu_details)
-                    df_menu_details.to_excel(writer, sheet_name="菜品明细", index=False)
-                
-                # 创建汇总信息表
-                table_count = menu_info.get("table_count", 1)
-                summary_data = [
-                    {"项目": "宴席名称", "值": menu_name},
-                    {"项目": "餐桌数量", "值": table_count},
-                    {"项目": "菜品种类", "值": len(menu_info.get("dishes", {}))},
-                    {"项目": "食材种类", "值": len(total_ingredients)},
-                    {"项目": "统计时间", "值": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-                ]
-                
-                df_summary = pd.DataFrame(summary_data)
-                df_summary.to_excel(writer, sheet_name="汇总信息", index=False)
-            
+            from excel_export import write_menu_statistics_dataframes
+            write_menu_statistics_dataframes(
+                self._menu_statistics_payload(menu_id, menu_name, filename, total_ingredients))
             return True
         except Exception as e:
             print(f"导出宴席统计失败: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    def export_menu_statistics_in_background(self, menu_id: str, menu_name: str, filename: str,
+                                             on_done: Optional[Callable] = None,
+                                             on_error: Optional[Callable] = None,
+                                             on_cancelled: Optional[Callable] = None) -> Optional[IOTask]:
+        """在后台线程中导出指定宴席的食材统计，没有可导出的数据时返回None
+        
+        统计数据在调用线程中整理好，后台线程只负责写文件，完成时 on_done(文件名)。
+        """
+        total_ingredients = self.calculate_ingredients_for_menu(menu_id)
+        if not total_ingredients:
+            print("没有找到宴席数据或食材数据")
+            return None
+        payload = self._menu_statistics_payload(menu_id, menu_name, filename, total_ingredients)
+        
+        def run(task: IOTask):
+            from excel_export import write_menu_statistics_dataframes
+            return write_menu_statistics_dataframes(payload)
+        
+        return self.io_worker.submit(run, on_done=on_done, on_error=on_error, on_cancelled=on_cancelled)
+    
+    def export_menu_statistics_bulk(self, jobs: List[Tuple[str, str]],
+                                    progress_callback: Optional[Callable[[int, int, str, Optional[str]], None]] = None,
+                                    max_workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+        """使用多进程批量导出宴席食材统计
+        
+        jobs 为 [(宴席ID, 文件名)]。每个子进程只接收对应宴席整理好的数据，
+        每完成一个文件调用一次 progress_callback(已完成数, 总数, 文件名, 错误信息)。
+        返回 {文件名: 错误信息}，导出成功的文件错误信息为 None。
+        """
+        payloads, errors = self._bulk_statistics_payloads(jobs)
+        return self._write_statistics_workbooks(payloads, errors, progress_callback, max_workers)
+    
+    def export_menu_statistics_bulk_in_background(self, jobs: List[Tuple[str, str]],
+                                                  on_done: Optional[Callable] = None,
+                                                  on_error: Optional[Callable] = None,
+                                                  on_progress: Optional[Callable[[int, int], None]] = None,
+                                                  on_cancelled: Optional[Callable] = None,
+                                                  max_workers: Optional[int] = None) -> IOTask:
+        """在后台线程中批量导出宴席食材统计，返回可取消的任务
+        
+        取消后尚未开始的文件不再导出。on_progress(已完成数, 总数)，
+        完成时 on_done({文件名: 错误信息})。
+        """
+        payloads, errors = self._bulk_statistics_payloads(jobs)
+        
+        def run(task: IOTask):
+            return self._write_statistics_workbooks(
+                payloads, errors, lambda done, total, filename, error: task.report_progress(done, total),
+                max_workers)
+        
+        return self.io_worker.submit(run, on_done=on_done, on_error=on_error, on_progress=on_progress,
+                                     on_cancelled=on_cancelled)
+    
+    def _bulk_statistics_payloads(self, jobs: List[Tuple[str, str]]) -> Tuple[List[Dict], Dict[str, str]]:
+        """整理批量导出的数据，返回 (各文件的数据, {无法导出的文件名: 错误信息})"""
+        # 一次性计算所有宴席
+        totals_by_menu = self.calculate_ingredients_for_menus([menu_id for menu_id, _ in jobs])
+        payloads = []
+        errors = {}
+        for menu_id, filename in jobs:
+            if menu_id not in self.data["menus"]:
+                errors[filename] = "宴席不存在"
+            elif not totals_by_menu[menu_id]:
+                errors[filename] = "没有找到宴席数据或食材数据"
+            else:
+                menu_name = self.data["menus"][menu_id]["name"]
+                payloads.append(self._menu_statistics_payload(
+                    menu_id, menu_name, filename, totals_by_menu[menu_id]))
+        return payloads, errors
+    
+    @staticmethod
+    def _write_statistics_workbooks(payloads: List[Dict], errors: Dict[str, str],
+                                    progress_callback: Optional[Callable[[int, int, str, Optional[str]], None]],
+                                    max_workers: Optional[int]) -> Dict[str, Optional[str]]:
+        """在进程池中写出各宴席的统计文件（不访问 DataManager 的数据，可在后台线程中执行）"""
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from excel_export import write_menu_statistics
+        
+        results: Dict[str, Optional[str]] = {}
+        total = len(payloads) + len(errors)
+        done = 0
+        
+        def finish(filename: str, error: Optional[str]):
+            nonlocal done
+            done += 1
+            results[filename] = error
+            if error:
+                print(f"导出宴席统计失败 {filename}: {error}")
+            if progress_callback is not None:
+                progress_callback(done, total, filename, error)
+        
+        for filename, error in errors.items():
+            finish(filename, error)
+        
+        if not payloads:
+            return results
+        
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            futures = {executor.submit(write_menu_statistics, payload): payload["filename"]
+                       for payload in payloads}
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    future.result()
+                    finish(filename, None)
+                except Exception as e:
+                    finish(filename, str(e) or type(e).__name__)
+        except BaseException:
+            # 取消（或出错）时不再开始剩余的文件
+            executor.shutdown(cancel_futures=True)
+            raise
+        executor.shutdown()
+        
+        return results
\ No newline at end of file
@@ -0,0 +1,338 @@
+from array import array
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def next_id_after(entity_ids, current: int = 1) -> int:
+    """返回大于所有数字ID的下一个可用ID，current 为已记录的计数器"""
+    for entity_id in entity_ids:
+        try:
+            current = max(current, int(entity_id) + 1)
+        except (TypeError, ValueError):
+            continue
+    return current
+
+
+class IdPool:
+    """字符串ID与整数编号的双向映射，编号只增不减
+
+    菜品配方中的食材ID以编号保存在 array 中，每个食材ID字符串只保留一份。
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._numbers: Dict[str, int] = {}
+
+    def number(self, entity_id: str) -> int:
+        """ID对应的编号，首次出现时分配新编号"""
+        number = self._numbers.get(entity_id)
+        if number is None:
+            number = self._numbers[entity_id] = len(self.ids)
+            self.ids.append(entity_id)
+        return number
+
+    def numbers(self, entity_ids: Iterable[str]) -> array:
+        """一组ID对应的编号数组"""
+        try:
+            return array('i', map(self._numbers.__getitem__, entity_ids))
+        except KeyError:
+            return array('i', map(self.number, entity_ids))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+# 全部菜品配方共用的食材ID编号
+INGREDIENT_IDS = IdPool()
+
+
+class Record(Mapping):
+    """使用 __slots__ 的实体记录基类
+
+    每个记录只保存各字段的值，不再为每个实体保存一个带字符串键的字典。
+    同时实现只读映射接口，record["name"]、record.get("table_count", 1)、
+    dict(record) 等原有的字典用法保持不变。记录创建后不应修改，变更时整体替换。
+    """
+
+    __slots__ = ()
+
+    # 映射接口中的字段名（也是JSON中的键），按数据文件中的顺序排列
+    FIELDS: Tuple[str, ...] = ()
+
+    def __getitem__(self, key: str):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return type(self).from_dict, (self.to_dict(),)
+
+    def to_dict(self) -> Dict:
+        """转换为普通字典（用于JSON序列化）"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Record":
+        raise NotImplementedError
+
+
+class Ingredient(Record):
+    """食材: 名称、单位、单价"""
+
+    __slots__ = ("name", "unit", "price")
+    FIELDS = ("name", "unit", "price")
+
+    def __init__(self, name: str, unit: str, price: float):
+        self.name = name
+        self.unit = unit
+        self.price = price
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Ingredient":
+        return cls(record["name"], record["unit"], record["price"])
+
+
+def _int_flags(values: Iterable) -> Optional[bytes]:
+    """各数值是否为整数的标记，没有整数时返回None"""
+    flags = bytes(isinstance(value, int) for value in values)
+    return flags if any(flags) else None
+
+
+class Dish(Record):
+    """菜品: 名称、配方和子配方
+
+    配方以两个对齐的数组保存：食材编号（见 INGREDIENT_IDS）和用量。用量原本为整数的
+    另有标记（int_amounts，全部为浮点数时为None），读出和保存时仍为 int。
+    record["ingredients"] 每次返回新的 {食材ID: 用量} 字典，修改它不会影响记录。
+    子配方 {菜品ID: 份数} 引用其他菜品（如高汤、酱汁），每份本菜品用到子配方的份数；
+    没有子配方时不占用额外空间，数据文件中也不写出该字段。
+    """
+
+    __slots__ = ("name", "ingredient_numbers", "amounts", "int_amounts", "_sub_recipes")
+    FIELDS = ("name", "ingredients", "sub_recipes")
+
+    def __init__(self, name: str, ingredients: Dict[str, float], sub_recipes: Optional[Dict[str, float]] = None):
+        self.name = name
+        self.ingredient_numbers = INGREDIENT_IDS.numbers(ingredients)
+        self.amounts = array('d', ingredients.values())
+        self.int_amounts = _int_flags(ingredients.values())
+        # 子配方份数统一保存为浮点数
+        self._sub_recipes = {sub_id: float(amount) for sub_id, amount in sub_recipes.items()} if sub_recipes else None
+
+    @property
+    def ingredients(self) -> Dict[str, float]:
+        amounts = self.amounts
+        if self.int_amounts is not None:
+            amounts = [int(amount) if is_int else amount for amount, is_int in zip(amounts, self.int_amounts)]
+        return dict(zip(map(INGREDIENT_IDS.ids.__getitem__, self.ingredient_numbers), amounts))
+
+    @property
+    def sub_recipes(self) -> Dict[str, float]:
+        return dict(self._sub_recipes) if self._sub_recipes else {}
+
+    def ingredient_ids(self) -> List[str]:
+        """配方中的食材ID（按配方顺序）"""
+        return list(map(INGREDIENT_IDS.ids.__getitem__, self.ingredient_numbers))
+
+    def has_sub_recipes(self) -> bool:
+        return self._sub_recipes is not None
+
+    # 映射接口与数据文件一致：没有子配方时不列出 sub_recipes（仍可通过 record["sub_recipes"] 读取空字典），
+    # 与只有名称和配方的普通字典比较时相等
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS if self._sub_recipes else self.FIELDS[:2])
+
+    def __len__(self) -> int:
+        return 3 if self._sub_recipes else 2
+
+    def to_dict(self) -> Dict:
+        record = {"name": self.name, "ingredients": self.ingredients}
+        if self._sub_recipes:
+            record["sub_recipes"] = dict(self._sub_recipes)
+        return record
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Dish":
+        return cls(record["name"], record["ingredients"], record.get("sub_recipes"))
+
+    @classmethod
+    def from_arrays(cls, name: str, ingredient_numbers: array, amounts: array,
+                    sub_recipes: Optional[Dict[str, float]] = None, int_amounts: Optional[bytes] = None) -> "Dish":
+        """直接由食材编号数组和用量数组创建（数组归新记录所有，调用方不应再修改）
+
+        int_amounts 为与用量对齐的整数标记，None 表示用量都是浮点数。
+        """
+        dish = cls.__new__(cls)
+        dish.name = name
+        dish.ingredient_numbers = ingredient_numbers
+        dish.amounts = amounts
+        dish.int_amounts = int_amounts if int_amounts and any(int_amounts) else None
+        dish._sub_recipes = sub_recipes or None
+        return dish
+
+
+class Menu(Record):
+    """宴席: 名称、菜品份数 {菜品ID: 份数} 和餐桌数量"""
+
+    __slots__ = ("name", "dishes", "table_count")
+    FIELDS = ("name", "dishes", "table_count")
+
+    def __init__(self, name: str, dishes: Dict[str, int], table_count: int = 1):
+        self.name = name
+        self.dishes = dict(dishes)
+        self.table_count = table_count
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Menu":
+        return cls(record["name"], record["dishes"], record.get("table_count", 1))
+
+
+def entity_names(entities: Dict) -> Iterable[Tuple[str, str]]:
+    """按顺序列出实体表中的 (实体ID, 名称)
+
+    提供 name_items() 的实体表（按列存储的食材库、延迟加载的表）不必为此生成记录对象。
+    """
+    if hasattr(entities, "name_items"):
+        return entities.name_items()
+    return ((entity_id, record["name"]) for entity_id, record in entities.items())
+
+
+def to_records(record_class, entities: Dict) -> Dict:
+    """将 {实体ID: 记录字典} 中的记录原地转换为记录对象（已是记录对象的保持不变）
+
+    逐个替换，转换过程中原有的记录字典随即释放，不会同时保留两份数据。
+    """
+    for entity_id, record in entities.items():
+        if not isinstance(record, record_class):
+            entities[entity_id] = record_class.from_dict(record)
+    return entities
+
+
+class IngredientTable(MutableMapping):
+    """按列存储的食材库
+
+    食材名称、单位、单价分别存放在三个按行号对齐的列中（单价使用 array('d')），
+    不再为每个食材保存一个字典；单位字符串会被复用。对外仍表现为
+    {食材ID: Ingredient} 的映射，读取时按需生成记录。整数单价另有标记列
+    （int_prices），读出和保存时仍为 int，不会变成浮点数。
+
+    删除的食材先只留下空行；空行超过一半时（在那次删除中）重新整理各列，
+    之后的食材行号会前移。聚合和导出按 position() 取得行号后直接访问各列，
+    行号只在没有删除食材的期间内有效，不应跨越删除操作保存。
+    """
+
+    def __init__(self, records: Optional[Dict] = None):
+        self._rows: Dict[str, int] = {}          # 食材ID -> 行号
+        self.ids: List[Optional[str]] = []       # 行号 -> 食材ID（已删除为None）
+        self.names: List[Optional[str]] = []
+        self.units: List[Optional[str]] = []
+        self.prices = array('d')
+        self.int_prices = bytearray()            # 行号 -> 单价原本是否为整数
+        self._unit_pool: Dict[str, str] = {}
+        if records:
+            for ingredient_id, record in records.items():
+                self[ingredient_id] = record
+
+    @classmethod
+    def from_columns(cls, ids: List[str], names: List[str], units: List[str], prices: array,
+                     int_prices: Optional[bytearray] = None) -> "IngredientTable":
+        """直接由按行对齐的各列创建（各列归新食材库所有，int_prices 为None时单价都是浮点数）"""
+        table = cls()
+        table.ids = ids
+        table.names = names
+        table.units = [table._unit_pool.setdefault(unit, unit) for unit in units]
+        table.prices = prices
+        table.int_prices = int_prices if int_prices is not None else bytearray(len(ids))
+        table._rows = {ingredient_id: row for row, ingredient_id in enumerate(ids)}
+        return table
+
+    def position(self, ingredient_id: str) -> Optional[int]:
+        """食材所在的行号，不存在时返回None"""
+        return self._rows.get(ingredient_id)
+
+    def __contains__(self, ingredient_id) -> bool:
+        return ingredient_id in self._rows
+
+    def price(self, row: int):
+        """行号对应的单价（整数单价返回 int）"""
+        price = self.prices[row]
+        return int(price) if self.int_prices[row] else price
+
+    def __getitem__(self, ingredient_id: str) -> Ingredient:
+        row = self._rows[ingredient_id]
+        return Ingredient(self.names[row], self.units[row], self.price(row))
+
+    def __setitem__(self, ingredient_id: str, record: Dict):
+        unit = self._unit_pool.setdefault(record["unit"], record["unit"])
+        row = self._rows.get(ingredient_id)
+        if row is None:
+            self._rows[ingredient_id] = len(self.ids)
+            self.ids.append(ingredient_id)
+            self.names.append(record["name"])
+            self.units.append(unit)
+            self.prices.append(record["price"])
+            self.int_prices.append(isinstance(record["price"], int))
+        else:
+            self.names[row] = record["name"]
+            self.units[row] = unit
+            self.prices[row] = record["price"]
+            self.int_prices[row] = isinstance(record["price"], int)
+
+    def __delitem__(self, ingredient_id: str):
+        row = self._rows.pop(ingredient_id)
+        self.ids[row] = None
+        self.names[row] = None
+        self.units[row] = None
+        self.prices[row] = 0.0
+        self.int_prices[row] = 0
+        if len(self.ids) > 64 and len(self._rows) < len(self.ids) // 2:
+            self._compact()
+
+    def __iter__(self) -> Iterator[str]:
+        return (ingredient_id for ingredient_id in self.ids if ingredient_id is not None)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __repr__(self) -> str:
+        return f"IngredientTable({len(self)} 项)"
+
+    def _compact(self):
+        """移除已删除食材留下的空行"""
+        live = [row for row in range(len(self.ids)) if self.ids[row] is not None]
+        self.ids = [self.ids[row] for row in live]
+        self.names = [self.names[row] for row in live]
+        self.units = [self.units[row] for row in live]
+        self.prices = array('d', (self.prices[row] for row in live))
+        self.int_prices = bytearray(self.int_prices[row] for row in live)
+        self._rows = {ingredient_id: row for row, ingredient_id in enumerate(self.ids)}
+
+    def name_items(self) -> Iterator[Tuple[str, str]]:
+        """按行号顺序列出 (食材ID, 名称)"""
+        return ((ingredient_id, name) for ingredient_id, name in zip(self.ids, self.names) if ingredient_id is not None)
+
+    def copy(self) -> "IngredientTable":
+        """复制一份独立的食材库（用于保存快照）"""
+        table = IngredientTable.__new__(IngredientTable)
+        table._rows = dict(self._rows)
+        table.ids = list(self.ids)
+        table.names = list(self.names)
+        table.units = list(self.units)
+        table.prices = array('d', self.prices)
+        table.int_prices = bytearray(self.int_prices)
+        table._unit_pool = self._unit_pool
+        return table
+
+    def to_dict(self) -> Dict:
+        """转换为普通字典（用于JSON序列化）"""
+        return {ingredient_id: {"name": self.names[row], "unit": self.units[row], "price": self.price(row)}
+                for ingredient_id, row in self._rows.items()}
@@ -0,0 +1,93 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# 变更类型
+ADDED = "added"
+UPDATED = "updated"
+DELETED = "deleted"
+RELOADED = "reloaded"    # 数据整体重新加载，kind 和 entity_id 为 None
+
+
+class ChangeEvent(NamedTuple):
+    """一次实体变更: (变更类型, 实体类型 ingredients/dishes/menus, 实体ID)"""
+    action: str
+    kind: Optional[str]
+    entity_id: Optional[str]
+
+
+# 同一实体在一批事件中的多次变更合并后的结果，None 表示相互抵消
+_MERGED_ACTIONS = {
+    (ADDED, UPDATED): ADDED,
+    (ADDED, DELETED): None,
+    (UPDATED, UPDATED): UPDATED,
+    (UPDATED, DELETED): DELETED,
+    (DELETED, ADDED): UPDATED,
+}
+
+
+class ChangeNotifier:
+    """向订阅者分发数据变更事件
+
+    订阅者收到的是一批事件 List[ChangeEvent]。暂停分发（事务进行中）时事件先排队，
+    恢复时同一实体的多次变更合并为一个事件后一次性发出；放弃时丢弃排队的事件。
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[List[ChangeEvent]], None]] = []
+        self._queue: Optional[Dict[Tuple[Optional[str], Optional[str]], ChangeEvent]] = None
+
+    def subscribe(self, callback: Callable[[List[ChangeEvent]], None]) -> Callable[[], None]:
+        """订阅变更事件，返回取消订阅的函数"""
+        self._subscribers.append(callback)
+        return lambda: self.unsubscribe(callback)
+
+    def unsubscribe(self, callback: Callable[[List[ChangeEvent]], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def hold(self):
+        """暂停分发，之后的事件排队"""
+        if self._queue is None:
+            self._queue = {}
+
+    @property
+    def holding(self) -> bool:
+        """是否处于暂停分发状态"""
+        return self._queue is not None
+
+    def release(self):
+        """恢复分发，合并并发出排队的事件"""
+        queue, self._queue = self._queue, None
+        if queue:
+            self._dispatch(list(queue.values()))
+
+    def discard(self):
+        """恢复分发并丢弃排队的事件（事务回滚后数据与开始前一致）"""
+        self._queue = None
+
+    def notify(self, action: str, kind: Optional[str] = None, entity_id: Optional[str] = None):
+        event = ChangeEvent(action, kind, entity_id)
+        if self._queue is None:
+            self._dispatch([event])
+            return
+
+        if action == RELOADED:
+            # 重新加载后之前排队的事件都已失去意义
+            self._queue = {(None, None): event}
+            return
+        key = (kind, entity_id)
+        previous = self._queue.pop(key, None)
+        if previous is not None:
+            action = _MERGED_ACTIONS.get((previous.action, action), action)
+            if action is None:
+                return
+            event = ChangeEvent(action, kind, entity_id)
+        self._queue[key] = event
+
+    def _dispatch(self, events: List[ChangeEvent]):
+        if not self._subscribers:
+            return
+        for callback in list(self._subscribers):
+            try:
+                callback(events)
+            except Exception as e:
+                print(f"处理数据变更事件失败: {e}")
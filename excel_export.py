@@ -0,0 +1,205 @@
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# 数值列的显示格式（单元格中仍保存数值）
+AMOUNT_FORMAT = "0.00"
+MONEY_FORMAT = "0.00"
+
+# 流式写出时每写出多少行报告一次进度
+PROGRESS_INTERVAL = 1000
+
+# 工作表定义: (表名, 表头, 各列数字格式(None表示不设置), 行生成器)
+SheetSpec = Tuple[str, Sequence[str], Sequence[Optional[str]], Iterable[Sequence]]
+
+
+def write_streaming_workbook(filename: str, sheets: List[SheetSpec],
+                             progress: Optional[Callable[[int], None]] = None) -> int:
+    """以只写模式流式写出Excel工作簿，返回写入的数据行数
+
+    行数据直接从生成器写入，不在内存中保留整张表；数值保持数值类型并带数字格式。
+    没有数据行的工作表会被跳过（与原有导出保持一致）。
+    progress(已写行数) 每写出 PROGRESS_INTERVAL 行调用一次，在其中抛出异常即可
+    中止导出（此时不会生成文件）。
+    """
+    workbook = Workbook(write_only=True)
+    header_font = Font(bold=True)
+    total_rows = 0
+
+    try:
+        for title, headers, formats, rows in sheets:
+            rows = iter(rows)
+            first = next(rows, None)
+            if first is None:
+                continue
+
+            worksheet = workbook.create_sheet(title)
+            header_cells = []
+            for header in headers:
+                cell = WriteOnlyCell(worksheet, value=header)
+                cell.font = header_font
+                header_cells.append(cell)
+            worksheet.append(header_cells)
+
+            for row in chain((first,), rows):
+                worksheet.append(_format_row(worksheet, row, formats))
+                total_rows += 1
+                if progress is not None and total_rows % PROGRESS_INTERVAL == 0:
+                    progress(total_rows)
+
+        if not workbook.worksheets:
+            # 没有任何数据时保留一个只有表头的工作表，保证文件可以打开
+            title, headers, _, _ = sheets[0]
+            workbook.create_sheet(title).append(list(headers))
+
+        if progress is not None:
+            progress(total_rows)
+    except BaseException:
+        _discard_workbook(workbook)
+        raise
+    workbook.save(filename)
+    return total_rows
+
+
+def _discard_workbook(workbook):
+    """中止导出时关闭各工作表的临时文件（尽力而为）"""
+    for worksheet in workbook.worksheets:
+        try:
+            rows = getattr(worksheet, "_rows", None)
+            if rows is not None:
+                rows.close()
+            writer = getattr(worksheet, "_writer", None)
+            if writer is not None:
+                writer.close()
+                writer.cleanup()
+        except Exception:
+            pass
+
+
+def _format_row(worksheet, row: Sequence, formats: Sequence[Optional[str]]) -> List:
+    cells = []
+    for value, number_format in zip(row, formats):
+        if number_format is not None and isinstance(value, (int, float)):
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.number_format = number_format
+            cells.append(cell)
+        else:
+            cells.append(value)
+    return cells
+
+
+def iter_ingredient_rows(ingredients) -> Iterator[Tuple]:
+    """食材库工作表的数据行"""
+    for ing_id, ing_info in ingredients.items():
+        yield ing_id, ing_info["name"], ing_info["unit"], ing_info["price"]
+
+
+def iter_dish_rows(ingredients, dishes: Dict) -> Iterator[Tuple]:
+    """菜品配方工作表的数据行"""
+    for dish_id, dish_info in dishes.items():
+        dish_name = dish_info["name"]
+        for ing_id, amount in dish_info["ingredients"].items():
+            row = ingredients.position(ing_id)
+            if row is not None:
+                price = ingredients.prices[row]
+                yield (dish_id, dish_name, ingredients.names[row], amount,
+                       ingredients.units[row], price, amount * price)
+
+
+def iter_sub_recipe_rows(dishes: Dict) -> Iterator[Tuple]:
+    """子配方工作表的数据行（每个菜品用到的其他菜品及份数）"""
+    for dish_id, dish_info in dishes.items():
+        sub_recipes = dish_info.get("sub_recipes")
+        if not sub_recipes:
+            continue
+        dish_name = dish_info["name"]
+        for sub_id, portions in sub_recipes.items():
+            if sub_id in dishes:
+                yield dish_id, dish_name, sub_id, dishes[sub_id]["name"], portions
+
+
+def iter_menu_rows(dishes: Dict, menus: Dict) -> Iterator[Tuple]:
+    """宴席菜单工作表的数据行"""
+    for menu_id, menu_info in menus.items():
+        menu_name = menu_info["name"]
+        for dish_id, quantity in menu_info["dishes"].items():
+            if dish_id in dishes:
+                yield menu_id, menu_name, dishes[dish_id]["name"], quantity
+
+
+def catalog_sheets(ingredients, dishes: Dict, menus: Dict) -> List[SheetSpec]:
+    """全部数据导出的工作表定义（列与原有导出一致，没有子配方时不生成子配方表）"""
+    return [
+        ("食材库", ("ID", "食材名称", "单位", "单价"),
+         (None, None, None, MONEY_FORMAT),
+         iter_ingredient_rows(ingredients)),
+        ("菜品配方", ("菜品ID", "菜品名称", "食材名称", "用量", "单位", "单价", "小计"),
+         (None, None, None, AMOUNT_FORMAT, None, MONEY_FORMAT, MONEY_FORMAT),
+         iter_dish_rows(ingredients, dishes)),
+        ("子配方", ("菜品ID", "菜品名称", "子配方ID", "子配方名称", "份数"),
+         (None, None, None, None, AMOUNT_FORMAT),
+         iter_sub_recipe_rows(dishes)),
+        ("宴席菜单", ("宴席ID", "宴席名称", "菜品名称", "份数"),
+         (None, None, None, None),
+         iter_menu_rows(dishes, menus)),
+    ]
+
+
+def write_menu_statistics(payload: Dict) -> str:
+    """写出单个宴席的食材统计工作簿，返回文件名
+
+    payload 只包含该宴席需要的数据（见 DataManager._menu_statistics_payload），
+    可以直接发送到子进程中执行。
+    """
+    sheets = [
+        ("食材统计", ("序号", "食材名称", "需要数量", "单位"),
+         (None, None, AMOUNT_FORMAT, None),
+         ((number, name, amount, unit)
+          for number, (name, amount, unit) in enumerate(payload["ingredients"], 1))),
+        ("菜品明细", ("序号", "菜品名称", "份数"),
+         (None, None, None),
+         ((number, name, quantity) for number, (name, quantity) in enumerate(payload["dishes"], 1))),
+        ("汇总信息", ("项目", "值"),
+         (None, None),
+         [
+             ("宴席名称", payload["menu_name"]),
+             ("餐桌数量", payload["table_count"]),
+             ("菜品种类", payload["dish_kinds"]),
+             ("食材种类", payload["ingredient_kinds"]),
+             ("统计时间", payload["time"]),
+         ]),
+    ]
+    write_streaming_workbook(payload["filename"], sheets)
+    return payload["filename"]
+
+
+def write_menu_statistics_dataframes(payload: Dict) -> str:
+    """使用pandas写出单个宴席的食材统计工作簿，返回文件名
+
+    单个宴席导出使用，文件格式与原有导出一致（需要数量为保留两位小数的文本，
+    表头使用pandas的默认样式，没有菜品时不生成菜品明细表）；批量导出使用
+    write_menu_statistics。
+    """
+    import pandas as pd
+
+    statistics_data = [{"序号": number, "食材名称": name, "需要数量": f"{amount:.2f}", "单位": unit}
+                       for number, (name, amount, unit) in enumerate(payload["ingredients"], 1)]
+    menu_details = [{"序号": number, "菜品名称": name, "份数": quantity}
+                    for number, (name, quantity) in enumerate(payload["dishes"], 1)]
+    summary_data = [
+        {"项目": "宴席名称", "值": payload["menu_name"]},
+        {"项目": "餐桌数量", "值": payload["table_count"]},
+        {"项目": "菜品种类", "值": payload["dish_kinds"]},
+        {"项目": "食材种类", "值": payload["ingredient_kinds"]},
+        {"项目": "统计时间", "值": payload["time"]},
+    ]
+
+    with pd.ExcelWriter(payload["filename"], engine='openpyxl') as writer:
+        pd.DataFrame(statistics_data).to_excel(writer, sheet_name="食材统计", index=False)
+        if menu_details:
+            pd.DataFrame(menu_details).to_excel(writer, sheet_name="菜品明细", index=False)
+        pd.DataFrame(summary_data).to_excel(writer, sheet_name="汇总信息", index=False)
+    return payload["filename"]
@@ -0,0 +1,255 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Set
+from entity_store import entity_names
+
+
+class ReverseIndex:
+    """反向索引：记录每个被引用的ID被哪些实体引用
+
+    例如 食材ID -> 使用该食材的菜品ID集合、菜品ID -> 包含该菜品的宴席ID集合。
+    """
+
+    def __init__(self, field: str):
+        # 实体记录中保存引用关系的字段，如菜品的 "ingredients"、宴席的 "dishes"
+        self.field = field
+        self._owners: Dict[str, Set[str]] = {}
+
+    def rebuild(self, entities: Dict):
+        """根据全部实体重建索引"""
+        self._owners = {}
+        for owner_id, record in entities.items():
+            self._add(owner_id, record[self.field])
+
+    def update(self, owner_id: str, previous: Optional[Dict], current: Optional[Dict]):
+        """实体变更后更新索引，previous/current 为变更前后的实体记录（不存在时为None）"""
+        old_keys = previous[self.field].keys() if previous is not None else ()
+        new_keys = current[self.field].keys() if current is not None else ()
+        for key in old_keys:
+            if key not in new_keys:
+                owners = self._owners.get(key)
+                if owners is not None:
+                    owners.discard(owner_id)
+                    if not owners:
+                        del self._owners[key]
+        self._add(owner_id, new_keys)
+
+    def _add(self, owner_id: str, keys: Iterable[str]):
+        for key in keys:
+            self._owners.setdefault(key, set()).add(owner_id)
+
+    def owners(self, key: str) -> Set[str]:
+        """引用指定ID的实体集合（只读）"""
+        return self._owners.get(key, set())
+
+    def is_referenced(self, key: str) -> bool:
+        """指定ID是否被任何实体引用"""
+        return key in self._owners
+
+
+def normalize_name(name: str) -> str:
+    """名称索引使用的规范化形式：去除首尾空白并忽略大小写"""
+    return name.strip().casefold()
+
+
+class DuplicateNameError(ValueError):
+    """名称（忽略大小写）已被其他实体使用"""
+
+
+class NameIndex:
+    """名称索引：规范化名称 -> 实体ID
+
+    旧数据中可能已存在同名实体，因此同一名称下保存ID列表，查找时返回最早加入的一个。
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, List[str]] = {}
+
+    def rebuild(self, entities: Dict):
+        """根据全部实体重建索引"""
+        self._ids = {}
+        for entity_id, name in entity_names(entities):
+            self._ids.setdefault(normalize_name(name), []).append(entity_id)
+
+    def update(self, entity_id: str, previous: Optional[Dict], current: Optional[Dict]):
+        """实体变更后更新索引"""
+        if previous is not None:
+            key = normalize_name(previous["name"])
+            ids = self._ids.get(key)
+            if ids is not None and entity_id in ids:
+                ids.remove(entity_id)
+                if not ids:
+                    del self._ids[key]
+        if current is not None:
+            self._ids.setdefault(normalize_name(current["name"]), []).append(entity_id)
+
+    def find(self, name: str) -> Optional[str]:
+        """按名称查找实体ID，不存在时返回None"""
+        ids = self._ids.get(normalize_name(name))
+        return ids[0] if ids else None
+
+    def ids(self, name: str) -> List[str]:
+        """使用该名称的全部实体ID"""
+        return list(self._ids.get(normalize_name(name), ()))
+
+    def conflicts(self, name: str, entity_id: Optional[str] = None) -> bool:
+        """名称是否已被除 entity_id 以外的实体使用"""
+        ids = self._ids.get(normalize_name(name), ())
+        return any(other_id != entity_id for other_id in ids)
+
+
+def _name_grams(text: str) -> Set[str]:
+    """文本中的单字和相邻两字（n-gram）"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def search_text(entity_id: str, name: str) -> str:
+    """搜索索引中实体的文本：与下拉框选项相同的 "名称 (ID)"，输入ID也能找到实体"""
+    return normalize_name(f"{name} ({entity_id})")
+
+
+class SubstringIndex:
+    """名称子串搜索索引：单字/双字 n-gram -> 实体ID 的倒排索引
+
+    查询时先取查询串各 n-gram 倒排表的交集作为候选，再确认候选文本确实包含查询串，
+    不需要逐个扫描全部名称。索引的文本为 search_text 给出的 "名称 (ID)"，
+    按 normalize_name 规范化（忽略大小写）。
+
+    rebuild() 只记住实体表，倒排表在第一次搜索时才构建，不拖慢程序启动；
+    构建前的实体变更不需要单独处理，构建时读取的已是最新的名称。
+    """
+
+    def __init__(self):
+        self._pending: Optional[Dict] = None      # 尚未建立倒排表的实体表
+        self._texts: Dict[str, str] = {}          # 实体ID -> 规范化的搜索文本
+        self._ranks: Dict[str, int] = {}          # 实体ID -> 加入顺序（排序时保持原有顺序）
+        self._postings: Dict[str, Set[str]] = {}  # n-gram -> 实体ID集合
+        self._next_rank = 0
+        # 每次索引内容变化时递增，用于判断缓存的搜索结果是否仍然有效
+        self.version = 0
+
+    def rebuild(self, entities: Dict):
+        """根据全部实体重建索引（第一次搜索时进行）"""
+        self._pending = entities
+        self._texts = {}
+        self._ranks = {}
+        self._postings = {}
+        self._next_rank = 0
+        self.version += 1
+
+    def _ensure_built(self):
+        entities = self._pending
+        if entities is None:
+            return
+        self._pending = None
+        for entity_id, name in entity_names(entities):
+            self._add(entity_id, name)
+
+    def update(self, entity_id: str, previous: Optional[Dict], current: Optional[Dict]):
+        """实体变更后更新索引（名称未变时不做任何事）"""
+        if previous is not None and current is not None and previous["name"] == current["name"]:
+            return
+        if self._pending is not None:
+            self.version += 1
+            return
+        if previous is not None:
+            self._remove(entity_id)
+        if current is not None:
+            self._add(entity_id, current["name"])
+        self.version += 1
+
+    def _add(self, entity_id: str, name: str):
+        text = search_text(entity_id, name)
+        self._texts[entity_id] = text
+        if entity_id not in self._ranks:
+            self._ranks[entity_id] = self._next_rank
+            self._next_rank += 1
+        for gram in _name_grams(text):
+            self._postings.setdefault(gram, set()).add(entity_id)
+
+    def _remove(self, entity_id: str):
+        text = self._texts.pop(entity_id, None)
+        if text is None:
+            return
+        for gram in _name_grams(text):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(entity_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def matches(self, query: str, within: Optional[Iterable[str]] = None) -> Set[str]:
+        """名称或ID包含查询串的全部实体ID
+
+        within 为上一次（更短的）查询的匹配结果时，只在其中过滤。
+        """
+        self._ensure_built()
+        query = normalize_name(query)
+        if not query:
+            return set(self._texts) if within is None else set(within)
+
+        if within is None:
+            if len(query) == 1:
+                grams = [query]
+            else:
+                grams = {query[i:i + 2] for i in range(len(query) - 1)}
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates &= ids
+                if not candidates:
+                    break
+            if len(query) <= 2:
+                return candidates
+            within = candidates
+
+        texts = self._texts
+        return {entity_id for entity_id in within if query in texts.get(entity_id, "")}
+
+    def rank(self, query: str, ids: Iterable[str], limit: Optional[int] = None) -> List[str]:
+        """排序匹配结果：名称以查询串开头的在前，其次按匹配位置、名称长度和加入顺序"""
+        self._ensure_built()
+        query = normalize_name(query)
+        texts = self._texts
+        ranks = self._ranks
+
+        def sort_key(entity_id: str):
+            text = texts[entity_id]
+            position = text.find(query)
+            # 文本末尾都是 " (ID)"，减去ID长度即按名称长度排序
+            return (position != 0, position, len(text) - len(entity_id), ranks[entity_id])
+
+        ids = [entity_id for entity_id in ids if entity_id in texts]
+        if limit is not None and limit < len(ids):
+            return heapq.nsmallest(limit, ids, key=sort_key)
+        return sorted(ids, key=sort_key)
+
+
+class IncrementalSearch:
+    """输入过程中的连续搜索
+
+    记住上一次查询的完整匹配集合：新查询包含上一次的查询串（用户继续输入）且索引
+    未变化时，只在上一次的匹配结果中过滤。
+    """
+
+    def __init__(self, index: SubstringIndex):
+        self.index = index
+        self._query: Optional[str] = None
+        self._matches: Optional[Set[str]] = None
+        self._version = -1
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """返回排序后的前 limit 个匹配实体ID"""
+        query = normalize_name(query)
+        if (self._query is not None and self._query in query
+                and self._version == self.index.version):
+            matches = self.index.matches(query, within=self._matches)
+        else:
+            matches = self.index.matches(query)
+        self._query, self._matches, self._version = query, matches, self.index.version
+        return self.index.rank(query, matches, limit)
+
+    def reset(self):
+        self._query = None
+        self._matches = None
@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional
+
+# 耗时直方图各区间的上界（毫秒），最后一个区间为超过最大上界的调用
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+def _bucket_labels() -> List[str]:
+    labels = [f"<={bound:g}ms" for bound in LATENCY_BUCKETS_MS]
+    labels.append(f">{LATENCY_BUCKETS_MS[-1]:g}ms")
+    return labels
+
+
+BUCKET_LABELS = _bucket_labels()
+
+# 统计报告中各缓存的显示名称
+CACHE_NAMES = {"menu_results": "宴席计算缓存", "flat_recipes": "子配方展开缓存",
+               "lazy_dishes": "菜品记录缓存", "lazy_menus": "宴席记录缓存"}
+
+
+class OperationStats:
+    """单个操作的调用次数、失败次数和耗时分布"""
+
+    __slots__ = ("calls", "errors", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms: float, failed: bool = False):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "max_ms": self.max_ms,
+            "histogram": {label: count for label, count in zip(BUCKET_LABELS, self.buckets) if count},
+        }
+
+
+class Instrumentation:
+    """操作计时和计数
+
+    attach() 在对象实例上用计时包装替换指定方法，detach() 恢复原方法；
+    未启用时对象上没有任何包装，被测代码的开销为零。
+    写文件的字节数由存储对象通过 record_write() 报告（可能来自后台线程）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = datetime.now()
+        self.operations: Dict[str, OperationStats] = {}
+        self.write_count = 0
+        self.bytes_written = 0
+        self.max_write_bytes = 0
+        self.last_write_bytes = 0
+
+    def record(self, name: str, elapsed_ms: float, failed: bool = False):
+        """记录一次操作耗时"""
+        with self._lock:
+            stats = self.operations.get(name)
+            if stats is None:
+                stats = self.operations[name] = OperationStats()
+            stats.add(elapsed_ms, failed)
+
+    def record_write(self, size: int):
+        """记录一次写文件的字节数"""
+        with self._lock:
+            self.write_count += 1
+            self.bytes_written += size
+            self.last_write_bytes = size
+            if size > self.max_write_bytes:
+                self.max_write_bytes = size
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """返回记录调用耗时的包装函数"""
+        record = self.record
+        perf_counter = time.perf_counter
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record(name, (perf_counter() - start) * 1000, failed)
+
+        timed.__wrapped_by__ = self
+        return timed
+
+    def attach(self, target, method_names: Iterable[str]):
+        """在实例上包装指定方法"""
+        for name in method_names:
+            method = getattr(target, name)
+            if getattr(method, "__wrapped_by__", None) is self:
+                continue
+            setattr(target, name, self.wrap(name.lstrip("_"), method))
+
+    @staticmethod
+    def detach(target, method_names: Iterable[str]):
+        """移除实例上的包装，恢复类中定义的方法"""
+        for name in method_names:
+            target.__dict__.pop(name, None)
+
+    def reset(self):
+        """清空已记录的统计"""
+        with self._lock:
+            self.started = datetime.now()
+            self.operations.clear()
+            self.write_count = 0
+            self.bytes_written = 0
+            self.max_write_bytes = 0
+            self.last_write_bytes = 0
+
+    def snapshot(self) -> Dict:
+        """当前统计的副本（可序列化为JSON）"""
+        with self._lock:
+            return {
+                "since": self.started.isoformat(timespec="seconds"),
+                "operations": {name: stats.to_dict() for name, stats in sorted(self.operations.items())},
+                "writes": {
+                    "count": self.write_count,
+                    "bytes": self.bytes_written,
+                    "mean_bytes": self.bytes_written / self.write_count if self.write_count else 0,
+                    "max_bytes": self.max_write_bytes,
+                    "last_bytes": self.last_write_bytes,
+                },
+            }
+
+
+def hit_rate(hits: int, misses: int) -> Optional[float]:
+    """命中率，尚无访问时为None"""
+    total = hits + misses
+    return hits / total if total else None
+
+
+def format_stats(stats: Dict, limit: int = 12) -> str:
+    """将 DataManager.stats() 的结果整理为便于阅读的文本（按总耗时列出前 limit 个操作）"""
+    lines = []
+    for name, cache in stats.get("caches", {}).items():
+        parts = []
+        # 同时有成本命中率时才需要区分用量和成本
+        keys = (("用量 ", "hit_rate"), ("成本 ", "cost_hit_rate")) if "cost_hit_rate" in cache else (("", "hit_rate"),)
+        for label, key in keys:
+            if key in cache:
+                rate = cache[key]
+                parts.append(f"{label}{rate:.0%}" if rate is not None else f"{label}-")
+        # 没有容量上限的缓存只显示条数
+        size = f"{cache.get('size', 0)}/{cache['max_size']}" if "max_size" in cache else f"{cache.get('size', 0)}"
+        lines.append(f"• {CACHE_NAMES.get(name, name)}：{size} 条，命中率 {'，'.join(parts)}")
+
+    if not stats.get("enabled"):
+        lines.append("• 操作计时未开启")
+        return "\n".join(lines)
+
+    writes = stats["writes"]
+    if writes["count"]:
+        lines.append(f"• 写入文件 {writes['count']} 次，共 {writes['bytes']} 字节，"
+                     f"平均 {writes['mean_bytes']:.0f} 字节，最近一次 {writes['last_bytes']} 字节")
+    operations = sorted(stats["operations"].items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    for name, op in operations[:limit]:
+        errors = f"，失败 {op['errors']} 次" if op["errors"] else ""
+        lines.append(f"• {name}：{op['calls']} 次，平均 {op['mean_ms']:.1f} ms，最长 {op['max_ms']:.1f} ms{errors}")
+    return "\n".join(lines)
+
+
+def dump_stats(stats: Dict, filename: str):
+    """将统计结果保存为JSON文件"""
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+        f.write("\n")
@@ -0,0 +1,222 @@
+import queue
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, Optional
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+SUPERSEDED = "superseded"    # 尚未执行时被同 key 的新任务取代
+
+
+class TaskCancelled(Exception):
+    """任务已被取消（由 IOTask.report_progress / check_cancelled 抛出）"""
+
+
+class IOTask:
+    """提交到后台I/O线程的一个任务
+
+    任务函数以 func(task, *args) 的形式调用，长时间运行的任务应定期调用
+    task.report_progress(已完成, 总数)，任务被取消时该调用会抛出 TaskCancelled。
+    """
+
+    def __init__(self, func: Callable, args: tuple, key: Optional[Hashable],
+                 on_done: Optional[Callable] = None, on_error: Optional[Callable] = None,
+                 on_progress: Optional[Callable] = None, on_cancelled: Optional[Callable] = None):
+        self.func = func
+        self.args = args
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancelled = on_cancelled
+        self.state = PENDING
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self._cancel_requested = False
+        self._finished = threading.Event()
+        self._worker: Optional["IOWorker"] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_requested
+
+    def cancel(self):
+        """请求取消：未开始的任务不再执行，执行中的任务在下次报告进度时停止"""
+        self._cancel_requested = True
+
+    def check_cancelled(self):
+        if self._cancel_requested:
+            raise TaskCancelled()
+
+    def report_progress(self, done: int, total: int):
+        """报告进度（在主线程中回调 on_progress(done, total)），已取消时抛出 TaskCancelled"""
+        self.check_cancelled()
+        if self.on_progress is not None and self._worker is not None:
+            self._worker.dispatch(self.on_progress, done, total)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待任务结束（完成、失败、取消或被取代），返回是否已结束"""
+        return self._finished.wait(timeout)
+
+
+def _call_directly(callback: Callable, *args):
+    callback(*args)
+
+
+class IOWorker:
+    """单线程后台I/O执行器
+
+    任务按提交顺序在同一个线程中依次执行，保证写文件的先后顺序。
+    带相同 key 的任务（如完整保存数据文件）在尚未开始时会被后提交的任务取代，
+    只写出最新的状态。urgent 任务（保存数据）排在普通任务（导出）之前执行，
+    长时间的导出不会推迟数据保存。
+
+    任务完成、失败和进度回调通过 dispatch 转交给主线程执行，
+    图形界面中使用 TkCallbackQueue，默认在后台线程中直接调用。
+    线程在第一次提交任务时才启动。
+    """
+
+    def __init__(self, dispatch: Optional[Callable] = None, name: str = "io-worker"):
+        self.dispatch = dispatch or _call_directly
+        self.name = name
+        self._urgent: Deque[IOTask] = deque()
+        self._normal: Deque[IOTask] = deque()
+        self._latest: Dict[Hashable, IOTask] = {}
+        self._condition = threading.Condition()
+        self._unfinished = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def set_dispatcher(self, dispatch: Callable):
+        """设置回调的执行方式，dispatch(callback, *args)"""
+        self.dispatch = dispatch
+
+    def submit(self, func: Callable, *args, key: Optional[Hashable] = None, urgent: bool = False,
+               on_done: Optional[Callable] = None, on_error: Optional[Callable] = None,
+               on_progress: Optional[Callable] = None, on_cancelled: Optional[Callable] = None) -> IOTask:
+        """提交任务，返回 IOTask
+
+        on_done(结果)、on_error(异常)、on_progress(已完成, 总数)、on_cancelled()
+        通过 dispatch 回调。
+        """
+        task = IOTask(func, args, key, on_done, on_error, on_progress, on_cancelled)
+        task._worker = self
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("后台I/O线程已关闭")
+            if key is not None:
+                previous = self._latest.get(key)
+                if previous is not None and previous.state == PENDING:
+                    previous.state = SUPERSEDED
+                self._latest[key] = task
+            (self._urgent if urgent else self._normal).append(task)
+            self._unfinished += 1
+            self._ensure_thread()
+            self._condition.notify()
+        return task
+
+    def pending_count(self) -> int:
+        """尚未结束的任务数"""
+        with self._condition:
+            return self._unfinished
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的任务全部结束，返回是否在超时前结束"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def shutdown(self):
+        """执行完已提交的任务后停止线程"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _next_task(self) -> Optional[IOTask]:
+        with self._condition:
+            while not self._urgent and not self._normal:
+                if self._stopping:
+                    return None
+                self._condition.wait()
+            task = self._urgent.popleft() if self._urgent else self._normal.popleft()
+            if task.state == PENDING:
+                task.state = CANCELLED if task.cancelled else RUNNING
+            return task
+
+    def _run(self):
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            if task.state == RUNNING:
+                self._execute(task)
+            if task.state == CANCELLED and task.on_cancelled is not None:
+                self.dispatch(task.on_cancelled)
+            with self._condition:
+                if task.key is not None and self._latest.get(task.key) is task:
+                    del self._latest[task.key]
+                self._unfinished -= 1
+                self._condition.notify_all()
+            task._finished.set()
+
+    def _execute(self, task: IOTask):
+        try:
+            task.result = task.func(task, *task.args)
+        except TaskCancelled:
+            task.state = CANCELLED
+            return
+        except Exception as e:
+            task.state = FAILED
+            task.error = e
+            if task.on_error is not None:
+                self.dispatch(task.on_error, e)
+            else:
+                print(f"后台任务执行失败: {e}")
+            return
+        task.state = DONE
+        if task.on_done is not None:
+            self.dispatch(task.on_done, task.result)
+
+
+class TkCallbackQueue:
+    """在Tk主线程中执行后台线程提交的回调
+
+    后台线程只向队列中放入回调，主线程通过 after() 定时取出执行，
+    不在后台线程中直接操作Tk控件。
+    """
+
+    def __init__(self, root, interval_ms: int = 50):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.root.after(self.interval_ms, self._poll)
+
+    def __call__(self, callback: Callable, *args):
+        self._queue.put((callback, args))
+
+    def _poll(self):
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"后台任务回调失败: {e}")
+        try:
+            self.root.after(self.interval_ms, self._poll)
+        except Exception:
+            # 窗口已关闭
+            pass
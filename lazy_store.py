@@ -0,0 +1,205 @@
+from collections import OrderedDict
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from binary_snapshot import BinarySnapshot
+
+# 遍历整张表时每次从快照中成批读取的行数
+HYDRATE_CHUNK_SIZE = 2000
+
+
+class _LazyItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping.iter_records()
+
+
+class _LazyValuesView(ValuesView):
+    def __iter__(self):
+        return (record for _, record in self._mapping.iter_records())
+
+
+class LazyRecordTable(MutableMapping):
+    """按需从二进制快照中读取的菜品或宴席表
+
+    启动时只读入各实体的ID和名称；record = table[实体ID] 时才从映射的快照文件中
+    读出完整记录，并放入容量有限的LRU缓存，最久未访问的记录会被淘汰。
+    新增和修改的记录保存在内存中，直到写入新的快照后（rebase）才可以淘汰。
+
+    遍历整张表（items()、values()，如保存和导出）时成批读取且不进入缓存，
+    不会把常用记录挤出缓存。名称可通过 name_items() 读取而不加载记录。
+    """
+
+    def __init__(self, kind: str, snapshot: BinarySnapshot, cache_size: int = 1024):
+        self.kind = kind
+        self.max_size = cache_size
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._overrides: Dict[str, object] = {}   # 快照中已有、之后被修改的记录
+        self._added: Dict[str, object] = {}       # 快照中没有的新记录（按加入顺序）
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rebase(snapshot)
+
+    def rebase(self, snapshot: BinarySnapshot):
+        """改为从新的快照读取（新快照必须已包含表中的全部记录）"""
+        self._snapshot = snapshot
+        ids, self._names = snapshot.index(self.kind)
+        self._ids: List[Optional[str]] = ids        # 行号 -> 实体ID（已删除为None）
+        self._rows = {entity_id: row for row, entity_id in enumerate(ids)}
+        self._overrides.clear()
+        self._added.clear()
+        # 缓存中的记录与新快照中的内容相同，继续保留
+
+    def reattach(self, snapshot: BinarySnapshot):
+        """重新映射同一份快照文件后改用新的映射（行号不变）"""
+        self._snapshot = snapshot
+
+    def _read(self, start: int, end: int) -> List:
+        if self.kind == "dishes":
+            return self._snapshot.dish_records(start, end)
+        return self._snapshot.menu_records(start, end)
+
+    def __getitem__(self, entity_id: str):
+        record = self._overrides.get(entity_id)
+        if record is not None:
+            return record
+        record = self._added.get(entity_id)
+        if record is not None:
+            return record
+        record = self._cache.get(entity_id)
+        if record is not None:
+            self.hits += 1
+            self._cache.move_to_end(entity_id)
+            return record
+        row = self._rows[entity_id]
+        self.misses += 1
+        record = self._read(row, row + 1)[0]
+        self._cache[entity_id] = record
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return record
+
+    def __setitem__(self, entity_id: str, record):
+        self._cache.pop(entity_id, None)
+        if entity_id in self._rows:
+            self._overrides[entity_id] = record
+        else:
+            self._added[entity_id] = record
+
+    def __delitem__(self, entity_id: str):
+        if entity_id in self._added:
+            del self._added[entity_id]
+            return
+        row = self._rows.pop(entity_id)
+        self._ids[row] = None
+        self._overrides.pop(entity_id, None)
+        self._cache.pop(entity_id, None)
+
+    def __contains__(self, entity_id) -> bool:
+        return entity_id in self._rows or entity_id in self._added
+
+    def __iter__(self) -> Iterator[str]:
+        for entity_id in self._ids:
+            if entity_id is not None:
+                yield entity_id
+        yield from self._added
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._added)
+
+    def __repr__(self) -> str:
+        return f"LazyRecordTable({self.kind}, {len(self)} 项, 缓存 {len(self._cache)} 项)"
+
+    def items(self):
+        return _LazyItemsView(self)
+
+    def values(self):
+        return _LazyValuesView(self)
+
+    def iter_records(self) -> Iterator[Tuple[str, object]]:
+        """按顺序成批读取全部 (实体ID, 记录)，不经过缓存"""
+        ids = self._ids
+        for start in range(0, len(ids), HYDRATE_CHUNK_SIZE):
+            end = min(start + HYDRATE_CHUNK_SIZE, len(ids))
+            for entity_id, record in zip(ids[start:end], self._read(start, end)):
+                if entity_id is not None:
+                    yield entity_id, self._overrides.get(entity_id, record)
+        yield from self._added.items()
+
+    def name_items(self) -> Iterator[Tuple[str, str]]:
+        """按顺序列出 (实体ID, 名称)，不读取记录"""
+        overrides = self._overrides
+        for entity_id, name in zip(self._ids, self._names):
+            if entity_id is not None:
+                yield entity_id, overrides[entity_id]["name"] if entity_id in overrides else name
+        for entity_id, record in self._added.items():
+            yield entity_id, record["name"]
+
+    def sub_recipe_graph(self) -> Dict[str, List[str]]:
+        """有子配方的菜品 -> 子配方菜品ID（只读取快照中的子配方ID列，不读取配方）"""
+        graph = {}
+        for entity_id, sub_ids in zip(self._ids, self._snapshot.sub_recipe_ids()):
+            if entity_id is not None and sub_ids and entity_id not in self._overrides:
+                graph[entity_id] = sub_ids
+        for records in (self._overrides, self._added):
+            for entity_id, record in records.items():
+                if record.has_sub_recipes():
+                    graph[entity_id] = list(record.sub_recipes)
+        return graph
+
+    def copy(self) -> Dict:
+        """读出全部记录的独立副本（用于后台导出等，不依赖快照文件）"""
+        return dict(self.iter_records())
+
+    def cache_stats(self) -> Dict:
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "resident": len(self._overrides) + len(self._added),
+        }
+
+
+class LazyCatalog:
+    """以延迟加载方式打开的二进制快照
+
+    食材库整体读入（按列存储，占用较小），菜品和宴席为 LazyRecordTable。
+    快照文件被重写时，先 release() 释放映射，替换文件后 reopen() 重新映射并让各表改为
+    读取新文件（Windows 下被映射的文件不能被替换）。
+    """
+
+    def __init__(self, filename: str, cache_size: int = 1024):
+        self.filename = filename
+        self.cache_size = cache_size
+        self.snapshot: Optional[BinarySnapshot] = None
+        self.tables: Dict[str, LazyRecordTable] = {}
+
+    def load(self) -> Dict:
+        """读取非实体字段、食材库和菜品/宴席的ID与名称"""
+        self.snapshot = BinarySnapshot(self.filename)
+        data = self.snapshot.meta()
+        data["ingredients"] = self.snapshot.ingredients()
+        self.tables = {kind: LazyRecordTable(kind, self.snapshot, self.cache_size) for kind in ("dishes", "menus")}
+        data.update(self.tables)
+        return data
+
+    def release(self):
+        """释放文件映射，在 reopen() 之前不能读取未缓存的记录"""
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+    def reopen(self, rebase: bool = True):
+        """重新映射快照文件；rebase 为 True 时文件已包含各表的当前内容"""
+        self.snapshot = BinarySnapshot(self.filename)
+        for table in self.tables.values():
+            if rebase:
+                table.rebase(self.snapshot)
+            else:
+                table.reattach(self.snapshot)
+
+    def close(self):
+        self.release()
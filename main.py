@@ -1,22 +1,95 @@
+from startup_timer import StartupTimer
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from data_manager import DataManager
+from data_manager import DataManager, preload_deferred_modules
+from events import ADDED, DELETED, RELOADED
+from instrumentation import format_stats
+from io_worker import TkCallbackQueue
+from widgets import ChoiceLabels, ComboboxSearch, VirtualTreeview, format_amount, format_money
 import os
 
 class DishWeightGUI:
     """宴席菜品配料统计GUI主界面"""
     
-    def __init__(self):
+    # 统计结果表格中总计行的行键
+    RESULT_TOTAL_ROW = "__total__"
+    
+    # 共享数据文件时检查其他工作站变更的间隔（毫秒）
+    SHARED_POLL_INTERVAL_MS = 2000
+    
+    def __init__(self, startup_timer: StartupTimer = None):
+        # 启动耗时统计
+        self.startup_timer = startup_timer or StartupTimer()
+        self.startup_timer.mark("导入模块")
+        
         self.root = tk.Tk()
         self.root.title("宴席菜品配料统计系统")
         self.root.geometry("1200x800")
         
-        # 初始化数据管理器
-        self.data_manager = DataManager()
+        # 初始化数据管理器：数据文件在后台线程中写出，完成回调通过 after() 回到主线程
+        # 设置环境变量 DISHWEIGHT_STATS=1 时开启运行统计（操作计时、写入字节数）；
+        # DISHWEIGHT_LAZY=1 时使用二进制快照并延迟加载菜品和宴席，数据量很大时启动更快；
+        # DISHWEIGHT_SHARED=1 时多台电脑共用同一数据文件，定时合并其他工作站保存的变更
+        lazy = os.environ.get("DISHWEIGHT_LAZY") == "1"
+        shared = os.environ.get("DISHWEIGHT_SHARED") == "1" and not lazy
+        self.data_manager = DataManager(persistence="binary" if lazy else "snapshot", write_behind=True,
+                                        instrument=os.environ.get("DISHWEIGHT_STATS") == "1", lazy=lazy,
+                                        shared=shared)
+        self.data_manager.io_worker.set_dispatcher(TkCallbackQueue(self.root))
+        self.startup_timer.mark("加载数据")
+        
+        # 正在进行的后台导出任务
+        self.export_task = None
+        
+        # 下拉框和列表中显示的 "名称 (ID)" 文本与ID的映射
+        self.ingredient_labels = ChoiceLabels(self._entity_label)
+        self.dish_labels = ChoiceLabels(self._entity_label)
+        self.menu_labels = ChoiceLabels(self._entity_label)
         
         # 创建界面
         self.create_widgets()
         self.refresh_all_data()
+        self.startup_timer.mark("创建界面")
+        
+        # 数据变更后只更新受影响的行
+        self.data_manager.subscribe(self.on_data_changed)
+        
+        # 共享数据文件时定时检查其他工作站的保存，变更的实体同样通过变更事件更新界面
+        if shared:
+            self.root.after(self.SHARED_POLL_INTERVAL_MS, self._poll_external_changes)
+        
+        # 窗口首次显示后输出启动耗时，并在后台预加载导出模块
+        self._first_render_done = False
+        self.root.bind("<Map>", self._on_window_mapped, add="+")
+    
+    def _on_window_mapped(self, event):
+        """主窗口首次映射到屏幕后，等待空闲（绘制完成）再记录"""
+        if event.widget is self.root and not self._first_render_done:
+            self._first_render_done = True
+            self.root.after_idle(self._on_first_render)
+    
+    def _on_first_render(self):
+        """记录首次显示耗时并预热导出模块"""
+        self.startup_timer.mark("首次显示")
+        print(self.startup_timer.report())
+        threading.Thread(target=self._warm_up_exports, daemon=True).start()
+    
+    def _warm_up_exports(self):
+        """后台预加载pandas/openpyxl等模块，首次导出时无需等待导入"""
+        try:
+            preload_deferred_modules()
+        except Exception as e:
+            print(f"预加载导出模块失败: {e}")
+    
+    def _poll_external_changes(self):
+        """合并其他工作站保存的变更，然后安排下一次检查"""
+        self.data_manager.check_external_changes()
+        self.root.after(self.SHARED_POLL_INTERVAL_MS, self._poll_external_changes)
+    
+    @staticmethod
+    def _entity_label(entity_id: str, name: str) -> str:
+        return f"{name} ({entity_id})"
     
     def create_widgets(self):
         """创建界面组件"""
@@ -73,20 +146,10 @@ class DishWeightGUI:
         list_frame = ttk.LabelFrame(ingredients_frame, text="食材列表")
         list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        # 创建表格
+        # 创建表格（只显示可见行，滚动时按需读取食材数据）
         columns = ("ID", "食材名称", "单位", "单价")
-        self.ingredients_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
-        
-        for col in columns:
-            self.ingredients_tree.heading(col, text=col)
-            self.ingredients_tree.column(col, width=100)
-        
-        # 滚动条
-        scrollbar_ing = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.ingredients_tree.yview)
-        self.ingredients_tree.configure(yscrollcommand=scrollbar_ing.set)
-        
-        self.ingredients_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar_ing.pack(side=tk.RIGHT, fill=tk.Y)
+        self.ingredients_tree = VirtualTreeview(list_frame, columns, self._ingredient_row, height=15)
+        self.ingredients_tree.pack(fill=tk.BOTH, expand=True)
         
         # 绑定选择事件
         self.ingredients_tree.bind("<<TreeviewSelect>>", self.on_ingredient_select)
@@ -149,6 +212,9 @@ class DishWeightGUI:
         self.dish_ingredient_combo.grid(row=0, column=1, padx=2, pady=2)
         
         # 绑定输入事件以支持模糊搜索
+        self.ingredient_search = ComboboxSearch(self.dish_ingredient_combo,
+                                                self.data_manager.incremental_search("ingredients"),
+                                                self.ingredient_labels, self._popup_ingredient_dropdown)
         self.dish_ingredient_combo.bind('<KeyRelease>', self.on_ingredient_search)
         self.dish_ingredient_combo.bind('<Button-1>', self.on_ingredient_combo_click)
         self.dish_ingredient_combo.bind('<<ComboboxSelected>>', self.on_ingredient_selected)
@@ -164,14 +230,13 @@ class DishWeightGUI:
         
         # 配料列表
         dish_ing_columns = ("食材名称", "用量", "单位")
-        self.dish_ingredients_tree = ttk.Treeview(right_frame, columns=dish_ing_columns, show="headings", height=12)
-        
-        for col in dish_ing_columns:
-            self.dish_ingredients_tree.heading(col, text=col)
-            self.dish_ingredients_tree.column(col, width=100)
-        
+        self.dish_ingredients_tree = VirtualTreeview(right_frame, dish_ing_columns, self._dish_ingredient_row, height=12)
         self.dish_ingredients_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # 子配方（引用的其他菜品，保存菜品时保持不变）
+        self.dish_sub_recipes_var = tk.StringVar()
+        ttk.Label(right_frame, textvariable=self.dish_sub_recipes_var, wraplength=500).pack(anchor=tk.W, padx=5)
+        
         self.selected_dish_id = None
         self.current_dish_ingredients = {}
     
@@ -236,6 +301,8 @@ class DishWeightGUI:
         self.menu_dish_combo.grid(row=0, column=1, padx=2, pady=2)
         
         # 绑定菜品搜索和选择事件
+        self.dish_search = ComboboxSearch(self.menu_dish_combo, self.data_manager.incremental_search("dishes"),
+                                          self.dish_labels, self._popup_dish_dropdown)
         self.menu_dish_combo.bind('<KeyRelease>', self.on_dish_search)
         self.menu_dish_combo.bind('<Button-1>', self.on_dish_combo_click)
         self.menu_dish_combo.bind('<<ComboboxSelected>>', self.on_dish_selected)
@@ -249,12 +316,8 @@ class DishWeightGUI:
         
         # 菜品列表
         menu_dish_columns = ("菜品名称", "份数")
-        self.menu_dishes_tree = ttk.Treeview(right_frame, columns=menu_dish_columns, show="headings", height=12)
-        
-        for col in menu_dish_columns:
-            self.menu_dishes_tree.heading(col, text=col)
-            self.menu_dishes_tree.column(col, width=150)
-        
+        self.menu_dishes_tree = VirtualTreeview(right_frame, menu_dish_columns, self._menu_dish_row,
+                                                height=12, column_width=150)
         self.menu_dishes_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         self.selected_menu_id = None
@@ -275,11 +338,20 @@ class DishWeightGUI:
         
         ttk.Label(select_frame, text="选择宴席:").pack(side=tk.LEFT)
         self.analysis_menu_var = tk.StringVar()
-        self.analysis_menu_combo = ttk.Combobox(select_frame, textvariable=self.analysis_menu_var, width=20)
+        self.analysis_menu_combo = ttk.Combobox(select_frame, textvariable=self.analysis_menu_var, width=20,
+                                                postcommand=self._fill_analysis_menu_combo)
         self.analysis_menu_combo.pack(side=tk.LEFT, padx=5)
         
         ttk.Button(select_frame, text="计算食材用量", command=self.calculate_ingredients).pack(side=tk.LEFT, padx=5)
         ttk.Button(select_frame, text="导出食材统计", command=self.export_menu_statistics).pack(side=tk.LEFT, padx=5)
+        ttk.Button(select_frame, text="批量导出全部宴席", command=self.export_all_menu_statistics).pack(side=tk.LEFT, padx=5)
+        
+        # 导出进度（导出在后台进行，可以取消）
+        self.cancel_export_button = ttk.Button(select_frame, text="取消导出", command=self.cancel_export,
+                                               state=tk.DISABLED)
+        self.cancel_export_button.pack(side=tk.LEFT, padx=5)
+        self.export_status_var = tk.StringVar()
+        ttk.Label(select_frame, textvariable=self.export_status_var).pack(side=tk.LEFT, padx=5)
         
         # 数据管理框架
         data_mgmt_frame = ttk.LabelFrame(analysis_frame, text="数据管理")
@@ -300,6 +372,8 @@ class DishWeightGUI:
         
         ttk.Button(mgmt_btn_frame, text="刷新数据", command=self.refresh_all_data).pack(side=tk.LEFT, padx=2)
         ttk.Button(mgmt_btn_frame, text="查看数据信息", command=self.show_data_info).pack(side=tk.LEFT, padx=2)
+        ttk.Button(mgmt_btn_frame, text="导出运行统计", command=self.export_stats).pack(side=tk.LEFT, padx=2)
+        ttk.Button(mgmt_btn_frame, text="导出全部数据", command=self.export_all_data).pack(side=tk.LEFT, padx=2)
         
         # 下半部分：统计结果
         result_frame = ttk.LabelFrame(analysis_frame, text="食材用量统计")
@@ -307,18 +381,18 @@ class DishWeightGUI:
         
         # 统计结果表格
         result_columns = ("食材名称", "总用量", "单位", "单价", "总价")
-        self.result_tree = ttk.Treeview(result_frame, columns=result_columns, show="headings", height=15)
-        
-        for col in result_columns:
-            self.result_tree.heading(col, text=col)
-            self.result_tree.column(col, width=120)
+        self.result_tree = VirtualTreeview(
+            result_frame, result_columns, self._result_row, height=15, column_width=120,
+            formatters={"总用量": format_amount, "单价": format_money, "总价": format_money},
+            row_tags=lambda key: ('total',) if key == self.RESULT_TOTAL_ROW else ())
+        self.result_tree.pack(fill=tk.BOTH, expand=True)
         
-        # 滚动条
-        scrollbar_result = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=self.result_tree.yview)
-        self.result_tree.configure(yscrollcommand=scrollbar_result.set)
+        # 配置总计行样式
+        self.result_tree.tag_configure('total', background='lightblue', font=('Arial', 10, 'bold'))
         
-        self.result_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar_result.pack(side=tk.RIGHT, fill=tk.Y)
+        # 当前统计结果 {食材ID: 表格行} 和总成本
+        self.analysis_rows = {}
+        self.analysis_total_cost = 0.0
     
     # 食材管理相关方法
     def add_ingredient(self):
@@ -337,8 +411,11 @@ class DishWeightGUI:
             messagebox.showerror("错误", "单价必须是数字")
             return
         
-        self.data_manager.add_ingredient(name, unit, price)
-        self.refresh_ingredients()
+        try:
+            self.data_manager.add_ingredient(name, unit, price)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
         self.clear_ingredient_inputs()
         messagebox.showinfo("成功", "食材添加成功")
     
@@ -362,8 +439,11 @@ class DishWeightGUI:
             messagebox.showerror("错误", "单价必须是数字")
             return
         
-        self.data_manager.update_ingredient(self.selected_ingredient_id, name, unit, price)
-        self.refresh_ingredients()
+        try:
+            self.data_manager.update_ingredient(self.selected_ingredient_id, name, unit, price)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
         self.clear_ingredient_inputs()
         messagebox.showinfo("成功", "食材更新成功")
     
@@ -386,16 +466,13 @@ class DishWeightGUI:
             success = self.data_manager.delete_ingredient(self.selected_ingredient_id)
             
             if success:
-                self.refresh_ingredients()
                 self.clear_ingredient_inputs()
                 messagebox.showinfo("成功", f"食材 '{ingredient_name}' 删除成功")
             else:
                 # 检查具体失败原因
-                used_in_dishes = []
                 dishes = self.data_manager.get_dishes()
-                for dish_id, dish_info in dishes.items():
-                    if self.selected_ingredient_id in dish_info["ingredients"]:
-                        used_in_dishes.append(dish_info["name"])
+                used_in_dishes = [dishes[dish_id]["name"]
+                                  for dish_id in self.data_manager.dishes_using(self.selected_ingredient_id)]
                 
                 if used_in_dishes:
                     messagebox.showerror("删除失败", 
@@ -410,16 +487,14 @@ class DishWeightGUI:
         """食材选择事件"""
         selection = self.ingredients_tree.selection()
         if selection:
-            item = self.ingredients_tree.item(selection[0])
-            values = item['values']
-            
-            # 确保ID是字符串类型
-            self.selected_ingredient_id = str(values[0])
+            # 表格的行键即食材ID
+            self.selected_ingredient_id = selection[0]
+            ing_info = self.data_manager.get_ingredients()[self.selected_ingredient_id]
             
             # 填充输入框
-            self.ingredient_name_var.set(values[1])
-            self.ingredient_unit_var.set(values[2])
-            self.ingredient_price_var.set(values[3])
+            self.ingredient_name_var.set(ing_info["name"])
+            self.ingredient_unit_var.set(ing_info["unit"])
+            self.ingredient_price_var.set(ing_info["price"])
     
     def clear_ingredient_inputs(self):
         """清空食材输入框"""
@@ -428,69 +503,28 @@ class DishWeightGUI:
         self.ingredient_price_var.set("")
         self.selected_ingredient_id = None
     
+    def _ingredient_row(self, ing_id: str):
+        """食材表格一行的数据"""
+        ing_info = self.data_manager.get_ingredients()[ing_id]
+        return ing_id, ing_info["name"], ing_info["unit"], ing_info["price"]
+    
     def refresh_ingredients(self):
         """刷新食材列表"""
-        # 清空表格
-        for item in self.ingredients_tree.get_children():
-            self.ingredients_tree.delete(item)
-        
-        # 重新加载数据
-        ingredients = self.data_manager.get_ingredients()
-        for ing_id, ing_info in ingredients.items():
-            self.ingredients_tree.insert("", tk.END, values=(
-                ing_id, ing_info["name"], ing_info["unit"], ing_info["price"]
-            ))
+        # 表格只保存食材ID，可见行的内容在显示时读取
+        self.ingredients_tree.set_rows(self.data_manager.get_ingredients())
         
         # 更新下拉框
         self.update_ingredient_combos()
     
     def update_ingredient_combos(self):
         """更新食材下拉框"""
-        ingredients = self.data_manager.get_ingredients()
-        # 存储食材名称到ID的映射
-        self.ingredient_name_to_id = {}
-        ingredient_names = []
-        
-        for ing_id, ing_info in ingredients.items():
-            name = ing_info['name']
-            display_name = f"{name} ({ing_id})"
-            ingredient_names.append(display_name)
-            # 同时支持纯名称和带ID的格式查找
-            self.ingredient_name_to_id[name] = ing_id
-            self.ingredient_name_to_id[display_name] = ing_id
-        
-        self.all_ingredient_names = ingredient_names
-        self.dish_ingredient_combo['values'] = ingredient_names
+        # 下拉框显示文本到ID的映射，纯名称通过数据管理器的名称索引查找
+        self.ingredient_labels.rebuild(self.data_manager.get_ingredients())
+        self.ingredient_search.show_all()
     
     def on_ingredient_search(self, event):
-        """食材搜索事件处理"""
-        # 在中文等输入法组合输入阶段（Windows 常见为 keycode 229 / VK_PROCESSKEY）不更新/弹出，避免覆盖候选上屏
-        if hasattr(event, 'keycode') and event.keycode == 229:
-            return
-        
-        search_text = self.dish_ingredient_var.get().lower()
-        if not hasattr(self, 'all_ingredient_names'):
-            return
-        
-        if search_text == "":
-            # 如果搜索框为空，显示所有食材
-            self.dish_ingredient_combo['values'] = self.all_ingredient_names
-        else:
-            # 模糊搜索匹配
-            filtered_names = [name for name in self.all_ingredient_names 
-                            if search_text in name.lower()]
-            self.dish_ingredient_combo['values'] = filtered_names
-        
-        # 安全地在非输入法组合阶段、且内容有变更时弹出下拉，避免干扰上屏
-        try:
-            keysym = getattr(event, 'keysym', '')
-            keycode = getattr(event, 'keycode', None)
-            if keycode != 229 and search_text is not None and search_text != "":
-                # 避免方向键/功能键触发
-                if keysym not in ('Up','Down','Left','Right','Return','Escape','Tab','Shift_L','Shift_R','Control_L','Control_R','Alt_L','Alt_R'):
-                    self.root.after(60, self._popup_ingredient_dropdown)
-        except Exception:
-            pass
+        """食材搜索事件处理（防抖后通过搜索索引查询）"""
+        self.ingredient_search.on_key_release(event)
     
     def _popup_ingredient_dropdown(self):
         """安全地弹出食材下拉框"""
@@ -503,8 +537,7 @@ class DishWeightGUI:
     def on_ingredient_combo_click(self, event):
         """食材下拉框点击事件"""
         # 点击时显示所有食材
-        if hasattr(self, 'all_ingredient_names'):
-            self.dish_ingredient_combo['values'] = self.all_ingredient_names
+        self.ingredient_search.show_all()
     
     def on_ingredient_selected(self, event):
         """食材选择事件处理"""
@@ -514,34 +547,8 @@ class DishWeightGUI:
             self.dish_ingredient_var.set(selected_value)
     
     def on_dish_search(self, event):
-        """菜品搜索事件处理"""
-        # 在中文等输入法组合输入阶段（Windows 常见为 keycode 229 / VK_PROCESSKEY）不更新/弹出，避免覆盖候选上屏
-        if hasattr(event, 'keycode') and event.keycode == 229:
-            return
-        
-        search_text = self.menu_dish_var.get().lower()
-        if not hasattr(self, 'all_dish_names'):
-            return
-        
-        if search_text == "":
-            # 如果搜索框为空，显示所有菜品
-            self.menu_dish_combo['values'] = self.all_dish_names
-        else:
-            # 模糊搜索匹配
-            filtered_names = [name for name in self.all_dish_names 
-                            if search_text in name.lower()]
-            self.menu_dish_combo['values'] = filtered_names
-        
-        # 安全地在非输入法组合阶段、且内容有变更时弹出下拉，避免干扰上屏
-        try:
-            keysym = getattr(event, 'keysym', '')
-            keycode = getattr(event, 'keycode', None)
-            if keycode != 229 and search_text is not None and search_text != "":
-                # 避免方向键/功能键触发
-                if keysym not in ('Up','Down','Left','Right','Return','Escape','Tab','Shift_L','Shift_R','Control_L','Control_R','Alt_L','Alt_R'):
-                    self.root.after(60, self._popup_dish_dropdown)
-        except Exception:
-            pass
+        """菜品搜索事件处理（防抖后通过搜索索引查询）"""
+        self.dish_search.on_key_release(event)
     
     def _popup_dish_dropdown(self):
         """安全地弹出菜品下拉框"""
@@ -554,8 +561,7 @@ class DishWeightGUI:
     def on_dish_combo_click(self, event):
         """菜品下拉框点击事件"""
         # 点击时显示所有菜品
-        if hasattr(self, 'all_dish_names'):
-            self.menu_dish_combo['values'] = self.all_dish_names
+        self.dish_search.show_all()
     
     def on_dish_selected(self, event):
         """菜品选择事件处理"""
@@ -570,6 +576,7 @@ class DishWeightGUI:
         self.selected_dish_id = None
         self.dish_name_var.set("")
         self.current_dish_ingredients = {}
+        self.dish_sub_recipes_var.set("")
         self.refresh_dish_ingredients_tree()
     
     def save_dish(self):
@@ -579,20 +586,24 @@ class DishWeightGUI:
             messagebox.showerror("错误", "请填写菜品名称")
             return
         
-        if not self.current_dish_ingredients:
+        dishes = self.data_manager.get_dishes()
+        has_sub_recipes = self.selected_dish_id in dishes and dishes[self.selected_dish_id].has_sub_recipes()
+        if not self.current_dish_ingredients and not has_sub_recipes:
             messagebox.showerror("错误", "请至少添加一种配料")
             return
         
-        if self.selected_dish_id:
-            # 更新现有菜品
-            self.data_manager.update_dish(self.selected_dish_id, name, self.current_dish_ingredients)
-            messagebox.showinfo("成功", "菜品更新成功")
-        else:
-            # 添加新菜品
-            self.data_manager.add_dish(name, self.current_dish_ingredients)
-            messagebox.showinfo("成功", "菜品添加成功")
-        
-        self.refresh_dishes()
+        try:
+            if self.selected_dish_id:
+                # 更新现有菜品
+                self.data_manager.update_dish(self.selected_dish_id, name, self.current_dish_ingredients)
+                messagebox.showinfo("成功", "菜品更新成功")
+            else:
+                # 添加新菜品
+                self.data_manager.add_dish(name, self.current_dish_ingredients)
+                messagebox.showinfo("成功", "菜品添加成功")
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
     
     def delete_dish(self):
         """删除菜品"""
@@ -600,9 +611,15 @@ class DishWeightGUI:
             messagebox.showerror("错误", "请先选择要删除的菜品")
             return
         
+        parents = self.data_manager.dishes_using_sub_recipe(self.selected_dish_id)
+        if parents:
+            dishes = self.data_manager.get_dishes()
+            names = "、".join(dishes[dish_id]["name"] for dish_id in parents)
+            messagebox.showerror("错误", f"该菜品是以下菜品的子配方，不能删除：{names}")
+            return
+        
         if messagebox.askyesno("确认", "确定要删除这个菜品吗？"):
             self.data_manager.delete_dish(self.selected_dish_id)
-            self.refresh_dishes()
             self.new_dish()
             messagebox.showinfo("成功", "菜品删除成功")
     
@@ -621,22 +638,10 @@ class DishWeightGUI:
             messagebox.showerror("错误", "用量必须是数字")
             return
         
-        # 解析食材ID - 支持多种输入方式
-        ingredient_id = None
-        
-        # 首先检查是否在映射表中
-        if hasattr(self, 'ingredient_name_to_id') and ingredient_text in self.ingredient_name_to_id:
-            ingredient_id = self.ingredient_name_to_id[ingredient_text]
-        # 如果不在映射表中，尝试传统的解析方式
-        elif "(" in ingredient_text and ")" in ingredient_text:
-            ingredient_id = ingredient_text.split("(")[-1].split(")")[0]
-        # 如果都不匹配，尝试按纯名称查找
-        else:
-            ingredients = self.data_manager.get_ingredients()
-            for ing_id, ing_info in ingredients.items():
-                if ing_info['name'].lower() == ingredient_text.lower():
-                    ingredient_id = ing_id
-                    break
+        # 解析食材ID - 支持下拉框选项和纯名称两种输入方式
+        ingredient_id = self.ingredient_labels.id_for(ingredient_text)
+        if ingredient_id is None:
+            ingredient_id = self.data_manager.find_ingredient_by_name(ingredient_text)
         
         if not ingredient_id:
             messagebox.showerror("错误", "请选择有效的食材")
@@ -656,18 +661,10 @@ class DishWeightGUI:
             messagebox.showerror("错误", "请先选择要删除的配料")
             return
         
-        item = self.dish_ingredients_tree.item(selection[0])
-        ingredient_name = item['values'][0]
-        
-        # 找到对应的食材ID
-        ingredients = self.data_manager.get_ingredients()
-        ingredient_id = None
-        for ing_id, ing_info in ingredients.items():
-            if ing_info["name"] == ingredient_name:
-                ingredient_id = ing_id
-                break
+        # 表格行的iid即食材ID
+        ingredient_id = selection[0]
         
-        if ingredient_id and ingredient_id in self.current_dish_ingredients:
+        if ingredient_id in self.current_dish_ingredients:
             del self.current_dish_ingredients[ingredient_id]
             self.refresh_dish_ingredients_tree()
     
@@ -675,54 +672,51 @@ class DishWeightGUI:
         """菜品选择事件"""
         selection = self.dishes_listbox.curselection()
         if selection:
-            dish_text = self.dishes_listbox.get(selection[0])
-            # 解析菜品ID
-            if "(" in dish_text and ")" in dish_text:
-                self.selected_dish_id = dish_text.split("(")[-1].split(")")[0]
-                
-                # 加载菜品信息
-                dishes = self.data_manager.get_dishes()
-                if self.selected_dish_id in dishes:
-                    dish_info = dishes[self.selected_dish_id]
-                    self.dish_name_var.set(dish_info["name"])
-                    self.current_dish_ingredients = dish_info["ingredients"].copy()
-                    self.refresh_dish_ingredients_tree()
+            self.selected_dish_id = self.dish_list_ids[selection[0]]
+            
+            # 加载菜品信息
+            dishes = self.data_manager.get_dishes()
+            if self.selected_dish_id in dishes:
+                dish_info = dishes[self.selected_dish_id]
+                self.dish_name_var.set(dish_info["name"])
+                self.current_dish_ingredients = dish_info["ingredients"].copy()
+                self.dish_sub_recipes_var.set(self._sub_recipes_text(dish_info["sub_recipes"]))
+                self.refresh_dish_ingredients_tree()
+    
+    def _sub_recipes_text(self, sub_recipes: dict) -> str:
+        """子配方的显示文本（如 子配方：高汤 × 0.50份、红烧酱汁 × 1.00份）"""
+        if not sub_recipes:
+            return ""
+        dishes = self.data_manager.get_dishes()
+        parts = [f"{dishes[dish_id]['name'] if dish_id in dishes else dish_id} × {format_amount(amount)}份"
+                 for dish_id, amount in sub_recipes.items()]
+        return "子配方：" + "、".join(parts)
     
     def refresh_dishes(self):
         """刷新菜品列表"""
         self.dishes_listbox.delete(0, tk.END)
         
-        dishes = self.data_manager.get_dishes()
-        for dish_id, dish_info in dishes.items():
-            self.dishes_listbox.insert(tk.END, f"{dish_info['name']} ({dish_id})")
+        # 下拉框和列表使用相同的显示文本
+        self.dish_labels.rebuild(self.data_manager.get_dishes())
+        
+        # 列表行号到菜品ID的映射，以及菜品ID到行号的反向映射
+        self.dish_list_ids = list(self.data_manager.get_dishes())
+        self.dish_list_positions = {dish_id: row for row, dish_id in enumerate(self.dish_list_ids)}
+        self.dishes_listbox.insert(tk.END, *self.dish_labels.labels())
         
         # 更新下拉框
-        self.update_dish_combos()
+        self.dish_search.show_all()
     
-    def update_dish_combos(self):
-        """更新菜品下拉框"""
-        dishes = self.data_manager.get_dishes()
-        dish_names = [f"{dish_info['name']} ({dish_id})" for dish_id, dish_info in dishes.items()]
-        
-        # 存储所有菜品名称用于搜索
-        self.all_dish_names = dish_names
-        self.menu_dish_combo['values'] = dish_names
-        self.analysis_menu_combo['values'] = []  # 这里应该是宴席列表，稍后更新
+    def _dish_ingredient_row(self, ing_id: str):
+        """菜品配料表格一行的数据"""
+        ing_info = self.data_manager.get_ingredients()[ing_id]
+        return ing_info["name"], self.current_dish_ingredients[ing_id], ing_info["unit"]
     
     def refresh_dish_ingredients_tree(self):
         """刷新菜品配料表格"""
-        # 清空表格
-        for item in self.dish_ingredients_tree.get_children():
-            self.dish_ingredients_tree.delete(item)
-        
-        # 重新加载数据
         ingredients = self.data_manager.get_ingredients()
-        for ing_id, amount in self.current_dish_ingredients.items():
-            if ing_id in ingredients:
-                ing_info = ingredients[ing_id]
-                self.dish_ingredients_tree.insert("", tk.END, values=(
-                    ing_info["name"], amount, ing_info["unit"]
-                ))
+        self.dish_ingredients_tree.set_rows(
+            ing_id for ing_id in self.current_dish_ingredients if ing_id in ingredients)
     
     # 宴席管理相关方法
     def new_menu(self):
@@ -754,16 +748,18 @@ class DishWeightGUI:
             messagebox.showerror("错误", "餐桌数量必须是正整数")
             return
         
-        if self.selected_menu_id:
-            # 更新现有宴席
-            self.data_manager.update_menu(self.selected_menu_id, name, self.current_menu_dishes, table_count)
-            messagebox.showinfo("成功", "宴席更新成功")
-        else:
-            # 添加新宴席
-            self.data_manager.add_menu(name, self.current_menu_dishes, table_count)
-            messagebox.showinfo("成功", "宴席添加成功")
-        
-        self.refresh_menus()
+        try:
+            if self.selected_menu_id:
+                # 更新现有宴席
+                self.data_manager.update_menu(self.selected_menu_id, name, self.current_menu_dishes, table_count)
+                messagebox.showinfo("成功", "宴席更新成功")
+            else:
+                # 添加新宴席
+                self.data_manager.add_menu(name, self.current_menu_dishes, table_count)
+                messagebox.showinfo("成功", "宴席添加成功")
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
     
     def delete_menu(self):
         """删除宴席"""
@@ -772,10 +768,7 @@ class DishWeightGUI:
             return
         
         if messagebox.askyesno("确认", "确定要删除这个宴席吗？"):
-            if self.selected_menu_id in self.data_manager.data["menus"]:
-                del self.data_manager.data["menus"][self.selected_menu_id]
-                self.data_manager.save_data()
-            self.refresh_menus()
+            self.data_manager.delete_menu(self.selected_menu_id)
             self.new_menu()
             messagebox.showinfo("成功", "宴席删除成功")
     
@@ -794,10 +787,9 @@ class DishWeightGUI:
             messagebox.showerror("错误", "份数必须是整数")
             return
         
-        # 解析菜品ID
-        if "(" in dish_text and ")" in dish_text:
-            dish_id = dish_text.split("(")[-1].split(")")[0]
-        else:
+        # 解析菜品ID - 支持下拉框选项和纯名称两种输入方式
+        dish_id = self.dish_labels.id_for(dish_text) or self.data_manager.find_dish_by_name(dish_text)
+        if dish_id is None:
             messagebox.showerror("错误", "请选择有效的菜品")
             return
         
@@ -815,18 +807,10 @@ class DishWeightGUI:
             messagebox.showerror("错误", "请先选择要删除的菜品")
             return
         
-        item = self.menu_dishes_tree.item(selection[0])
-        dish_name = item['values'][0]
-        
-        # 找到对应的菜品ID
-        dishes = self.data_manager.get_dishes()
-        dish_id = None
-        for d_id, d_info in dishes.items():
-            if d_info["name"] == dish_name:
-                dish_id = d_id
-                break
+        # 表格行的iid即菜品ID
+        dish_id = selection[0]
         
-        if dish_id and dish_id in self.current_menu_dishes:
+        if dish_id in self.current_menu_dishes:
             del self.current_menu_dishes[dish_id]
             self.refresh_menu_dishes_tree()
     
@@ -834,50 +818,52 @@ class DishWeightGUI:
         """宴席选择事件"""
         selection = self.menus_listbox.curselection()
         if selection:
-            menu_text = self.menus_listbox.get(selection[0])
-            # 解析宴席ID
-            if "(" in menu_text and ")" in menu_text:
-                self.selected_menu_id = menu_text.split("(")[-1].split(")")[0]
-                
-                # 加载宴席信息
-                menus = self.data_manager.get_menus()
-                if self.selected_menu_id in menus:
-                    menu_info = menus[self.selected_menu_id]
-                    self.menu_name_var.set(menu_info["name"])
-                    self.current_menu_dishes = menu_info["dishes"].copy()
-                    # 加载餐桌数量，如果没有则默认为1
-                    table_count = menu_info.get("table_count", 1)
-                    self.menu_table_count_var.set(str(table_count))
-                    self.refresh_menu_dishes_tree()
+            self.selected_menu_id = self.menu_list_ids[selection[0]]
+            
+            # 加载宴席信息
+            menus = self.data_manager.get_menus()
+            if self.selected_menu_id in menus:
+                menu_info = menus[self.selected_menu_id]
+                self.menu_name_var.set(menu_info["name"])
+                self.current_menu_dishes = menu_info["dishes"].copy()
+                # 加载餐桌数量，如果没有则默认为1
+                table_count = menu_info.get("table_count", 1)
+                self.menu_table_count_var.set(str(table_count))
+                self.refresh_menu_dishes_tree()
     
     def refresh_menus(self):
         """刷新宴席列表"""
         self.menus_listbox.delete(0, tk.END)
         
-        menus = self.data_manager.get_menus()
-        for menu_id, menu_info in menus.items():
-            self.menus_listbox.insert(tk.END, f"{menu_info['name']} ({menu_id})")
+        # 下拉框和列表使用相同的显示文本
+        self.menu_labels.rebuild(self.data_manager.get_menus())
         
-        # 更新分析页面的宴席下拉框
-        menu_names = [f"{menu_info['name']} ({menu_id})" for menu_id, menu_info in menus.items()]
-        self.analysis_menu_combo['values'] = menu_names
+        # 列表行号到宴席ID的映射，以及宴席ID到行号的反向映射
+        self.menu_list_ids = list(self.data_manager.get_menus())
+        self.menu_list_positions = {menu_id: row for row, menu_id in enumerate(self.menu_list_ids)}
+        self.menus_listbox.insert(tk.END, *self.menu_labels.labels())
+    
+    def _fill_analysis_menu_combo(self):
+        """展开分析页面的宴席下拉框时填充选项"""
+        self.analysis_menu_combo['values'] = self.menu_labels.labels()
+    
+    def _menu_dish_row(self, dish_id: str):
+        """宴席菜品表格一行的数据"""
+        return self.data_manager.get_dishes()[dish_id]["name"], self.current_menu_dishes[dish_id]
     
     def refresh_menu_dishes_tree(self):
         """刷新宴席菜品表格"""
-        # 清空表格
-        for item in self.menu_dishes_tree.get_children():
-            self.menu_dishes_tree.delete(item)
-        
-        # 重新加载数据
         dishes = self.data_manager.get_dishes()
-        for dish_id, quantity in self.current_menu_dishes.items():
-            if dish_id in dishes:
-                dish_info = dishes[dish_id]
-                self.menu_dishes_tree.insert("", tk.END, values=(
-                    dish_info["name"], quantity
-                ))
+        self.menu_dishes_tree.set_rows(dish_id for dish_id in self.current_menu_dishes if dish_id in dishes)
     
     # 统计分析相关方法
+    def _resolve_analysis_menu(self, menu_text: str):
+        """根据宴席下拉框文本（选项或纯名称）获取宴席ID"""
+        menu_id = self.menu_labels.id_for(menu_text) or self.data_manager.find_menu_by_name(menu_text)
+        if menu_id not in self.data_manager.get_menus():
+            return None
+        return menu_id
+    
     def calculate_ingredients(self):
         """计算宴席食材用量"""
         menu_text = self.analysis_menu_var.get().strip()
@@ -886,44 +872,32 @@ class DishWeightGUI:
             return
         
         # 解析宴席ID
-        if "(" in menu_text and ")" in menu_text:
-            menu_id = menu_text.split("(")[-1].split(")")[0]
-        else:
+        menu_id = self._resolve_analysis_menu(menu_text)
+        if menu_id is None:
             messagebox.showerror("错误", "请选择有效的宴席")
             return
         
-        # 计算食材用量
-        total_ingredients = self.data_manager.calculate_ingredients_for_menu(menu_id)
-        
-        # 清空结果表格
-        for item in self.result_tree.get_children():
-            self.result_tree.delete(item)
-        
-        # 显示结果
+        # 计算食材用量，总成本使用缓存结果
         ingredients = self.data_manager.get_ingredients()
-        total_cost = 0
+        total_ingredients = self.data_manager.calculate_ingredients_for_menu(menu_id)
+        self.analysis_total_cost = self.data_manager.calculate_menu_cost(menu_id)
         
+        # 保存计算时的结果行（数值在表格中格式化），之后修改数据不影响已显示的结果
+        self.analysis_rows = {}
         for ing_id, amount in total_ingredients.items():
             if ing_id in ingredients:
                 ing_info = ingredients[ing_id]
-                cost = amount * ing_info["price"]
-                total_cost += cost
-                
-                self.result_tree.insert("", tk.END, values=(
-                    ing_info["name"], 
-                    f"{amount:.2f}", 
-                    ing_info["unit"], 
-                    f"¥{ing_info['price']:.2f}", 
-                    f"¥{cost:.2f}"
-                ))
-        
-        # 添加总计行 - 使用不同的标签来突出显示
-        self.result_tree.insert("", tk.END, values=(
-            "==== 总计 ====", "", "", "", f"¥{total_cost:.2f}"
-        ), tags=('total',))
+                self.analysis_rows[ing_id] = (ing_info["name"], amount, ing_info["unit"],
+                                              ing_info["price"], amount * ing_info["price"])
         
-        # 配置总计行样式
-        self.result_tree.tag_configure('total', background='lightblue', font=('Arial', 10, 'bold'))
+        # 显示结果，总计行固定在末尾并使用不同的标签突出显示
+        self.result_tree.set_rows(self.analysis_rows, pinned=(self.RESULT_TOTAL_ROW,))
+    
+    def _result_row(self, key: str):
+        """统计结果表格一行的数据"""
+        if key == self.RESULT_TOTAL_ROW:
+            return "==== 总计 ====", "", "", "", self.analysis_total_cost
+        return self.analysis_rows[key]
     
     def export_menu_statistics(self):
         """导出当前宴席的食材统计到Excel"""
@@ -933,19 +907,14 @@ class DishWeightGUI:
             return
         
         # 解析宴席ID和名称
-        if "(" in menu_text and ")" in menu_text:
-            menu_id = menu_text.split("(")[-1].split(")")[0]
-            menu_name = menu_text.split("(")[0].strip()
-        else:
+        menu_id = self._resolve_analysis_menu(menu_text)
+        if menu_id is None:
             messagebox.showerror("错误", "请选择有效的宴席")
             return
-        
-        from datetime import datetime
+        menu_name = self.data_manager.get_menus()[menu_id]["name"]
         
         # 自动生成文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_menu_name = "".join(c for c in menu_name if c.isalnum() or c in (' ', '-', '_')).strip()
-        default_filename = f"宴席食材统计_{safe_menu_name}_{timestamp}.xlsx"
+        default_filename = self._statistics_filename(menu_name)
         
         filename = filedialog.asksaveasfilename(
             initialfile=default_filename,
@@ -959,10 +928,129 @@ class DishWeightGUI:
             if not filename.lower().endswith('.xlsx'):
                 filename += '.xlsx'
                 
-            if self.data_manager.export_menu_statistics(menu_id, menu_name, filename):
-                messagebox.showinfo("成功", f"宴席食材统计已导出到 {filename}")
+            if not self._can_start_export():
+                return
+            task = self.data_manager.export_menu_statistics_in_background(
+                menu_id, menu_name, filename,
+                on_done=lambda result: self._on_export_finished(
+                    lambda: messagebox.showinfo("成功", f"宴席食材统计已导出到 {filename}")),
+                on_error=self._on_export_failed,
+                on_cancelled=self._on_export_cancelled)
+            if task is None:
+                messagebox.showerror("错误", "导出失败：没有找到宴席数据或食材数据")
+                return
+            self._start_export(task, "正在导出食材统计...")
+    
+    @staticmethod
+    def _statistics_filename(menu_name: str, timestamp: str = None) -> str:
+        """生成宴席食材统计的默认文件名"""
+        from datetime import datetime
+        
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_menu_name = "".join(c for c in menu_name if c.isalnum() or c in (' ', '-', '_')).strip()
+        return f"宴席食材统计_{safe_menu_name}_{timestamp}.xlsx"
+    
+    def export_all_menu_statistics(self):
+        """使用多进程将全部宴席的食材统计分别导出到选择的文件夹"""
+        menus = self.data_manager.get_menus()
+        if not menus:
+            messagebox.showerror("错误", "没有可导出的宴席")
+            return
+        
+        directory = filedialog.askdirectory(title="选择导出文件夹")
+        if not directory:
+            return
+        
+        from datetime import datetime
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        jobs = []
+        for menu_id, menu_info in menus.items():
+            # 文件名中加入宴席ID，避免同名宴席互相覆盖
+            filename = self._statistics_filename(f"{menu_info['name']}_{menu_id}", timestamp)
+            jobs.append((menu_id, os.path.join(directory, filename)))
+        
+        if not self._can_start_export():
+            return
+        
+        def on_done(results):
+            failed = [f"• {os.path.basename(filename)}：{error}" for filename, error in results.items() if error]
+            if failed:
+                messagebox.showerror("部分导出失败",
+                                     f"成功导出 {len(results) - len(failed)} 个文件，以下文件导出失败：\n" + "\n".join(failed))
             else:
-                messagebox.showerror("错误", "导出失败")
+                messagebox.showinfo("成功", f"已导出 {len(results)} 个宴席食材统计到 {directory}")
+        
+        task = self.data_manager.export_menu_statistics_bulk_in_background(
+            jobs,
+            on_done=lambda results: self._on_export_finished(lambda: on_done(results)),
+            on_error=self._on_export_failed,
+            on_progress=lambda done, total: self.export_status_var.set(f"正在导出 {done}/{total}"),
+            on_cancelled=self._on_export_cancelled)
+        self._start_export(task, f"正在导出 0/{len(jobs)}")
+    
+    def export_all_data(self):
+        """在后台将全部食材、菜品、宴席数据导出到一个Excel文件"""
+        if not self._can_start_export():
+            return
+        
+        from datetime import datetime
+        
+        filename = filedialog.asksaveasfilename(
+            initialfile=f"宴席数据_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx")],
+            title="导出全部数据"
+        )
+        if not filename:
+            return
+        if not filename.lower().endswith('.xlsx'):
+            filename += '.xlsx'
+        
+        task = self.data_manager.export_to_excel_in_background(
+            filename,
+            on_done=lambda result: self._on_export_finished(
+                lambda: messagebox.showinfo("成功", f"全部数据已导出到 {filename}")),
+            on_error=self._on_export_failed,
+            on_progress=lambda done, total: self.export_status_var.set(f"正在导出 {done}/{total} 行"),
+            on_cancelled=self._on_export_cancelled)
+        self._start_export(task, "正在导出全部数据...")
+    
+    # 后台导出任务状态
+    def _can_start_export(self) -> bool:
+        """同一时间只进行一个导出任务"""
+        if self.export_task is not None:
+            messagebox.showerror("错误", "已有导出任务正在进行，请等待完成或取消后再试")
+            return False
+        return True
+    
+    def _start_export(self, task, status: str):
+        self.export_task = task
+        self.export_status_var.set(status)
+        self.cancel_export_button.configure(state=tk.NORMAL)
+    
+    def _end_export(self):
+        self.export_task = None
+        self.export_status_var.set("")
+        self.cancel_export_button.configure(state=tk.DISABLED)
+    
+    def _on_export_finished(self, show_result):
+        self._end_export()
+        show_result()
+    
+    def _on_export_failed(self, error):
+        self._end_export()
+        messagebox.showerror("错误", f"导出失败: {error}")
+    
+    def _on_export_cancelled(self):
+        self._end_export()
+        messagebox.showinfo("提示", "导出已取消")
+    
+    def cancel_export(self):
+        """取消正在进行的导出"""
+        if self.export_task is not None:
+            self.export_task.cancel()
+            self.export_status_var.set("正在取消...")
     
     def show_data_info(self):
         """显示数据信息"""
@@ -974,7 +1062,12 @@ class DishWeightGUI:
             
             import os
             file_size = 0
-            if os.path.exists(data_path):
+            if os.path.isdir(data_path):
+                # 分片存储：统计目录中全部分片文件
+                for entry in os.scandir(data_path):
+                    if entry.is_file():
+                        file_size += entry.stat().st_size
+            elif os.path.exists(data_path):
                 file_size = os.path.getsize(data_path)
             
             info_text = f"""数据文件信息：
@@ -988,13 +1081,29 @@ class DishWeightGUI:
 • 宴席数量：{menus_count} 个
 
 数据版本：{self.data_manager.data.get('version', '1.0')}
-最后更新：{self.data_manager.data.get('last_modified', '未知')}"""
+最后更新：{self.data_manager.data.get('last_modified', '未知')}
+
+运行统计：
+{format_stats(self.data_manager.stats())}"""
             
             messagebox.showinfo("数据信息", info_text)
             
         except Exception as e:
             messagebox.showerror("错误", f"获取数据信息失败：{str(e)}")
     
+    def export_stats(self):
+        """将运行统计保存为JSON文件"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            title="导出运行统计"
+        )
+        if filename:
+            if self.data_manager.dump_stats(filename):
+                messagebox.showinfo("成功", f"运行统计已导出到: {filename}")
+            else:
+                messagebox.showerror("错误", "导出运行统计失败")
+    
     def update_data_path_display(self):
         """更新数据文件路径显示"""
         try:
@@ -1003,6 +1112,83 @@ class DishWeightGUI:
         except Exception as e:
             self.data_path_var.set(f"获取路径失败：{str(e)}")
     
+    # 数据变更事件
+    def on_data_changed(self, events):
+        """数据变更后只更新受影响的行和下拉选项，不重建整个列表"""
+        for event in events:
+            if event.action == RELOADED:
+                self.refresh_all_data()
+            elif event.kind == "ingredients":
+                self._patch_ingredient(event.action, event.entity_id)
+            elif event.kind == "dishes":
+                self._patch_dish(event.action, event.entity_id)
+            elif event.kind == "menus":
+                self._patch_menu(event.action, event.entity_id)
+    
+    def _patch_ingredient(self, action: str, ing_id: str):
+        """食材变更：更新食材表格、食材下拉选项和正在编辑的菜品配料"""
+        if action == DELETED:
+            self.ingredient_labels.remove(ing_id)
+            self.ingredients_tree.delete_row(ing_id)
+            self.dish_ingredients_tree.delete_row(ing_id)
+            return
+        
+        self.ingredient_labels.set(ing_id, self.data_manager.get_ingredients()[ing_id])
+        if action == ADDED:
+            self.ingredients_tree.insert_row(ing_id)
+        else:
+            self.ingredients_tree.update_row(ing_id)
+            self.dish_ingredients_tree.update_row(ing_id)
+    
+    def _patch_dish(self, action: str, dish_id: str):
+        """菜品变更：更新菜品列表、菜品下拉选项和正在编辑的宴席菜品"""
+        if action == DELETED:
+            self.dish_labels.remove(dish_id)
+            self.menu_dishes_tree.delete_row(dish_id)
+        else:
+            self.dish_labels.set(dish_id, self.data_manager.get_dishes()[dish_id])
+            self.menu_dishes_tree.update_row(dish_id)
+        self._patch_listbox(self.dishes_listbox, self.dish_list_ids, self.dish_list_positions, action, dish_id,
+                            self.dish_labels.label(dish_id))
+    
+    def _patch_menu(self, action: str, menu_id: str):
+        """宴席变更：更新宴席列表和宴席下拉选项"""
+        if action == DELETED:
+            self.menu_labels.remove(menu_id)
+        else:
+            self.menu_labels.set(menu_id, self.data_manager.get_menus()[menu_id])
+        self._patch_listbox(self.menus_listbox, self.menu_list_ids, self.menu_list_positions, action, menu_id,
+                            self.menu_labels.label(menu_id))
+    
+    @staticmethod
+    def _patch_listbox(listbox: tk.Listbox, list_ids: list, positions: dict, action: str, entity_id: str,
+                       label: str):
+        """按变更更新列表框中的一行
+        
+        list_ids 为列表行号到实体ID的映射，positions 为实体ID到行号的映射，两者一起更新。
+        """
+        if action == ADDED:
+            positions[entity_id] = len(list_ids)
+            list_ids.append(entity_id)
+            listbox.insert(tk.END, label)
+            return
+        
+        position = positions.get(entity_id)
+        if position is None:
+            return
+        selected = position in listbox.curselection()
+        listbox.delete(position)
+        if action == DELETED:
+            del list_ids[position]
+            del positions[entity_id]
+            # 删除行之后的各行前移一行
+            for row in range(position, len(list_ids)):
+                positions[list_ids[row]] = row
+        else:
+            listbox.insert(position, label)
+            if selected:
+                listbox.selection_set(position)
+    
     def refresh_all_data(self):
         """刷新所有数据"""
         self.refresh_ingredients()
@@ -1014,8 +1200,19 @@ class DishWeightGUI:
         """运行程序"""
         # 初始化时更新数据路径显示
         self.update_data_path_display()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.root.mainloop()
+    
+    def on_close(self):
+        """关闭窗口前取消导出，并等待数据写入完成"""
+        if self.export_task is not None:
+            self.export_task.cancel()
+        self.data_manager.close()
+        self.root.destroy()
 
 if __name__ == "__main__":
+    # 打包为exe后批量导出使用多进程，需要支持冻结环境
+    import multiprocessing
+    multiprocessing.freeze_support()
     app = DishWeightGUI()
     app.run()
\ No newline at end of file
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+
+class _MenuEntry:
+    """单个宴席的缓存结果"""
+
+    __slots__ = ("totals", "cost")
+
+    def __init__(self, totals: Dict[str, float]):
+        self.totals = totals
+        self.cost: Optional[float] = None
+
+
+class MenuResultCache:
+    """宴席食材总量和成本的LRU缓存
+
+    数据变更时由调用方精确移除受影响的记录：
+    菜品变更只移除包含该菜品的宴席（由调用方通过反向索引给出）；
+    食材单价变更只清除用到该食材的宴席成本，保留用量。
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, _MenuEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.cost_hits = 0
+        self.cost_misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_totals(self, menu_id: str) -> Optional[Dict[str, float]]:
+        """读取缓存的食材总量，未命中返回None"""
+        entry = self._entries.get(menu_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(menu_id)
+        self.hits += 1
+        return entry.totals
+
+    def put_totals(self, menu_id: str, totals: Dict[str, float]):
+        """写入食材总量，超出容量时淘汰最久未使用的记录"""
+        self._entries[menu_id] = _MenuEntry(totals)
+        self._entries.move_to_end(menu_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_cost(self, menu_id: str) -> Optional[float]:
+        """读取缓存的食材总成本，未命中返回None"""
+        entry = self._entries.get(menu_id)
+        if entry is None or entry.cost is None:
+            self.cost_misses += 1
+            return None
+        self._entries.move_to_end(menu_id)
+        self.cost_hits += 1
+        return entry.cost
+
+    def put_cost(self, menu_id: str, cost: float):
+        """写入食材总成本，只有已缓存总量的宴席才会记录"""
+        entry = self._entries.get(menu_id)
+        if entry is not None:
+            entry.cost = cost
+
+    def evict_menu(self, menu_id: str):
+        """移除一个宴席的全部缓存"""
+        self._entries.pop(menu_id, None)
+
+    def evict_menus(self, menu_ids: Iterable[str]):
+        """移除多个宴席的缓存"""
+        for menu_id in menu_ids:
+            self._entries.pop(menu_id, None)
+
+    def evict_costs_with_ingredient(self, ingredient_id: str):
+        """清除用到指定食材的宴席成本，保留食材总量"""
+        for entry in self._entries.values():
+            if entry.cost is not None and ingredient_id in entry.totals:
+                entry.cost = None
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """缓存命中统计"""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cost_hits": self.cost_hits,
+            "cost_misses": self.cost_misses,
+        }
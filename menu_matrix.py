@@ -0,0 +1,169 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class DishMatrix:
+    """菜品×食材稀疏矩阵（CSR格式）及食材单价向量
+
+    每道菜品是矩阵的一行，每种食材是一列，元素为该菜品中食材的用量。
+    宴席的食材总量即宴席份数向量与矩阵的乘积再乘以餐桌数量；多个宴席
+    一起计算时相当于一次矩阵乘法。菜品变更时只重新编码该菜品所在的行，
+    压缩存储在下一次计算前按需重新拼接。
+
+    为了与逐项累加的计算结果完全一致，餐桌数量在累加之前按
+    用量 × 份数 × 桌数 的顺序逐项相乘，并按菜品和配料的原始顺序累加。
+    """
+
+    def __init__(self):
+        self.ingredient_ids: List[str] = []        # 列号 -> 食材ID
+        self.ingredient_index: Dict[str, int] = {}  # 食材ID -> 列号
+        self.prices = np.zeros(0, dtype=np.float64)
+
+        self._rows: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # 菜品ID -> (列号, 用量)
+        self._dirty = True
+        self._dish_row: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros(0, dtype=np.float64)
+
+    @classmethod
+    def build(cls, ingredients: Dict, dishes: Dict) -> "DishMatrix":
+        """根据食材库和菜品库构建矩阵"""
+        matrix = cls()
+        if hasattr(ingredients, "prices"):
+            # 按列存储的食材库：直接按行号建立列并整体复制单价列
+            for ing_id in ingredients:
+                matrix._column(ing_id)
+            rows = np.fromiter((ingredients.position(ing_id) for ing_id in matrix.ingredient_ids),
+                               dtype=np.int64, count=len(matrix.ingredient_ids))
+            matrix.prices[:len(rows)] = np.frombuffer(ingredients.prices, dtype=np.float64)[rows]
+        else:
+            for ing_id, ing_info in ingredients.items():
+                matrix.set_price(ing_id, ing_info["price"])
+        for dish_id, dish_info in dishes.items():
+            matrix.set_dish_record(dish_id, dish_info)
+        return matrix
+
+    def has_dish(self, dish_id: str) -> bool:
+        """矩阵中是否已有该菜品的行"""
+        return dish_id in self._rows
+
+    def set_dish_record(self, dish_id: str, dish_info: Dict):
+        """以菜品记录更新一道菜品所在的行"""
+        if hasattr(dish_info, "amounts"):
+            # Dish 记录：直接使用配方数组，不生成配方字典
+            self.set_dish_arrays(dish_id, dish_info.ingredient_ids(), dish_info.amounts)
+        else:
+            self.set_dish(dish_id, dish_info["ingredients"])
+
+    def _column(self, ingredient_id: str) -> int:
+        column = self.ingredient_index.get(ingredient_id)
+        if column is None:
+            column = len(self.ingredient_ids)
+            self.ingredient_index[ingredient_id] = column
+            self.ingredient_ids.append(ingredient_id)
+            if column >= len(self.prices):
+                self.prices = np.concatenate([self.prices, np.zeros(max(column + 1, len(self.prices)))])
+        return column
+
+    def set_price(self, ingredient_id: str, price: float):
+        """更新单价向量中的一项"""
+        column = self._column(ingredient_id)
+        self.prices[column] = price
+
+    def set_dish(self, dish_id: str, ingredients: Optional[Dict[str, float]]):
+        """更新一道菜品所在的行，ingredients 为 None 表示菜品已删除"""
+        if ingredients is None:
+            self._rows.pop(dish_id, None)
+        else:
+            columns = np.fromiter((self._column(ing_id) for ing_id in ingredients),
+                                  dtype=np.int64, count=len(ingredients))
+            amounts = np.fromiter(ingredients.values(), dtype=np.float64, count=len(ingredients))
+            self._rows[dish_id] = (columns, amounts)
+        self._dirty = True
+
+    def set_dish_arrays(self, dish_id: str, ingredient_ids: List[str], amounts: Sequence[float]):
+        """以对齐的食材ID列表和用量数组更新一道菜品所在的行"""
+        columns = np.fromiter((self._column(ing_id) for ing_id in ingredient_ids),
+                              dtype=np.int64, count=len(ingredient_ids))
+        self._rows[dish_id] = (columns, np.array(amounts, dtype=np.float64))
+        self._dirty = True
+
+    def _compile(self):
+        """将各行拼接为CSR压缩存储"""
+        if not self._dirty:
+            return
+        self._dish_row = {dish_id: row for row, dish_id in enumerate(self._rows)}
+        lengths = np.fromiter((len(columns) for columns, _ in self._rows.values()),
+                              dtype=np.int64, count=len(self._rows))
+        self._indptr = np.zeros(len(self._rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self._indptr[1:])
+        if self._rows:
+            self._indices = np.concatenate([columns for columns, _ in self._rows.values()])
+            self._values = np.concatenate([amounts for _, amounts in self._rows.values()])
+        else:
+            self._indices = np.zeros(0, dtype=np.int64)
+            self._values = np.zeros(0, dtype=np.float64)
+        self._dirty = False
+
+    def _expand(self, menus: Iterable[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """展开宴席×菜品的非零项，返回每一项的 (宴席序号, 列号, 用量)"""
+        self._compile()
+        menu_numbers, rows, scales = [], [], []
+        for number, menu in enumerate(menus):
+            table_count = menu.get("table_count", 1)
+            for dish_id, quantity in menu["dishes"].items():
+                row = self._dish_row.get(dish_id)
+                if row is not None:
+                    menu_numbers.append(number)
+                    rows.append(row)
+                    scales.append((quantity, table_count))
+
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float64)
+
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self._indptr[rows]
+        lengths = self._indptr[rows + 1] - starts
+        # 每个非零项在压缩存储中的位置
+        offsets = np.arange(lengths.sum(), dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + offsets
+
+        scales = np.asarray(scales, dtype=np.float64)
+        quantities = np.repeat(scales[:, 0], lengths)
+        table_counts = np.repeat(scales[:, 1], lengths)
+        amounts = self._values[positions] * quantities * table_counts
+        return np.repeat(np.asarray(menu_numbers, dtype=np.int64), lengths), self._indices[positions], amounts
+
+    def menu_totals(self, menu: Dict) -> Dict[str, float]:
+        """计算单个宴席的食材总量"""
+        return self.batch_totals([menu])[0]
+
+    def batch_totals(self, menus: List[Dict]) -> List[Dict[str, float]]:
+        """一次计算多个宴席的食材总量，结果顺序与 menus 一致"""
+        menu_numbers, columns, amounts = self._expand(menus)
+        results: List[Dict[str, float]] = [{} for _ in menus]
+        if len(amounts) == 0:
+            return results
+
+        # 以 (宴席, 食材) 为键分组，bincount 按输入顺序逐项累加
+        keys = menu_numbers * len(self.ingredient_ids) + columns
+        unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=amounts, minlength=len(unique_keys))
+
+        # 按首次出现的顺序输出，与逐项累加的字典顺序一致
+        for group in np.argsort(first_index, kind="stable"):
+            menu_number, column = divmod(int(unique_keys[group]), len(self.ingredient_ids))
+            results[menu_number][self.ingredient_ids[column]] = float(sums[group])
+        return results
+
+    def totals_cost(self, totals: Dict[str, float]) -> float:
+        """根据单价向量计算食材总量对应的总成本"""
+        if not totals:
+            return 0.0
+        columns = np.fromiter((self.ingredient_index[ing_id] for ing_id in totals),
+                              dtype=np.int64, count=len(totals))
+        amounts = np.fromiter(totals.values(), dtype=np.float64, count=len(totals))
+        return float(amounts @ self.prices[columns])
@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class SubRecipeCycleError(ValueError):
+    """子配方之间形成循环引用"""
+
+    def __init__(self, path: List[str]):
+        super().__init__(" -> ".join(path))
+        self.path = path
+
+
+def find_cycle(dishes: Dict, dish_id: str, sub_recipes: Iterable[str]) -> Optional[List[str]]:
+    """菜品 dish_id 使用 sub_recipes 作为子配方时是否形成循环
+
+    从各子配方出发沿子配方关系深度优先查找，能回到 dish_id 时返回环上的菜品ID
+    （首尾都是 dish_id），否则返回None。只读取可达的菜品。
+    """
+    stack: List[Tuple[str, Tuple[str, ...]]] = [(sub_id, (dish_id,)) for sub_id in reversed(list(sub_recipes))]
+    visited: Set[str] = set()
+    while stack:
+        current, path = stack.pop()
+        if current == dish_id:
+            return list(path) + [dish_id]
+        if current in visited or current not in dishes:
+            continue
+        visited.add(current)
+        dish = dishes[current]
+        if dish["sub_recipes"]:
+            path = path + (current,)
+            stack.extend((sub_id, path) for sub_id in reversed(list(dish["sub_recipes"])))
+    return None
+
+
+def cycle_edges(graph: Dict[str, List[str]]) -> List[Tuple[str, str]]:
+    """子配方关系图 {菜品ID: [子配方菜品ID]} 中构成循环的引用 (菜品ID, 子配方菜品ID)
+
+    深度优先遍历全部菜品，指回当前路径上菜品的引用即构成循环；去掉返回的这些引用后
+    不再有循环。不在图中的菜品（没有子配方或不存在）视为终点。
+    """
+    state: Dict[str, bool] = {}   # 菜品ID -> 是否仍在当前路径上
+    edges: List[Tuple[str, str]] = []
+    for root in graph:
+        if root in state:
+            continue
+        state[root] = True
+        stack = [(root, iter(graph[root]))]
+        while stack:
+            dish_id, sub_ids = stack[-1]
+            for sub_id in sub_ids:
+                on_path = state.get(sub_id)
+                if on_path:
+                    edges.append((dish_id, sub_id))
+                elif on_path is None and sub_id in graph:
+                    state[sub_id] = True
+                    stack.append((sub_id, iter(graph[sub_id])))
+                    break
+            else:
+                state[dish_id] = False
+                stack.pop()
+    return edges
+
+
+class FlatRecipeCache:
+    """带子配方的菜品展开为纯食材配方（{食材ID: 用量}）后的缓存
+
+    展开结果为菜品自身的配料加上各子配方的展开结果 × 份数，按需递归计算并缓存，
+    多个菜品共用的子配方只展开一次。没有子配方的菜品直接使用自身配方，不进入缓存。
+
+    每条缓存记录它直接或间接用到的子配方；某个菜品变更时沿依赖关系只清除
+    用到它的菜品的缓存（invalidate 返回这些菜品，供调用方更新矩阵和宴席缓存）。
+    """
+
+    def __init__(self):
+        self._flat: Dict[str, Dict[str, float]] = {}
+        self._depends_on: Dict[str, Set[str]] = {}   # 已缓存的菜品 -> 直接或间接用到的子配方
+        self._dependents: Dict[str, Set[str]] = {}   # 子配方 -> 直接或间接用到它、已缓存的菜品
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._flat)
+
+    def clear(self):
+        self._flat.clear()
+        self._depends_on.clear()
+        self._dependents.clear()
+
+    def flatten(self, dishes: Dict, dish_id: str) -> Dict[str, float]:
+        """菜品展开后的配方（返回缓存的字典，调用方不应修改）
+
+        数据中存在循环引用时抛出 SubRecipeCycleError。
+        """
+        return self._expand(dishes, dish_id, ())
+
+    def _expand(self, dishes: Dict, dish_id: str, path: Tuple[str, ...]) -> Dict[str, float]:
+        flat = self._flat.get(dish_id)
+        if flat is not None:
+            self.hits += 1
+            return flat
+        dish = dishes[dish_id]
+        sub_recipes = dish["sub_recipes"]
+        if not sub_recipes:
+            return dish["ingredients"]
+        if dish_id in path:
+            raise SubRecipeCycleError(list(path[path.index(dish_id):]) + [dish_id])
+
+        self.misses += 1
+        flat = dish["ingredients"]
+        depends_on = set(sub_recipes)
+        path = path + (dish_id,)
+        for sub_id, portions in sub_recipes.items():
+            # 不存在的子配方（如其他工作站刚删除）按空配方处理，之后新增时同样会清除本缓存
+            if sub_id not in dishes:
+                continue
+            for ing_id, amount in self._expand(dishes, sub_id, path).items():
+                flat[ing_id] = flat.get(ing_id, 0.0) + amount * portions
+            depends_on.update(self._depends_on.get(sub_id, ()))
+
+        self._flat[dish_id] = flat
+        self._depends_on[dish_id] = depends_on
+        for sub_id in depends_on:
+            self._dependents.setdefault(sub_id, set()).add(dish_id)
+        return flat
+
+    def invalidate(self, dish_id: str) -> Set[str]:
+        """菜品变更（或删除）后清除它和直接或间接用到它的菜品的缓存
+
+        返回除 dish_id 以外缓存被清除的菜品，它们的展开结果随之改变。
+        """
+        affected = self._dependents.pop(dish_id, set())
+        for owner in affected | {dish_id}:
+            if self._flat.pop(owner, None) is None:
+                continue
+            for sub_id in self._depends_on.pop(owner):
+                dependents = self._dependents.get(sub_id)
+                if dependents is not None:
+                    dependents.discard(owner)
+                    if not dependents:
+                        del self._dependents[sub_id]
+        return affected
+
+    def stats(self) -> Dict:
+        return {"size": len(self._flat), "hits": self.hits, "misses": self.misses}
@@ -15,7 +15,10 @@ includes = [
     "datetime",
     "os",
     "sys",
-    "tempfile"
+    "tempfile",
+    # 延迟导入的模块
+    "menu_matrix",
+    "excel_export"
 ]
 
 # 需要包含的文件
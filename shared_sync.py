@@ -0,0 +1,207 @@
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 变更记录中的一项: (操作 "set"/"delete", 实体类型, 实体ID)
+FeedChange = Tuple[str, str, str]
+
+
+class LockTimeout(TimeoutError):
+    """在限定时间内没有取得文件锁"""
+
+
+class FileLock:
+    """跨进程文件锁
+
+    锁住与数据文件同目录的锁文件（POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking），
+    同一进程内可重入，不同线程之间互斥。
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0, poll_interval: float = 0.05):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise LockTimeout(f"等待文件锁超时: {self.path}")
+        if self._depth:
+            self._depth += 1
+            return
+        try:
+            self._file = open(self.path, 'a+b')
+            deadline = time.monotonic() + self.timeout
+            while not self._try_lock():
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"数据文件正被其他工作站写入，等待超时: {self.path}")
+                time.sleep(self.poll_interval)
+        except BaseException:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+        self._depth = 1
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class SharedDataSync:
+    """多个工作站（进程）共享同一数据文件时的协调
+
+    数据文件旁边有三个辅助文件：
+        <数据文件>.lock     写数据前必须持有的文件锁
+        <数据文件>.sync     当前修订号和各类实体的ID计数器（很小，供其他工作站快速检查）
+        <数据文件>.changes  变更记录，每次保存追加一行：修订号和本次变更的实体
+
+    每次保存都在锁内进行，修订号加一（乐观版本号）；其他工作站发现修订号变化后，
+    从变更记录中得知哪些实体被修改，只更新这些实体。变更记录只保留最近的部分，
+    落后太多时需要完整重新加载。
+    """
+
+    # 变更记录保留的条目数（超过两倍时截断）
+    FEED_LIMIT = 1000
+
+    def __init__(self, data_file: str, lock_timeout: float = 10.0, writer: Optional[str] = None):
+        self.lock = FileLock(data_file + ".lock", lock_timeout)
+        self.state_file = data_file + ".sync"
+        self.feed_file = data_file + ".changes"
+        self.writer = writer or f"{socket.gethostname()}:{os.getpid()}"
+        # 本进程内存中的数据对应的修订号
+        self.revision = 0
+        self._state_stamp: Optional[Tuple[int, int]] = None
+
+    def read_state(self) -> Dict:
+        """当前修订号和ID计数器（文件不存在时修订号为0）"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            state = {}
+        state.setdefault("revision", 0)
+        state.setdefault("next_ids", {})
+        return state
+
+    def write_state(self, state: Dict):
+        """原子写出修订号和ID计数器（需持有锁）"""
+        temp_file = self.state_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_file, self.state_file)
+
+    def has_external_changes(self) -> bool:
+        """其他工作站是否保存过新的修订（先比较文件的修改时间和大小，未变化时不读取文件）"""
+        try:
+            stat = os.stat(self.state_file)
+        except OSError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._state_stamp:
+            return False
+        self._state_stamp = stamp
+        return self.read_state()["revision"] > self.revision
+
+    def allocate_id(self, kind: str, local_next: int) -> int:
+        """在锁内分配新的实体ID，保证各工作站分配的ID不重复"""
+        with self.lock:
+            state = self.read_state()
+            entity_id = max(local_next, state["next_ids"].get(kind, 1))
+            state["next_ids"][kind] = entity_id + 1
+            self.write_state(state)
+        return entity_id
+
+    def changes_since(self, revision: int, current: int) -> Optional[List[FeedChange]]:
+        """修订号 revision 之后到 current 为止变更的实体（按顺序，去重）
+
+        变更记录已被截断、无法覆盖这段修订时返回None，需要完整重新加载。
+        """
+        entries = {}
+        try:
+            with open(self.feed_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if revision < entry["revision"] <= current:
+                        entries[entry["revision"]] = entry
+        except OSError:
+            pass
+        if any(number not in entries for number in range(revision + 1, current + 1)):
+            return None
+        changes: Dict[Tuple[str, str], str] = {}
+        for number in range(revision + 1, current + 1):
+            for op, kind, entity_id in entries[number]["changes"]:
+                changes.pop((kind, entity_id), None)
+                changes[(kind, entity_id)] = op
+        return [(op, kind, entity_id) for (kind, entity_id), op in changes.items()]
+
+    def append_changes(self, revision: int, changes: List[FeedChange]):
+        """追加一次保存的变更记录（需持有锁），记录过长时只保留最近的 FEED_LIMIT 条"""
+        entry = {"revision": revision, "writer": self.writer, "changes": [list(change) for change in changes]}
+        with open(self.feed_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if revision % self.FEED_LIMIT == 0:
+            self._trim_feed()
+
+    def _trim_feed(self):
+        with open(self.feed_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        if len(lines) <= self.FEED_LIMIT * 2:
+            return
+        temp_file = self.feed_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.writelines(lines[-self.FEED_LIMIT:])
+        os.replace(temp_file, self.feed_file)
+
+    def commit(self, revision: int, changes: List[FeedChange], next_ids: Dict[str, int]):
+        """数据文件写出后记录新的修订（需持有锁）"""
+        self.append_changes(revision, changes)
+        state = self.read_state()
+        state["revision"] = revision
+        for kind, value in next_ids.items():
+            state["next_ids"][kind] = max(state["next_ids"].get(kind, 1), value)
+        self.write_state(state)
+        self.revision = revision
@@ -9,12 +9,18 @@ import os
 # 添加当前目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# 尽早导入启动计时模块，作为启动耗时统计的起点
+from startup_timer import StartupTimer
+
 try:
     from main import DishWeightGUI
     
     if __name__ == "__main__":
+        # 打包为exe后批量导出使用多进程，需要支持冻结环境
+        import multiprocessing
+        multiprocessing.freeze_support()
         print("正在启动宴席菜品配料统计系统...")
-        app = DishWeightGUI()
+        app = DishWeightGUI(StartupTimer())
         app.run()
         
 except ImportError as e:
@@ -0,0 +1,26 @@
+import time
+from typing import List, Tuple
+
+# 本模块应尽早导入，导入时刻作为程序启动时间的基准
+PROCESS_START = time.perf_counter()
+
+
+class StartupTimer:
+    """记录程序启动各阶段的耗时"""
+
+    def __init__(self, start: float = PROCESS_START):
+        self.start = start
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, stage: str):
+        """记录一个阶段完成的时间点"""
+        self.marks.append((stage, time.perf_counter()))
+
+    def report(self) -> str:
+        """生成启动耗时报告：各阶段耗时及累计耗时"""
+        lines = ["启动耗时统计："]
+        previous = self.start
+        for stage, moment in self.marks:
+            lines.append(f"  {stage}: {(moment - previous) * 1000:.1f} ms（累计 {(moment - self.start) * 1000:.1f} ms）")
+            previous = moment
+        return "\n".join(lines)
@@ -0,0 +1,808 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from binary_snapshot import is_binary_snapshot, load_data_file, write_binary_snapshot
+from lazy_store import LazyCatalog
+
+# 单条变更记录: (操作, 实体类型, 实体ID, 新值)
+# 操作为 "set" 或 "delete"，实体类型为 "ingredients" / "dishes" / "menus"
+Change = Tuple[str, str, str, Optional[Dict]]
+
+ENTITY_KINDS = ("ingredients", "dishes", "menus")
+
+
+def apply_change(data: Dict, change: Change):
+    """将一条变更应用到内存数据上"""
+    op, kind, entity_id, value = change
+    if op == "set":
+        data[kind][entity_id] = value
+    elif op == "delete":
+        data[kind].pop(entity_id, None)
+
+
+def snapshot_data(data: Dict) -> Dict:
+    """生成数据快照（浅拷贝各实体表，实体记录本身只会被整体替换，不会原地修改）"""
+    return {key: (value.copy() if hasattr(value, "copy") else value) for key, value in data.items()}
+
+
+class SnapshotCopy:
+    """后台写出使用的数据副本
+
+    snapshot_data 复制全部实体表，开销与数据总量成正比，不适合每次编辑都在调用线程中执行。
+    这里只在第一次写出、完整保存或重新加载数据后生成一次完整快照，之后每次编辑
+    只记录变更（实体记录只会被整体替换，可以直接共享）和元数据，由写出线程在写出前
+    应用到自己的副本上。连续编辑时多次变更合并到同一次写出中。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._copy: Optional[Dict] = None   # 写出线程的数据副本，只在写出线程中访问
+        self._base: Optional[Dict] = None   # 等待写出线程接收的完整快照
+        self._changes: List[Change] = []    # 尚未应用到副本的变更
+        self._meta: Dict = {}               # 最新的元数据（版本、修改时间、下一个ID等）
+        self._has_base = False              # 调用线程一侧：当前数据是否已生成过完整快照
+
+    def reset(self, data: Dict):
+        """生成完整快照，取代副本和尚未应用的变更（调用线程）"""
+        base = snapshot_data(data)
+        with self._lock:
+            self._base = base
+            self._changes = []
+            self._meta = {}
+        self._has_base = True
+
+    def invalidate(self):
+        """内存数据整体替换（重新加载）后调用，下一次写出重新生成完整快照（调用线程）"""
+        self._has_base = False
+
+    def add(self, changes: List[Change], data: Dict):
+        """记录一组已应用到 data 的变更（调用线程），开销与变更的实体数成正比"""
+        if not self._has_base:
+            self.reset(data)
+            return
+        meta = {key: (value.copy() if hasattr(value, "copy") else value)
+                for key, value in data.items() if key not in ENTITY_KINDS}
+        with self._lock:
+            self._changes.extend(changes)
+            self._meta = meta
+
+    def take(self) -> Dict:
+        """应用尚未处理的变更，返回最新的数据副本（写出线程）"""
+        with self._lock:
+            base, self._base = self._base, None
+            changes, self._changes = self._changes, []
+            meta, self._meta = self._meta, {}
+        if base is not None:
+            self._copy = base
+        for change in changes:
+            apply_change(self._copy, change)
+        self._copy.update(meta)
+        return self._copy
+
+
+# 写出快照时实体表每次转换并编码的记录数
+SNAPSHOT_CHUNK_SIZE = 2000
+
+
+def _write_json(data: Dict, f):
+    """写出与 json.dump(data, f, ensure_ascii=False, indent=2) 相同的内容
+
+    实体表中的记录对象（Dish、Menu、按列存储的食材库等）分块转换为普通字典后编码，
+    既不需要一次性生成整份数据的字典副本，也避免了逐个记录经 default 转换的开销。
+    """
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=2, default=_json_default)
+    f.write("{")
+    for number, (key, value) in enumerate(data.items()):
+        f.write(",\n  " if number else "\n  ")
+        f.write(encoder.encode(key))
+        f.write(": ")
+        if key in ENTITY_KINDS and len(value):
+            f.write("{")
+            items = iter(value.items())
+            first = True
+            while True:
+                chunk = {entity_id: record.to_dict() if hasattr(record, "to_dict") else record
+                         for entity_id, record in islice(items, SNAPSHOT_CHUNK_SIZE)}
+                if not chunk:
+                    break
+                # 去掉外层花括号，缩进增加一级
+                text = encoder.encode(chunk)[1:-2].replace("\n", "\n  ")
+                f.write(text if first else "," + text)
+                first = False
+            f.write("\n  }")
+        else:
+            f.write(encoder.encode(value).replace("\n", "\n  "))
+    f.write("\n}" if data else "}")
+
+
+def _json_default(value):
+    """序列化按列存储的实体表等映射对象"""
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def bump_next_id(data: Dict, kind: str, entity_id: str):
+    """确保ID计数器大于出现过的数字ID，保证ID不会被重复分配"""
+    try:
+        candidate = int(entity_id) + 1
+    except (TypeError, ValueError):
+        return
+    next_ids = data.setdefault("next_ids", {})
+    if next_ids.get(kind, 1) < candidate:
+        next_ids[kind] = candidate
+
+
+class JsonFileStorage:
+    """单文件JSON存储：每次变更都完整重写数据文件"""
+
+    # record() 是否总是写出完整数据（新的写入可以取代尚未执行的旧写入）
+    full_snapshot = True
+
+    # 每次写文件后以写入的字节数调用（用于运行统计），None表示不统计
+    on_write: Optional[Callable[[int], None]] = None
+
+    def __init__(self, data_file: str):
+        self.data_file = data_file
+
+    @property
+    def path(self) -> str:
+        """数据实际存放的路径"""
+        return self.data_file
+
+    def load(self) -> Optional[Dict]:
+        """读取数据文件（按文件开头自动识别JSON或二进制快照），文件不存在时返回None"""
+        if not os.path.exists(self.data_file):
+            return None
+        return load_data_file(self.data_file)
+
+    def save(self, data: Dict):
+        """完整保存数据到文件"""
+        self._write_snapshot(data)
+
+    def record(self, changes: List[Change], data: Dict):
+        """持久化一组变更，单文件模式下直接重写整个文件"""
+        self.save(data)
+
+    def close(self):
+        """释放存储占用的资源"""
+        pass
+
+    def _write_snapshot(self, data: Dict):
+        """保存数据到临时文件，然后重命名（原子操作）"""
+        temp_file = self.data_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                _write_json(data, f)
+            if self.on_write is not None:
+                self.on_write(os.path.getsize(temp_file))
+            os.replace(temp_file, self.data_file)
+        except Exception:
+            # 如果保存失败，尝试清理临时文件
+            if os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+            raise
+
+
+class BinaryFileStorage(JsonFileStorage):
+    """二进制快照存储：每次变更完整重写二进制数据文件（格式见 binary_snapshot）
+
+    加载时按文件开头识别格式；二进制文件不存在而 json_file 存在时从JSON文件加载，
+    之后的保存写出二进制文件，原JSON文件保持不变。
+
+    lazy=True 时启动只读入食材库和菜品/宴席的ID与名称，菜品和宴席在首次访问时
+    从映射的文件中读取（见 lazy_store），最多缓存 cache_size 条。
+    """
+
+    def __init__(self, data_file: str, json_file: Optional[str] = None, lazy: bool = False,
+                 cache_size: int = 1024):
+        super().__init__(data_file)
+        self.json_file = json_file
+        self.lazy = lazy
+        self.cache_size = cache_size
+        self.catalog: Optional[LazyCatalog] = None
+
+    def load(self) -> Optional[Dict]:
+        self.close()
+        if os.path.exists(self.data_file):
+            if self.lazy and is_binary_snapshot(self.data_file):
+                self.catalog = LazyCatalog(self.data_file, self.cache_size)
+                return self.catalog.load()
+            return load_data_file(self.data_file)
+        if self.json_file and os.path.exists(self.json_file):
+            print(f"二进制数据文件不存在，从 {self.json_file} 加载")
+            return load_data_file(self.json_file)
+        return None
+
+    def close(self):
+        if self.catalog is not None:
+            self.catalog.close()
+            self.catalog = None
+
+    def _write_snapshot(self, data: Dict):
+        temp_file = self.data_file + ".tmp"
+        try:
+            with open(temp_file, 'wb') as f:
+                size = write_binary_snapshot(data, f)
+            if self.on_write is not None:
+                self.on_write(size)
+            self._replace(temp_file, data)
+        except Exception:
+            if os.path.exists(temp_file):
+                try:
+                    os.remove(temp_file)
+                except OSError:
+                    pass
+            raise
+
+    def _replace(self, temp_file: str, data: Dict):
+        catalog = self.catalog
+        if catalog is None:
+            os.replace(temp_file, self.data_file)
+            return
+        # 延迟加载时数据文件仍被映射：先释放映射再替换，然后改为读取新文件
+        catalog.release()
+        try:
+            os.replace(temp_file, self.data_file)
+        except Exception:
+            catalog.reopen(rebase=False)
+            raise
+        # 只有写出的正是延迟加载的各表时，新文件才包含它们的当前内容
+        catalog.reopen(rebase=all(data.get(kind) is table for kind, table in catalog.tables.items()))
+
+
+class JournalStorage(JsonFileStorage):
+    """日志式存储：每次变更只向日志文件追加一条记录，后台定期将日志压缩为快照
+
+    数据文件 dish_data.json 仍是完整快照（格式不变），其中的 journal_seq
+    记录快照已包含的最后一条日志序号；加载时先读快照，再重放序号更大的日志。
+    """
+
+    full_snapshot = False
+
+    # 日志文件超过该大小时触发后台压缩
+    compact_threshold = 4 * 1024 * 1024
+
+    def __init__(self, data_file: str):
+        super().__init__(data_file)
+        self.journal_file = data_file + ".journal"
+        self._lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._compact_thread: Optional[threading.Thread] = None
+
+    def load(self) -> Optional[Dict]:
+        """读取快照并重放日志"""
+        data = super().load()
+        snapshot_seq = data.get("journal_seq", 0) if isinstance(data, dict) else 0
+        self._seq = snapshot_seq
+
+        records = self._read_journal()
+        if not records:
+            return data
+
+        if not isinstance(data, dict):
+            data = {}
+        for kind in ENTITY_KINDS:
+            data.setdefault(kind, {})
+
+        replayed = 0
+        for record in records:
+            if record["seq"] <= snapshot_seq:
+                continue
+            apply_change(data, (record["op"], record["kind"], record["id"], record.get("value")))
+            # 已删除实体的ID也不能再分配
+            bump_next_id(data, record["kind"], record["id"])
+            data["last_modified"] = record.get("time", data.get("last_modified"))
+            self._seq = record["seq"]
+            replayed += 1
+
+        data["journal_seq"] = self._seq
+        if replayed:
+            print(f"已重放 {replayed} 条变更日志")
+        return data
+
+    def _read_journal(self) -> List[Dict]:
+        """读取日志文件，忽略写入中断导致的不完整行"""
+        if not os.path.exists(self.journal_file):
+            return []
+        records = []
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print("变更日志末尾存在不完整记录，已忽略")
+                    break
+        return records
+
+    def record(self, changes: List[Change], data: Dict):
+        """向日志追加变更记录"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            lines = []
+            for op, kind, entity_id, value in changes:
+                self._seq += 1
+                entry = {"seq": self._seq, "op": op, "kind": kind, "id": entity_id, "time": now}
+                if op == "set":
+                    entry["value"] = value
+                lines.append(json.dumps(entry, ensure_ascii=False, default=_json_default))
+            text = "\n".join(lines) + "\n"
+            self._journal.write(text)
+            self._journal.flush()
+            if self.on_write is not None:
+                self.on_write(len(text.encode('utf-8')))
+            data["journal_seq"] = self._seq
+            journal_size = self._journal.tell()
+
+        if journal_size >= self.compact_threshold:
+            self.compact_in_background(data)
+
+    def save(self, data: Dict):
+        """立即写出完整快照并清空已包含的日志"""
+        self.wait_for_compaction()
+        with self._lock:
+            data["journal_seq"] = self._seq
+        self._compact(snapshot_data(data))
+
+    def compact_in_background(self, data: Dict):
+        """在后台线程中将日志压缩为快照"""
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return
+        # 快照在调用线程中生成，后台线程只负责序列化和写文件
+        with self._lock:
+            data["journal_seq"] = self._seq
+        snapshot = snapshot_data(data)
+        self._compact_thread = threading.Thread(target=self._compact_safely, args=(snapshot,), daemon=True)
+        self._compact_thread.start()
+
+    def wait_for_compaction(self):
+        """等待正在进行的后台压缩完成"""
+        if self._compact_thread is not None:
+            self._compact_thread.join()
+            self._compact_thread = None
+
+    def _compact_safely(self, snapshot: Dict):
+        try:
+            self._compact(snapshot)
+        except Exception as e:
+            print(f"变更日志压缩失败: {e}")
+
+    def _compact(self, snapshot: Dict):
+        """写出快照，然后从日志中移除快照已包含的记录"""
+        self._write_snapshot(snapshot)
+        snapshot_seq = snapshot.get("journal_seq", 0)
+
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            remaining = [r for r in self._read_journal() if r["seq"] > snapshot_seq]
+            if not remaining:
+                if os.path.exists(self.journal_file):
+                    os.remove(self.journal_file)
+                return
+            temp_file = self.journal_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                for r in remaining:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            os.replace(temp_file, self.journal_file)
+
+    def close(self):
+        """等待后台压缩并关闭日志文件"""
+        self.wait_for_compaction()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+def shard_bucket(entity_id: str, bucket_size: int) -> str:
+    """实体所在的分片：数字ID按 bucket_size 划分区间，bucket_size 为0时每类实体一个分片"""
+    if not bucket_size:
+        return "all"
+    try:
+        return str(int(entity_id) // bucket_size)
+    except (TypeError, ValueError):
+        return "other"
+
+
+def _bucket_order(bucket: str):
+    return (not bucket.isdigit(), int(bucket) if bucket.isdigit() else 0, bucket)
+
+
+class ShardedStorage:
+    """分片存储：每类实体按ID区间分成多个JSON文件，变更时只重写涉及的分片
+
+    目录中的 manifest.json 记录非实体字段和当前使用的各分片文件名。保存时先以新的
+    文件名写出变更的分片，再原子替换 manifest.json，最后删除不再使用的旧分片；
+    替换清单之前中断时旧清单和旧分片仍然完整，多余的新文件在下次加载时清理。
+
+    目录中没有清单而 json_file（JSON或二进制快照）存在时，加载时自动迁移为分片。
+    """
+
+    MANIFEST = "manifest.json"
+    FORMAT_VERSION = 1
+
+    full_snapshot = False
+
+    # 每次保存后以写入的字节数调用（用于运行统计），None表示不统计
+    on_write: Optional[Callable[[int], None]] = None
+
+    def __init__(self, directory: str, json_file: Optional[str] = None, bucket_size: int = 1000):
+        self.directory = directory
+        self.json_file = json_file
+        self.bucket_size = bucket_size
+        self.manifest_file = os.path.join(directory, self.MANIFEST)
+        self._generation = 0
+        # {实体类型: {分片: 文件名}}
+        self._files: Dict[str, Dict[str, str]] = {kind: {} for kind in ENTITY_KINDS}
+        # {实体类型: {分片: {实体ID: None}}}，按加入顺序记录每个分片中的实体
+        self._members: Dict[str, Dict[str, Dict[str, None]]] = {kind: {} for kind in ENTITY_KINDS}
+        # 尚未成功写出的分片 (实体类型, 分片)，保存失败时留到下次一并写出
+        self._dirty: Set[Tuple[str, str]] = set()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        """数据实际存放的路径（分片目录）"""
+        return self.directory
+
+    def load(self) -> Optional[Dict]:
+        """读取清单和全部分片，没有清单时尝试从单文件数据迁移"""
+        if not os.path.exists(self.manifest_file):
+            if self.json_file and os.path.exists(self.json_file):
+                return self.migrate_from_file(self.json_file)
+            return None
+
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("format") != self.FORMAT_VERSION:
+            raise ValueError(f"不支持的分片清单版本: {manifest.get('format')}")
+        self._generation = manifest["generation"]
+        self.bucket_size = manifest.get("bucket_size", self.bucket_size)
+        data = dict(manifest["meta"])
+        for kind in ENTITY_KINDS:
+            files = manifest["shards"].get(kind, {})
+            self._files[kind] = {}
+            self._members[kind] = {}
+            entities = data[kind] = {}
+            for bucket in sorted(files, key=_bucket_order):
+                with open(os.path.join(self.directory, files[bucket]), 'r', encoding='utf-8') as f:
+                    shard = json.load(f)[kind]
+                entities.update(shard)
+                self._files[kind][bucket] = files[bucket]
+                self._members[kind][bucket] = dict.fromkeys(shard)
+        self._remove_unreferenced()
+        return data
+
+    def migrate_from_file(self, filename: str) -> Dict:
+        """将单文件数据（JSON或二进制快照）写为分片"""
+        print(f"正在从 {filename} 迁移数据到分片目录...")
+        data = load_data_file(filename)
+        for kind in ENTITY_KINDS:
+            data.setdefault(kind, {})
+        data.setdefault("version", "1.0")
+        self.save(data)
+        print("数据迁移完成")
+        return data
+
+    def save(self, data: Dict):
+        """重写全部分片"""
+        for kind in ENTITY_KINDS:
+            members: Dict[str, Dict[str, None]] = {}
+            for entity_id in data.get(kind, {}):
+                members.setdefault(shard_bucket(entity_id, self.bucket_size), {})[entity_id] = None
+            self._members[kind] = members
+        self._dirty.update((kind, bucket) for kind in ENTITY_KINDS
+                           for bucket in set(self._members[kind]) | set(self._files[kind]))
+        self._commit(data)
+
+    def record(self, changes: List[Change], data: Dict):
+        """只重写变更涉及的分片，清单总是重写（其中含修改时间和ID计数器）"""
+        for op, kind, entity_id, _ in changes:
+            bucket = shard_bucket(entity_id, self.bucket_size)
+            members = self._members[kind].setdefault(bucket, {})
+            if op == "set":
+                members[entity_id] = None
+            else:
+                members.pop(entity_id, None)
+            self._dirty.add((kind, bucket))
+        self._commit(data)
+
+    def close(self):
+        """释放存储占用的资源"""
+        pass
+
+    def _commit(self, data: Dict):
+        """写出变更的分片，然后替换清单"""
+        generation = self._generation + 1
+        files = {kind: dict(buckets) for kind, buckets in self._files.items()}
+        written = []
+        size = 0
+        try:
+            for kind, bucket in sorted(self._dirty, key=lambda item: (item[0], _bucket_order(item[1]))):
+                members = self._members[kind].get(bucket)
+                if not members:
+                    self._members[kind].pop(bucket, None)
+                    files[kind].pop(bucket, None)
+                    continue
+                table = data[kind]
+                filename = f"{kind}-{bucket}.{generation}.json"
+                path = os.path.join(self.directory, filename)
+                written.append(path)
+                with open(path, 'w', encoding='utf-8') as f:
+                    _write_json({kind: {entity_id: table[entity_id] for entity_id in members}}, f)
+                size += os.path.getsize(path)
+                files[kind][bucket] = filename
+
+            manifest = {
+                "format": self.FORMAT_VERSION,
+                "generation": generation,
+                "bucket_size": self.bucket_size,
+                "meta": {key: value for key, value in data.items() if key not in ENTITY_KINDS},
+                "shards": files,
+            }
+            temp_file = self.manifest_file + ".tmp"
+            written.append(temp_file)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            size += os.path.getsize(temp_file)
+            os.replace(temp_file, self.manifest_file)
+        except Exception:
+            # 清单未替换，旧的分片仍然有效，只需清理本次写出的文件
+            for path in written:
+                if os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            raise
+
+        previous = {filename for buckets in self._files.values() for filename in buckets.values()}
+        current = {filename for buckets in files.values() for filename in buckets.values()}
+        self._generation = generation
+        self._files = files
+        self._dirty.clear()
+        for filename in previous - current:
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError:
+                pass
+        if self.on_write is not None:
+            self.on_write(size)
+
+    def _remove_unreferenced(self):
+        """删除清单中没有的分片文件（之前保存中断时留下的）"""
+        referenced = {filename for buckets in self._files.values() for filename in buckets.values()}
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json") and filename != self.MANIFEST and filename not in referenced:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+
+class SqliteStorage:
+    """SQLite存储：实体按表存放，单条变更只更新对应的行
+
+    首次使用时如果数据库为空而同名JSON数据文件存在，会自动迁移JSON中的数据。
+    """
+
+    # 数值列不声明类型，保证整数/小数原样读回，与JSON文件中的数值一致
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS ingredients (id TEXT PRIMARY KEY, name TEXT NOT NULL, unit TEXT NOT NULL, price);
+    CREATE TABLE IF NOT EXISTS dishes (id TEXT PRIMARY KEY, name TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS dish_ingredients (
+        dish_id TEXT NOT NULL, ingredient_id TEXT NOT NULL, amount,
+        PRIMARY KEY (dish_id, ingredient_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_dish_ingredients_ingredient ON dish_ingredients (ingredient_id);
+    CREATE TABLE IF NOT EXISTS dish_sub_recipes (
+        dish_id TEXT NOT NULL, sub_dish_id TEXT NOT NULL, amount,
+        PRIMARY KEY (dish_id, sub_dish_id)
+    );
+    CREATE TABLE IF NOT EXISTS menus (id TEXT PRIMARY KEY, name TEXT NOT NULL, table_count);
+    CREATE TABLE IF NOT EXISTS menu_dishes (
+        menu_id TEXT NOT NULL, dish_id TEXT NOT NULL, quantity,
+        PRIMARY KEY (menu_id, dish_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_menu_dishes_dish ON menu_dishes (dish_id);
+    """
+
+    full_snapshot = False
+
+    # 数据库写入的字节数无法准确得到，不报告写入统计
+    on_write: Optional[Callable[[int], None]] = None
+
+    def __init__(self, db_file: str, json_file: Optional[str] = None):
+        self.db_file = db_file
+        self.json_file = json_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.executescript(self.SCHEMA)
+
+    @property
+    def path(self) -> str:
+        """数据实际存放的路径（数据库文件）"""
+        return self.db_file
+
+    def load(self) -> Optional[Dict]:
+        """从数据库读取全部数据，数据库为空时尝试从JSON文件迁移"""
+        if self._is_empty():
+            if self.json_file and os.path.exists(self.json_file):
+                self.migrate_from_json(self.json_file)
+            else:
+                return None
+
+        with self._lock:
+            conn = self._conn
+            data = {key: value for key, value in conn.execute("SELECT key, value FROM meta")}
+            if "next_ids" in data:
+                data["next_ids"] = json.loads(data["next_ids"])
+            data["ingredients"] = {
+                ing_id: {"name": name, "unit": unit, "price": price}
+                for ing_id, name, unit, price in conn.execute(
+                    "SELECT id, name, unit, price FROM ingredients ORDER BY rowid")
+            }
+            dishes = {
+                dish_id: {"name": name, "ingredients": {}}
+                for dish_id, name in conn.execute("SELECT id, name FROM dishes ORDER BY rowid")
+            }
+            for dish_id, ing_id, amount in conn.execute(
+                    "SELECT dish_id, ingredient_id, amount FROM dish_ingredients ORDER BY rowid"):
+                if dish_id in dishes:
+                    dishes[dish_id]["ingredients"][ing_id] = amount
+            for dish_id, sub_dish_id, amount in conn.execute(
+                    "SELECT dish_id, sub_dish_id, amount FROM dish_sub_recipes ORDER BY rowid"):
+                if dish_id in dishes:
+                    dishes[dish_id].setdefault("sub_recipes", {})[sub_dish_id] = amount
+            data["dishes"] = dishes
+            menus = {
+                menu_id: {"name": name, "dishes": {}, "table_count": table_count}
+                for menu_id, name, table_count in conn.execute(
+                    "SELECT id, name, table_count FROM menus ORDER BY rowid")
+            }
+            for menu_id, dish_id, quantity in conn.execute(
+                    "SELECT menu_id, dish_id, quantity FROM menu_dishes ORDER BY rowid"):
+                if menu_id in menus:
+                    menus[menu_id]["dishes"][dish_id] = quantity
+            data["menus"] = menus
+        return data
+
+    def _is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0
+
+    def migrate_from_json(self, json_file: str):
+        """将JSON数据文件中的全部数据导入数据库"""
+        print(f"正在从 {json_file} 迁移数据到SQLite...")
+        data = load_data_file(json_file)
+        for kind in ENTITY_KINDS:
+            data.setdefault(kind, {})
+        data.setdefault("version", "1.0")
+        self.save(data)
+        print("数据迁移完成")
+
+    def save(self, data: Dict):
+        """清空并重写所有表"""
+        with self._lock, self._conn as conn:
+            for table in ("meta", "ingredients", "dishes", "dish_ingredients", "dish_sub_recipes", "menus",
+                          "menu_dishes"):
+                conn.execute(f"DELETE FROM {table}")
+            self._write_meta(conn, data)
+            for kind in ENTITY_KINDS:
+                for entity_id, value in data.get(kind, {}).items():
+                    self._write_entity(conn, kind, entity_id, value)
+
+    def record(self, changes: List[Change], data: Dict):
+        """在一个事务中按行更新变更的实体"""
+        with self._lock, self._conn as conn:
+            for op, kind, entity_id, value in changes:
+                if op == "set":
+                    self._write_entity(conn, kind, entity_id, value)
+                else:
+                    self._delete_entity(conn, kind, entity_id)
+            self._write_meta(conn, data)
+
+    @staticmethod
+    def _write_meta(conn, data: Dict):
+        for key, value in data.items():
+            if key in ENTITY_KINDS:
+                continue
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            if isinstance(value, (str, int, float)):
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _write_entity(conn, kind: str, entity_id: str, value: Dict):
+        # 使用UPSERT而不是INSERT OR REPLACE，保留原有rowid从而保持实体顺序
+        if kind == "ingredients":
+            conn.execute(
+                "INSERT INTO ingredients (id, name, unit, price) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, unit = excluded.unit, price = excluded.price",
+                (entity_id, value["name"], value["unit"], value["price"]))
+        elif kind == "dishes":
+            conn.execute(
+                "INSERT INTO dishes (id, name) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET name = excluded.name",
+                (entity_id, value["name"]))
+            conn.execute("DELETE FROM dish_ingredients WHERE dish_id = ?", (entity_id,))
+            conn.executemany(
+                "INSERT INTO dish_ingredients (dish_id, ingredient_id, amount) VALUES (?, ?, ?)",
+                [(entity_id, ing_id, amount) for ing_id, amount in value["ingredients"].items()])
+            conn.execute("DELETE FROM dish_sub_recipes WHERE dish_id = ?", (entity_id,))
+            conn.executemany(
+                "INSERT INTO dish_sub_recipes (dish_id, sub_dish_id, amount) VALUES (?, ?, ?)",
+                [(entity_id, sub_id, amount) for sub_id, amount in value.get("sub_recipes", {}).items()])
+        elif kind == "menus":
+            conn.execute(
+                "INSERT INTO menus (id, name, table_count) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, table_count = excluded.table_count",
+                (entity_id, value["name"], value.get("table_count", 1)))
+            conn.execute("DELETE FROM menu_dishes WHERE menu_id = ?", (entity_id,))
+            conn.executemany(
+                "INSERT INTO menu_dishes (menu_id, dish_id, quantity) VALUES (?, ?, ?)",
+                [(entity_id, dish_id, quantity) for dish_id, quantity in value["dishes"].items()])
+
+    @staticmethod
+    def _delete_entity(conn, kind: str, entity_id: str):
+        if kind == "ingredients":
+            conn.execute("DELETE FROM ingredients WHERE id = ?", (entity_id,))
+        elif kind == "dishes":
+            conn.execute("DELETE FROM dishes WHERE id = ?", (entity_id,))
+            conn.execute("DELETE FROM dish_ingredients WHERE dish_id = ?", (entity_id,))
+            conn.execute("DELETE FROM dish_sub_recipes WHERE dish_id = ?", (entity_id,))
+        elif kind == "menus":
+            conn.execute("DELETE FROM menus WHERE id = ?", (entity_id,))
+            conn.execute("DELETE FROM menu_dishes WHERE menu_id = ?", (entity_id,))
+
+    def calculate_ingredients_for_menu(self, menu_id: str) -> Optional[Dict[str, float]]:
+        """用一条查询取出宴席的全部配料项并累加为食材总量
+
+        为了与内存中矩阵的计算结果逐位一致，数据库只负责按宴席中菜品行和配料行的
+        原始顺序返回各项，每一项按 用量 × 份数 × 桌数 的顺序相乘后依次累加
+        （SQLite 的 SUM 累加顺序不确定，且新版本使用补偿求和）。
+        子配方展开后的用量由逐层累加得到，无法在查询中重现相同的舍入，
+        宴席中含有带子配方的菜品时返回 None，由调用方改用展开后的配方计算。
+        """
+        with self._lock:
+            nested = self._conn.execute(
+                """
+                SELECT 1 FROM menu_dishes md
+                JOIN dish_sub_recipes sr ON sr.dish_id = md.dish_id
+                WHERE md.menu_id = ? LIMIT 1
+                """, (menu_id,)).fetchone()
+            if nested is not None:
+                return None
+            rows = self._conn.execute(
+                """
+                SELECT di.ingredient_id, di.amount, md.quantity, COALESCE(m.table_count, 1)
+                FROM menu_dishes md
+                JOIN menus m ON m.id = md.menu_id
+                JOIN dishes d ON d.id = md.dish_id
+                JOIN dish_ingredients di ON di.dish_id = md.dish_id
+                WHERE md.menu_id = ?
+                ORDER BY md.rowid, di.rowid
+                """, (menu_id,)).fetchall()
+        totals: Dict[str, float] = {}
+        for ing_id, amount, quantity, table_count in rows:
+            totals[ing_id] = totals.get(ing_id, 0.0) + float(amount) * quantity * table_count
+        return totals
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,428 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from entity_store import entity_names
+from indexes import IncrementalSearch
+
+
+def format_amount(value):
+    """用量列的显示格式，非数值（如合计行的空白）原样显示"""
+    return f"{value:.2f}" if isinstance(value, (int, float)) else value
+
+
+def format_money(value):
+    """金额列的显示格式，非数值原样显示"""
+    return f"¥{value:.2f}" if isinstance(value, (int, float)) else value
+
+
+def _sort_value(value) -> Tuple:
+    """排序键：数值（含数字字符串，如ID）在前按大小排序，其余按文本排序"""
+    if isinstance(value, (int, float)):
+        return (0, value, "")
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0, str(value))
+
+
+class VirtualTreeview(ttk.Frame):
+    """只创建可见行的表格
+
+    表格只保存行键（通常为实体ID，必须是字符串）的顺序，各行内容在滚动到可见范围时
+    才通过 row_values(行键) 向数据源读取。Tk 中始终只保留一屏的条目，数万行数据
+    刷新和滚动也不会卡顿。排序和选择状态都记录在行键上，与当前可见的条目无关。
+
+    选择变化时在本控件上触发 <<TreeviewSelect>>，selection() 返回选中的行键。
+    """
+
+    def __init__(self, master, columns: Sequence[str], row_values: Callable[[str], Sequence],
+                 formatters: Optional[Dict[str, Callable]] = None,
+                 row_tags: Optional[Callable[[str], Sequence[str]]] = None,
+                 height: int = 15, column_width: int = 100, selectmode: str = "browse", **kwargs):
+        super().__init__(master, **kwargs)
+        self.columns = tuple(columns)
+        self.row_values = row_values
+        self.formatters = formatters or {}
+        self.row_tags = row_tags
+        self.selectmode = selectmode
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings", height=height,
+                                 selectmode=selectmode)
+        for col in self.columns:
+            self.tree.heading(col, text=col, command=lambda col=col: self.sort_by(col))
+            self.tree.column(col, width=column_width)
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self._keys: List[str] = []          # 数据源给出的原始顺序
+        self._pinned: List[str] = []        # 固定在末尾、不参与排序的行（如合计行）
+        self._order: List[str] = []         # 当前显示顺序
+        self._position_cache: Optional[Dict[str, int]] = {}
+        self._selected: Set[str] = set()
+        self._focus: Optional[str] = None
+        self._top = 0
+        self._page_size = height
+        self._sort_column: Optional[str] = None
+        self._sort_reverse = False
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", lambda event: self._measure())
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._on_mousewheel)
+        self.tree.bind("<Up>", lambda event: self._move_focus(-1))
+        self.tree.bind("<Down>", lambda event: self._move_focus(1))
+        self.tree.bind("<Prior>", lambda event: self._move_focus(-self._page_size))
+        self.tree.bind("<Next>", lambda event: self._move_focus(self._page_size))
+
+    # 数据
+    def set_rows(self, keys: Iterable[str], pinned: Iterable[str] = ()):
+        """设置全部行键并刷新可见行，保留仍然存在的行的选择状态"""
+        self._keys = list(keys)
+        self._pinned = list(pinned)
+        self._apply_order()
+        self._selected.intersection_update(self._positions())
+        if self._focus not in self._positions():
+            self._focus = None
+        self._render()
+        # 首次显示时表格实际高度可能与请求的行数不同，空闲时重新计算一屏的行数
+        self.after_idle(self._measure)
+
+    def refresh(self):
+        """行键不变、行内容变化时重新读取可见行"""
+        if self._sort_column is not None:
+            self._apply_order()
+        self._render()
+
+    def insert_row(self, key: str):
+        """新增一行：按当前排序插入，只有落在可见范围内时才重绘可见行"""
+        if key in self._positions():
+            self.update_row(key)
+            return
+        self._keys.append(key)
+        if self._sort_column is None:
+            position = len(self._order) - len(self._pinned)
+        else:
+            position = self._sorted_position(key)
+        self._order.insert(position, key)
+        self._position_cache = None
+        self._after_structure_change(position)
+
+    def update_row(self, key: str):
+        """某一行内容变化：排序位置不变时只更新这一个Tk条目"""
+        position = self._positions().get(key)
+        if position is None:
+            return
+        if self._sort_column is not None and key not in self._pinned:
+            del self._order[position]
+            new_position = self._sorted_position(key)
+            self._order.insert(new_position, key)
+            if new_position != position:
+                self._position_cache = None
+                self._after_structure_change(min(position, new_position))
+                return
+        if self.tree.exists(key):
+            self.tree.item(key, values=self._display_values(key), tags=self._tags(key))
+
+    def delete_row(self, key: str):
+        """删除一行"""
+        position = self._positions().get(key)
+        if position is None:
+            return
+        del self._order[position]
+        if key in self._pinned:
+            self._pinned.remove(key)
+        else:
+            self._keys.remove(key)
+        self._position_cache = None
+        if self._focus == key:
+            self._focus = None
+        if key in self._selected:
+            self._change_selection(self._selected - {key})
+        self._after_structure_change(position)
+
+    def _sorted_position(self, key: str) -> int:
+        """二分查找 key 在已排序行中的位置（不含固定行）"""
+        index = self.columns.index(self._sort_column)
+        value = _sort_value(self.row_values(key)[index])
+        low, high = 0, len(self._order) - len(self._pinned)
+        while low < high:
+            middle = (low + high) // 2
+            other = _sort_value(self.row_values(self._order[middle])[index])
+            if (other > value) if self._sort_reverse else (other < value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _after_structure_change(self, position: int):
+        """行增删或移动后：变化位于可见范围之前或之内时重绘，否则只更新滚动条"""
+        if position < self._top + self._page_size:
+            self._render()
+        else:
+            self._update_scrollbar(len(self.tree.get_children()))
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def tag_configure(self, tagname: str, **options):
+        self.tree.tag_configure(tagname, **options)
+
+    # 排序
+    def sort_by(self, column: str, reverse: Optional[bool] = None):
+        """按指定列排序，重复点击同一列时切换升降序"""
+        if reverse is None:
+            reverse = column == self._sort_column and not self._sort_reverse
+        self._sort_column = column
+        self._sort_reverse = reverse
+        for col in self.columns:
+            arrow = (" ▼" if reverse else " ▲") if col == column else ""
+            self.tree.heading(col, text=col + arrow)
+        self._apply_order()
+        self._render()
+
+    def _apply_order(self):
+        keys = list(self._keys)
+        if self._sort_column is not None:
+            index = self.columns.index(self._sort_column)
+            sort_values = {key: _sort_value(self.row_values(key)[index]) for key in keys}
+            keys.sort(key=sort_values.__getitem__, reverse=self._sort_reverse)
+        self._order = keys + self._pinned
+        self._position_cache = None
+
+    def _positions(self) -> Dict[str, int]:
+        """行键 -> 显示位置（行增删后按需重新计算）"""
+        if self._position_cache is None:
+            self._position_cache = {key: position for position, key in enumerate(self._order)}
+        return self._position_cache
+
+    # 选择
+    def selection(self) -> Tuple[str, ...]:
+        """选中的行键（按显示顺序）"""
+        return tuple(sorted(self._selected, key=self._positions().__getitem__))
+
+    def selection_set(self, keys: Iterable[str]):
+        """设置选中的行键，并滚动到第一个选中的行"""
+        keys = [key for key in keys if key in self._positions()]
+        self._change_selection(set(keys))
+        if keys:
+            self._focus = keys[0]
+            self.see(keys[0])
+        else:
+            self._render()
+
+    def see(self, key: str):
+        """滚动使指定行可见"""
+        position = self._positions().get(key)
+        if position is None:
+            return
+        if position < self._top:
+            self._top = position
+        elif position >= self._top + self._page_size:
+            self._top = position - self._page_size + 1
+        self._render()
+
+    def _change_selection(self, selected: Set[str]):
+        if selected != self._selected:
+            self._selected = selected
+            self.event_generate("<<TreeviewSelect>>")
+
+    def _on_tree_select(self, event):
+        """可见条目的选择变化同步到行键选择（不可见的已选行保持不变）"""
+        current = set(self.tree.selection())
+        focus = self.tree.focus()
+        if focus:
+            self._focus = focus
+        if self.selectmode == "browse" and current:
+            self._change_selection(current)
+        else:
+            visible = set(self.tree.get_children())
+            self._change_selection((self._selected - visible) | current)
+
+    def _move_focus(self, delta: int):
+        """键盘上下移动选择，越过可见范围时滚动"""
+        if not self._order:
+            return "break"
+        position = self._positions().get(self._focus)
+        if position is None:
+            position = self._top
+        else:
+            position = max(0, min(len(self._order) - 1, position + delta))
+        key = self._order[position]
+        self._focus = key
+        self._change_selection({key})
+        self.see(key)
+        return "break"
+
+    # 滚动
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self._top = int(float(args[1]) * len(self._order))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self._page_size
+            self._top += step
+        self._render()
+
+    def _on_mousewheel(self, event):
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        else:
+            step = -3 if event.delta > 0 else 3
+        self._top += step
+        self._render()
+        return "break"
+
+    def _measure(self):
+        """根据表格实际高度计算一屏可显示的行数"""
+        children = self.tree.get_children()
+        if not children:
+            return
+        bbox = self.tree.bbox(children[0])
+        if not bbox:
+            return
+        _, header_height, _, row_height = bbox
+        page_size = max(1, (self.tree.winfo_height() - header_height) // max(1, row_height))
+        if page_size != self._page_size:
+            self._page_size = page_size
+            self._render()
+
+    def _render(self):
+        """只为可见范围内的行创建Tk条目"""
+        total = len(self._order)
+        self._top = max(0, min(self._top, total - self._page_size))
+        visible = self._order[self._top:self._top + self._page_size]
+
+        self.tree.delete(*self.tree.get_children())
+        for key in visible:
+            self.tree.insert("", tk.END, iid=key, values=self._display_values(key), tags=self._tags(key))
+
+        self.tree.selection_set([key for key in visible if key in self._selected])
+        if self._focus in visible:
+            self.tree.focus(self._focus)
+        self._update_scrollbar(len(visible))
+
+    def _display_values(self, key: str) -> List:
+        return [self.formatters[col](value) if col in self.formatters else value
+                for col, value in zip(self.columns, self.row_values(key))]
+
+    def _tags(self, key: str) -> Sequence[str]:
+        return self.row_tags(key) if self.row_tags is not None else ()
+
+    def _update_scrollbar(self, visible_count: int):
+        total = len(self._order)
+        if total:
+            self.scrollbar.set(self._top / total, min(1.0, (self._top + visible_count) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class ChoiceLabels:
+    """下拉框选项文本与实体ID的双向映射，可按实体增量更新并保持原有顺序"""
+
+    def __init__(self, label_for: Callable[[str, str], str]):
+        # label_for(实体ID, 名称) -> 显示文本
+        self.label_for = label_for
+        self._labels: Dict[str, str] = {}      # 实体ID -> 显示文本（按加入顺序）
+        self._ids: Dict[str, str] = {}         # 显示文本 -> 实体ID
+
+    def rebuild(self, entities: Dict):
+        # 只需要名称，延迟加载的菜品和宴席不会因此被逐个读出
+        self._labels = {entity_id: self.label_for(entity_id, name) for entity_id, name in entity_names(entities)}
+        self._ids = {label: entity_id for entity_id, label in self._labels.items()}
+
+    def set(self, entity_id: str, record: Dict):
+        """新增或更新一个实体的显示文本（更新时位置不变）"""
+        old_label = self._labels.get(entity_id)
+        if old_label is not None:
+            self._ids.pop(old_label, None)
+        label = self.label_for(entity_id, record["name"])
+        self._labels[entity_id] = label
+        self._ids[label] = entity_id
+
+    def remove(self, entity_id: str):
+        label = self._labels.pop(entity_id, None)
+        if label is not None:
+            self._ids.pop(label, None)
+
+    def label(self, entity_id: str) -> Optional[str]:
+        """实体的显示文本"""
+        return self._labels.get(entity_id)
+
+    def id_for(self, label: str) -> Optional[str]:
+        """显示文本对应的实体ID，不是下拉选项时返回None"""
+        return self._ids.get(label)
+
+    def labels(self) -> List[str]:
+        """全部显示文本（按实体加入顺序）"""
+        return list(self._labels.values())
+
+
+class ComboboxSearch:
+    """下拉框的输入搜索
+
+    停止输入 delay_ms 毫秒后才查询（防抖），通过搜索索引只取排名前 limit 的结果；
+    继续输入时在上一次的结果中过滤。结果与当前选项相同时不重新设置选项，也不再弹出下拉列表。
+    """
+
+    # 不改变输入内容的按键
+    NAVIGATION_KEYS = ('Up', 'Down', 'Left', 'Right', 'Return', 'Escape', 'Tab',
+                       'Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R')
+
+    def __init__(self, combobox: ttk.Combobox, search: IncrementalSearch, labels: ChoiceLabels,
+                 popup: Callable[[], None], delay_ms: int = 150, limit: int = 50):
+        self.combobox = combobox
+        self.search = search
+        self.labels = labels
+        self.popup = popup
+        self.delay_ms = delay_ms
+        self.limit = limit
+        self._after_id = None
+        self._values: Optional[Tuple[str, ...]] = None
+
+    def on_key_release(self, event):
+        """绑定到下拉框的 <KeyRelease>"""
+        # 在中文等输入法组合输入阶段（Windows 常见为 keycode 229 / VK_PROCESSKEY）不搜索，避免覆盖候选上屏
+        if getattr(event, 'keycode', None) == 229:
+            return
+        if getattr(event, 'keysym', '') in self.NAVIGATION_KEYS:
+            return
+        self._cancel_pending()
+        self._after_id = self.combobox.after(self.delay_ms, self._run)
+
+    def show_all(self):
+        """显示全部选项（点击下拉框或选项列表变化时）"""
+        self._cancel_pending()
+        self.search.reset()
+        self._set_values(self.labels.labels())
+
+    def _cancel_pending(self):
+        if self._after_id is not None:
+            self.combobox.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _run(self):
+        self._after_id = None
+        text = self.combobox.get().strip()
+        if not text:
+            # 搜索框为空时显示全部选项
+            self.show_all()
+            return
+        values = [label for label in map(self.labels.label, self.search.search(text, self.limit))
+                  if label is not None]
+        if self._set_values(values) and values:
+            self.popup()
+
+    def _set_values(self, values: List[str]) -> bool:
+        """设置下拉选项，选项未变化时返回False"""
+        values = tuple(values)
+        if values == self._values:
+            return False
+        self._values = values
+        self.combobox['values'] = values
+        return True